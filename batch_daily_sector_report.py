@@ -44,6 +44,7 @@ def main() -> None:
     parser.add_argument("--through", help="Optional YYYY-MM-DD to stop processing earlier")
     parser.add_argument("--listed-csv", default="data/上市公司基本資料.csv")
     parser.add_argument("--industry-csv", default="data/industry_codes.csv")
+    parser.add_argument("--otc-csv", help="Optional path to 上櫃公司基本資料.csv to include TPEx (.TWO) stocks")
     parser.add_argument("--analysis-dir", default="分析報告")
     parser.add_argument("--top-n", type=int, default=3)
     parser.add_argument("--stocks-per-sector", type=int, default=5)
@@ -65,6 +66,7 @@ def main() -> None:
             analysis_dir=analysis_dir,
             top_n=args.top_n,
             stocks_per_sector=args.stocks_per_sector,
+            otc_csv=args.otc_csv,
         )
 
 
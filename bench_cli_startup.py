@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Startup-time budget check for the CLI entry points.
+
+Cron jobs call these scripts hundreds of times a day, so commands that do not
+need market data (``--help``, argument errors) must not import numpy / pandas /
+yfinance / mcp. For each case this runs a fresh interpreter `--runs` times and
+compares the median wall time with a bare ``python -c pass`` baseline; the
+difference must stay under `--budget-ms`. It also checks that importing
+`stock_analyzer` leaves the heavy modules unloaded.
+
+Exit status is 1 when any check fails, so it can gate CI or a pre-commit hook.
+
+Usage:
+    python bench_cli_startup.py --runs 15 --budget-ms 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent
+HEAVY_MODULES = ("numpy", "pandas", "yfinance", "mcp")
+CASES = (
+    ["stock_analyzer.py", "--help"],
+    ["stock_analyzer.py"],
+)
+
+
+def _median_ms(cmd: List[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def _heavy_imports(module: str) -> List[str]:
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [m for m in out.stdout.strip().split(",") if m]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Enforce a startup-time budget for the CLI entry points.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Allowed time above a bare interpreter start")
+    args = parser.parse_args()
+
+    failed = False
+    loaded = _heavy_imports("stock_analyzer")
+    print(f"import stock_analyzer 載入的重量級模組：{loaded or '無'}")
+    failed |= bool(loaded)
+
+    baseline = _median_ms([sys.executable, "-c", "pass"], args.runs)
+    print(f"baseline python -c pass: {baseline:.0f} ms")
+    for case in CASES:
+        elapsed = _median_ms([sys.executable, *case], args.runs)
+        over = elapsed - baseline
+        ok = over <= args.budget_ms
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {' '.join(case):<28} {elapsed:6.0f} ms（+{over:.0f} ms，預算 {args.budget_ms:.0f} ms）")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
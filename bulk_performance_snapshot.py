@@ -1,84 +1,163 @@
+#!/usr/bin/env python3
+"""Batched total-return snapshot for the Fortune Global 500 tickers.
 
-import yfinance as yf
-import pandas as pd
+Tickers come from the enriched ranking CSVs
+(`歷年全球500大公司/csv_with_ticker/fortune_global500_YYYY.csv`, top-N of each
+selected year). Prices come through `price_cache.cached_adj_close`: one
+batched download for whatever the on-disk panel does not cover yet, then
+memory-mapped reads. Returns are computed for every ticker at once from the
+(date × ticker) matrix.
+
+The result is written as a columnar snapshot (`columnar_store`) and printed
+as the same JSON list the per-ticker version produced.
+
+Usage:
+    python bulk_performance_snapshot.py --years 2008 --start 2013-01-01 --end 2025-10-21 \
+        --output_json 分析報告/bulk_performance_snapshot.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
 import json
-import re
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import write_columns
+from fortune_cohort_engine import CSV_DIR, load_cohorts
+from price_cache import cached_adj_close
+
+DEFAULT_SNAPSHOT = Path(__file__).resolve().parent / "data" / ".cache" / "bulk_performance_snapshot.store"
+SNAPSHOT_FORMAT = "bulk_performance_snapshot/1"
+
+# Display names for tickers whose ranking CSV name is English only.
+COMPANY_NAMES_ZH = {
+    'SHEL': '荷蘭皇家殼牌石油公司', 'XOM': '埃克森美孚', 'WMT': '沃爾瑪', 'BP': '英國石油', 
+    '0386.HK': '中國石油化工（中石化）', 'PTR': '中國石油天然氣（中石油）', 'CVX': '雪佛龍', 
+    'COP': '康菲石油', 'TM': '豐田汽車', 'TTE': '道達爾', 'VOW3.DE': '大眾', 
+    '6178.T': '日本郵政控股', 'GLEN.L': '嘉能可', 'OGZPY': '俄羅斯天然氣工業', 
+    'EOAN.DE': '意昂集團', 'E': '埃尼石油', 'ING': '荷蘭國際集團', 'GM': '通用汽車', 
+    '005930.KS': '三星電子', 'MBG.DE': '戴姆勒', 'GE': '通用電氣', 'PBR': '巴西國家石油', 
+    'BRK-B': '伯克希爾哈撒韋', 'AXAHY': '安盛', 'FNMA': '房利美', 'F': '福特', 
+    'ALIZY': '安聯保險', 'NTTYY': '日本電報電話', 'BNPQY': '法國巴黎銀行', 'HPQ': '惠普', 
+    'T': '美國電話電報（AT&T）', 'ENGIE.PA': '法國燃氣蘇伊士', 'VLO': '瓦萊羅能源', 
+    'MCK': '麥克森', '6501.T': '日立', 'CA.PA': '家樂福', 'EQNR': '挪威國家石油', 
+    '5020.T': 'JX 控股', 'NSANY': '日產', '2317.TW': '鴻海（富士康）', 'SAN': '西班牙國家銀行', 
+    'EXO.MI': 'EXOR 集團', 'BAC': '美國銀行', 'SIEGY': '西門子', 'G': '意大利忠利保險', 
+    'LUKOY': '盧克石油', 'VZ': '威瑞森', 'JPM': '摩根大通', 'ENLAY': '意大利國家電力', 
+    'HSBC': '匯豐', '1398.HK': '中國工商銀行', 'AAPL': '蘋果', 'CVS': 'CVS Caremark', 
+    'IBM': 'IBM', 'CRARY': '法國農業信貸', 'TSCDY': '樂購 Tesco', 'C': '花旗', 
+    'CAH': '康德樂', 'BASFY': '巴斯夫', 'UNH': '聯合健康', 'HMC': '本田', 
+    '034730.KS': 'SK 集團', 'PCRFY': '松下', 'SCGLY': '法國興業銀行', 
+    'PETRONAS.CS': '馬來西亞國家石油', 'BMW.DE': 'BMW', 'MT': '安賽樂米塔爾', 
+    'NSRGY': '雀巢', 'B4B.DE': '麥德龍', 'ECIFY': '法國電力', 'KR': '克羅格', 
+    'MURGY': '慕尼黑再保', '0939.HK': '中國建設銀行', 'COST': '好市多', 'FMCC': '房地美', 
+    'WFC': '富國銀行', '0941.HK': '中國移動', 'TEF': '西班牙電話', 'IOC.NS': '印度石油', 
+    '1288.HK': '中國農業銀行', 'STLA': '標致', 'PG': '寶潔', 'SONY': '索尼', 
+    'BDORY': '巴西銀行', 'DTEGY': '德國電信', 'REPYY': '雷普索爾', 'ADM': 'ADM 公司', 
+    '3988.HK': '中國銀行', 'ABC': '美源伯根', 'PTT.BK': '泰國國家石油', 'TOSYY': '東芝', 
+    'DPSGY': '德國郵政', 'RELIANCE.NS': '信實工業', '601668.SS': '中國建築工程'
+}
+
+
+def fortune_tickers(csv_dir: Path = CSV_DIR, years: Optional[Sequence[int]] = None, top_n: int = 100) -> Dict[str, str]:
+    """Ticker -> company name for the top-N of every selected enriched ranking CSV."""
+    tickers: Dict[str, str] = {}
+    for cohort in load_cohorts(csv_dir, top_n, years):
+        for ticker, company in zip(cohort.members["ticker"], cohort.members["company"]):
+            if ticker and ticker not in tickers:
+                tickers[ticker] = COMPANY_NAMES_ZH.get(ticker, company)
+    return tickers
+
+
+def snapshot_returns(prices: pd.DataFrame, tickers: Sequence[str]) -> pd.DataFrame:
+    """First/last valid price and total return of every column, computed on the whole matrix."""
+    prices = prices.reindex(columns=list(tickers)).sort_index()
+    values = prices.to_numpy(dtype=float)
+    dates = prices.index.values.astype("datetime64[D]")
+    valid = np.isfinite(values) & (values > 0)
+    has = valid.any(axis=0)
+    if len(values):
+        cols = np.arange(len(tickers))
+        first = valid.argmax(axis=0)
+        last = len(values) - 1 - valid[::-1].argmax(axis=0)
+        start_price = np.where(has, values[first, cols], np.nan)
+        end_price = np.where(has, values[last, cols], np.nan)
+        start_date = np.where(has, dates[first], np.datetime64("NaT", "D"))
+        end_date = np.where(has, dates[last], np.datetime64("NaT", "D"))
+    else:
+        start_price = end_price = np.full(len(tickers), np.nan)
+        start_date = end_date = np.full(len(tickers), np.datetime64("NaT", "D"))
+    return pd.DataFrame({
+        "ticker": list(tickers),
+        "start_date": start_date,
+        "end_date": end_date,
+        "start_price": start_price,
+        "end_price": end_price,
+        "total_return": end_price / start_price - 1.0,
+    })
+
+
+def write_snapshot(path: Path, table: pd.DataFrame, meta: Dict) -> None:
+    write_columns(
+        path,
+        {
+            "tickers": table["ticker"].to_numpy().astype(str),
+            "start_date": table["start_date"].to_numpy().astype("datetime64[D]"),
+            "end_date": table["end_date"].to_numpy().astype("datetime64[D]"),
+            "start_price": table["start_price"].to_numpy(dtype=float),
+            "end_price": table["end_price"].to_numpy(dtype=float),
+            "total_return": table["total_return"].to_numpy(dtype=float),
+        },
+        meta={"format": SNAPSHOT_FORMAT, **meta},
+    )
+
+
+def to_json_records(table: pd.DataFrame, names: Dict[str, str]) -> List[Dict]:
+    records = []
+    for row in table.itertuples(index=False):
+        name = names.get(row.ticker, "")
+        if not np.isfinite(row.total_return):
+            records.append({"ticker": row.ticker, "company_name": name, "error": "No close price data"})
+            continue
+        records.append({
+            "ticker": row.ticker,
+            "company_name": name,
+            "total_return_pct": float(round(row.total_return * 100, 2)),
+            "start_date": pd.Timestamp(row.start_date).strftime("%Y-%m-%d"),
+            "end_date": pd.Timestamp(row.end_date).strftime("%Y-%m-%d"),
+        })
+    return records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batched total-return snapshot of Fortune Global 500 tickers.")
+    parser.add_argument("--csv-dir", default=str(CSV_DIR), help="Directory of enriched fortune_global500_YYYY.csv")
+    parser.add_argument("--years", type=int, nargs="+", help="Ranking years to take tickers from (default: all)")
+    parser.add_argument("--top-n", type=int, default=100)
+    parser.add_argument("--start", default="2013-01-01")
+    parser.add_argument("--end", default=dt.date.today().isoformat())
+    parser.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT), help="Columnar snapshot directory")
+    parser.add_argument("--output_json", help="Also write the JSON list to this file")
+    args = parser.parse_args()
+
+    names = fortune_tickers(Path(args.csv_dir), args.years, args.top_n)
+    tickers = list(names)
+    prices = cached_adj_close(tickers, args.start, args.end)
+    table = snapshot_returns(prices, tickers)
+    write_snapshot(Path(args.snapshot), table, {"start": args.start, "end": args.end, "years": args.years or []})
+
+    results = to_json_records(table, names)
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output_json:
+        Path(args.output_json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output_json).write_text(text, encoding="utf-8")
+    print(text)
 
-def get_return(ticker, company_name, start_date, end_date):
-    try:
-        df = yf.download(ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
-        if df.empty:
-            return {"ticker": ticker, "company_name": company_name, "error": "No data found"}
-        
-        close_prices = df['Close'].dropna()
-        if close_prices.empty:
-            return {"ticker": ticker, "company_name": company_name, "error": "No close price data"}
-
-        start_price = close_prices.iloc[0]
-        end_price = close_prices.iloc[-1]
-        
-        total_return = (end_price / start_price) - 1.0
-        
-        return {
-            "ticker": str(ticker),
-            "company_name": str(company_name),
-            "total_return_pct": float(round(total_return * 100, 2)),
-            "start_date": str(close_prices.index[0].strftime('%Y-%m-%d')),
-            "end_date": str(close_prices.index[-1].strftime('%Y-%m-%d')),
-        }
-    except Exception as e:
-        return {"ticker": str(ticker), "company_name": str(company_name), "error": str(e)}
-
-def main():
-    tickers_to_process = [
-        'SHEL', 'XOM', 'WMT', 'BP', '0386.HK', 'PTR', 'CVX', 'COP', 'TM', 'TTE', 
-        'VOW3.DE', '6178.T', 'GLEN.L', 'OGZPY', 'EOAN.DE', 'E', 'ING', 'GM', 
-        '005930.KS', 'MBG.DE', 'GE', 'PBR', 'BRK-B', 'AXAHY', 'FNMA', 'F', 
-        'ALIZY', 'NTTYY', 'BNPQY', 'HPQ', 'T', 'ENGIE.PA', 'VLO', 'MCK', 
-        '6501.T', 'CA.PA', 'EQNR', '5020.T', 'NSANY', '2317.TW', 'SAN', 'EXO.MI', 
-        'BAC', 'SIEGY', 'G', 'LUKOY', 'VZ', 'JPM', 'ENLAY', 'HSBC', '1398.HK', 
-        'AAPL', 'CVS', 'IBM', 'CRARY', 'TSCDY', 'C', 'CAH', 'BASFY', 'UNH', 
-        'HMC', '034730.KS', 'PCRFY', 'SCGLY', 'PETRONAS.CS', 'BMW.DE', 'MT', 
-        'NSRGY', 'B4B.DE', 'ECIFY', 'KR', 'MURGY', '0939.HK', 'COST', 'FMCC', 
-        'WFC', '0941.HK', 'TEF', 'IOC.NS', '1288.HK', 'STLA', 'PG', 'SONY', 
-        'BDORY', 'DTEGY', 'REPYY', 'ADM', '3988.HK', 'ABC', 'PTT.BK', 'TOSYY', 
-        'DPSGY', 'RELIANCE.NS', '601668.SS'
-    ]
-    company_names_map = {
-        'SHEL': '荷蘭皇家殼牌石油公司', 'XOM': '埃克森美孚', 'WMT': '沃爾瑪', 'BP': '英國石油', 
-        '0386.HK': '中國石油化工（中石化）', 'PTR': '中國石油天然氣（中石油）', 'CVX': '雪佛龍', 
-        'COP': '康菲石油', 'TM': '豐田汽車', 'TTE': '道達爾', 'VOW3.DE': '大眾', 
-        '6178.T': '日本郵政控股', 'GLEN.L': '嘉能可', 'OGZPY': '俄羅斯天然氣工業', 
-        'EOAN.DE': '意昂集團', 'E': '埃尼石油', 'ING': '荷蘭國際集團', 'GM': '通用汽車', 
-        '005930.KS': '三星電子', 'MBG.DE': '戴姆勒', 'GE': '通用電氣', 'PBR': '巴西國家石油', 
-        'BRK-B': '伯克希爾哈撒韋', 'AXAHY': '安盛', 'FNMA': '房利美', 'F': '福特', 
-        'ALIZY': '安聯保險', 'NTTYY': '日本電報電話', 'BNPQY': '法國巴黎銀行', 'HPQ': '惠普', 
-        'T': '美國電話電報（AT&T）', 'ENGIE.PA': '法國燃氣蘇伊士', 'VLO': '瓦萊羅能源', 
-        'MCK': '麥克森', '6501.T': '日立', 'CA.PA': '家樂福', 'EQNR': '挪威國家石油', 
-        '5020.T': 'JX 控股', 'NSANY': '日產', '2317.TW': '鴻海（富士康）', 'SAN': '西班牙國家銀行', 
-        'EXO.MI': 'EXOR 集團', 'BAC': '美國銀行', 'SIEGY': '西門子', 'G': '意大利忠利保險', 
-        'LUKOY': '盧克石油', 'VZ': '威瑞森', 'JPM': '摩根大通', 'ENLAY': '意大利國家電力', 
-        'HSBC': '匯豐', '1398.HK': '中國工商銀行', 'AAPL': '蘋果', 'CVS': 'CVS Caremark', 
-        'IBM': 'IBM', 'CRARY': '法國農業信貸', 'TSCDY': '樂購 Tesco', 'C': '花旗', 
-        'CAH': '康德樂', 'BASFY': '巴斯夫', 'UNH': '聯合健康', 'HMC': '本田', 
-        '034730.KS': 'SK 集團', 'PCRFY': '松下', 'SCGLY': '法國興業銀行', 
-        'PETRONAS.CS': '馬來西亞國家石油', 'BMW.DE': 'BMW', 'MT': '安賽樂米塔爾', 
-        'NSRGY': '雀巢', 'B4B.DE': '麥德龍', 'ECIFY': '法國電力', 'KR': '克羅格', 
-        'MURGY': '慕尼黑再保', '0939.HK': '中國建設銀行', 'COST': '好市多', 'FMCC': '房地美', 
-        'WFC': '富國銀行', '0941.HK': '中國移動', 'TEF': '西班牙電話', 'IOC.NS': '印度石油', 
-        '1288.HK': '中國農業銀行', 'STLA': '標致', 'PG': '寶潔', 'SONY': '索尼', 
-        'BDORY': '巴西銀行', 'DTEGY': '德國電信', 'REPYY': '雷普索爾', 'ADM': 'ADM 公司', 
-        '3988.HK': '中國銀行', 'ABC': '美源伯根', 'PTT.BK': '泰國國家石油', 'TOSYY': '東芝', 
-        'DPSGY': '德國郵政', 'RELIANCE.NS': '信實工業', '601668.SS': '中國建築工程'
-    }
-
-    start_date = '2013-01-01'
-    end_date = '2025-10-21'
-    
-    results = [get_return(ticker, company_names_map.get(ticker, ''), start_date, end_date) for ticker in tickers_to_process]
-    
-    print(json.dumps(results, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,141 @@
+"""Per-host circuit breaker for upstream quote fetches.
+
+States:
+
+- ``closed``     calls go through; `failure_threshold` consecutive failures open it
+- ``open``       calls fail fast with `CircuitOpenError` for `reset_timeout` seconds
+- ``half_open``  after the timeout one probe call is let through; success closes
+                 the breaker (and runs the `on_close` callbacks, e.g. background
+                 revalidation of data served stale meanwhile), failure re-opens it
+
+Breakers are shared per host through `breaker_for(host)`, so every tool and
+the batch downloader see the same upstream health. `is_failure` decides which
+exceptions mean the host is unhealthy (throttling, 5xx, transport errors);
+anything else (e.g. an unknown symbol) means the host answered and counts as
+a success, so bad input from one caller cannot open the breaker for everyone.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        is_failure: Optional[Callable[[Exception], bool]] = None,
+    ):
+        self.host = host
+        self.is_failure = is_failure or (lambda exc: True)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._on_close: List[Callable[[], None]] = []
+        self.counts: Dict[str, int] = {"failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        self._on_close.append(callback)
+
+    def allow(self) -> bool:
+        """True if a call may go upstream now (at most one probe while half-open)."""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.counts["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            reopened = self._state != "closed"
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+        if reopened:
+            for callback in self._on_close:
+                callback()
+
+    def release(self) -> None:
+        """Give back a half-open probe slot from `allow()` that ended up making no upstream call."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counts["failures"] += 1
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self.counts["opened"] += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run `fn` through the breaker; exceptions count as failures only if `is_failure` says so."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.host} circuit open; retry in {self.retry_after():.0f}s")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            if self.is_failure(exc):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            state, failures = self._state, self._failures
+        return {"state": state, "consecutive_failures": failures, "retry_after_s": round(self.retry_after(), 1), **self.counts}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(host: str, **kwargs) -> CircuitBreaker:
+    """The process-wide breaker for `host` (created on first use with `kwargs`)."""
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host, **kwargs)
+        return _breakers[host]
+
+
+def snapshot_all() -> Dict[str, Dict]:
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {host: b.snapshot() for host, b in breakers.items()}
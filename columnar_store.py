@@ -0,0 +1,243 @@
+"""Tiny columnar store: one ``.npy`` file per column plus a JSON meta file.
+
+Layout on disk::
+
+    <store>/CURRENT          # name of the live version directory, e.g. "v000003"
+    <store>/v000003/meta.json
+    <store>/v000003/<column>.npy
+
+Writers build a complete new version directory and then atomically swap the
+``CURRENT`` pointer, so readers never observe a half-written store. Readers
+memory-map the ``.npy`` files (``mmap_mode="r"``), which keeps loads in the
+millisecond range and lets several processes share the same pages.
+
+Several processes may share one store (e.g. one MCP server per client).
+Writers serialize on an exclusive ``flock`` of ``<store>/LOCK``; callers
+doing a read-modify-write hold `store_lock()` around the whole update (it is
+re-entrant within a thread, so `write_columns` inside it does not deadlock).
+Readers take no lock: a reader that loses a race with a writer deleting the
+version it was opening simply retries on the new ``CURRENT``.
+
+Only numeric / datetime / fixed-width string arrays are supported (no pickled
+objects), which keeps the files portable and safe to map.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Mapping, Optional, Tuple, TypeVar
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+LOCK_FILE = "LOCK"
+READ_RETRIES = 3
+
+T = TypeVar("T")
+_held = threading.local()
+_thread_locks: Dict[Path, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _current_version(store: Path) -> Optional[str]:
+    pointer = store / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    name = pointer.read_text(encoding="utf-8").strip()
+    return name or None
+
+
+@contextmanager
+def store_lock(path: str | os.PathLike) -> Iterator[None]:
+    """Exclusive writer lock on the store at `path`, across threads and processes.
+
+    Re-entrant within a thread. Readers never need it.
+    """
+    store = Path(path).resolve()
+    held = _held.__dict__.setdefault("stores", set())
+    if store in held:
+        yield
+        return
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(store, threading.RLock())
+    with thread_lock:
+        store.mkdir(parents=True, exist_ok=True)
+        with (store / LOCK_FILE).open("a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            held.add(store)
+            try:
+                yield
+            finally:
+                held.discard(store)
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _read_live(store: Path, read: Callable[[Path], T]) -> T:
+    """Run `read(version_dir)` on the live version, retrying if a writer removes it meanwhile."""
+    for attempt in range(READ_RETRIES):
+        version = _current_version(store)
+        if version is None:
+            raise FileNotFoundError(f"No columnar store found at {store}")
+        try:
+            return read(store / version)
+        except FileNotFoundError:
+            if attempt == READ_RETRIES - 1 or _current_version(store) == version:
+                raise
+    raise AssertionError("unreachable")
+
+
+def source_fingerprint(path: str | os.PathLike) -> Dict:
+    """Cheap identity of a source file (size + mtime) for cache invalidation."""
+    st = Path(path).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def source_sha1(path: str | os.PathLike) -> str:
+    h = hashlib.sha1()
+    with Path(path).open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_fresh(path: str | os.PathLike, source: str | os.PathLike, fmt: str) -> bool:
+    """True if the store at `path` was compiled from the current `source` in format `fmt`.
+
+    Compares the stat fingerprint first and only hashes the source when it
+    differs, so a touched-but-unchanged file does not force a rebuild; after
+    such a hash match the stored fingerprint is updated so later calls take
+    the cheap path again. Stores must record ``format``, ``source`` and
+    ``sha1`` in their meta.
+    """
+    if not store_exists(path):
+        return False
+    meta = read_meta(path)
+    if meta.get("format") != fmt:
+        return False
+    fingerprint = source_fingerprint(source)
+    if meta.get("source") == fingerprint:
+        return True
+    if meta.get("sha1") != source_sha1(source):
+        return False
+    try:
+        update_meta(path, {"source": fingerprint})
+    except OSError:
+        pass  # read-only cache dir: stay correct, just hash again next time
+    return True
+
+
+def update_meta(path: str | os.PathLike, updates: Mapping) -> None:
+    """Merge `updates` into the live version's meta without rewriting its columns.
+
+    The meta file is replaced atomically under `store_lock`, so readers see
+    either the old or the new meta.
+    """
+    store = Path(path)
+    with store_lock(store):
+        version = _current_version(store)
+        if version is None:
+            raise FileNotFoundError(f"No columnar store found at {store}")
+        meta_path = store / version / META_FILE
+        with meta_path.open(encoding="utf-8") as fh:
+            meta = json.load(fh)
+        meta.update(updates)
+        tmp = meta_path.with_name(f".{META_FILE}.tmp-{os.getpid()}")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(meta, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, meta_path)
+
+
+def store_exists(path: str | os.PathLike) -> bool:
+    store = Path(path)
+    version = _current_version(store)
+    return version is not None and (store / version / META_FILE).exists()
+
+
+def read_meta(path: str | os.PathLike) -> Dict:
+    """Return only the JSON meta of the live version (no arrays are opened)."""
+
+    def read(version_dir: Path) -> Dict:
+        with (version_dir / META_FILE).open(encoding="utf-8") as fh:
+            return json.load(fh)
+
+    return _read_live(Path(path), read)
+
+
+def read_columns(
+    path: str | os.PathLike,
+    mmap: bool = True,
+) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Load every column of the live version; arrays are read-only memory maps by default."""
+
+    def read(version_dir: Path) -> Tuple[Dict[str, np.ndarray], Dict]:
+        with (version_dir / META_FILE).open(encoding="utf-8") as fh:
+            meta = json.load(fh)
+        columns: Dict[str, np.ndarray] = {}
+        for name in meta.get("columns", []):
+            columns[name] = np.load(version_dir / f"{name}.npy", mmap_mode="r" if mmap else None, allow_pickle=False)
+        return columns, meta
+
+    return _read_live(Path(path), read)
+
+
+def write_columns(
+    path: str | os.PathLike,
+    columns: Mapping[str, np.ndarray],
+    meta: Optional[Mapping] = None,
+) -> Path:
+    """Write a new version of the store and atomically make it the live one.
+
+    Older versions are removed afterwards; processes that still have them
+    memory-mapped keep working because unlinked files stay valid until unmapped.
+    Takes `store_lock`, so concurrent writers in other processes wait their turn.
+    """
+    store = Path(path)
+    with store_lock(store):
+        return _write_version(store, columns, meta)
+
+
+def _write_version(store: Path, columns: Mapping[str, np.ndarray], meta: Optional[Mapping]) -> Path:
+    previous = _current_version(store)
+    seq = int(previous[1:]) + 1 if previous and previous[1:].isdigit() else 1
+    version = f"v{seq:06d}"
+    tmp_dir = store / f".{version}.tmp-{os.getpid()}"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir()
+
+    for name, array in columns.items():
+        arr = np.asarray(array)
+        if arr.dtype == object:
+            raise TypeError(f"Column {name!r} has dtype=object; convert to a fixed-width dtype first.")
+        np.save(tmp_dir / f"{name}.npy", arr, allow_pickle=False)
+
+    full_meta = dict(meta or {})
+    full_meta["columns"] = list(columns.keys())
+    with (tmp_dir / META_FILE).open("w", encoding="utf-8") as fh:
+        json.dump(full_meta, fh, ensure_ascii=False, indent=2)
+
+    version_dir = store / version
+    os.replace(tmp_dir, version_dir)
+
+    pointer_tmp = store / f".{CURRENT_FILE}.tmp-{os.getpid()}"
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, store / CURRENT_FILE)
+
+    for child in store.iterdir():
+        if child.is_dir() and child.name.startswith("v") and child.name != version:
+            shutil.rmtree(child, ignore_errors=True)
+    return version_dir
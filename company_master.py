@@ -0,0 +1,206 @@
+"""Precompiled, memory-mapped company master for the TWSE/TPEx company CSVs.
+
+Parsing 上市公司基本資料.csv (Chinese headers, utf-8-sig, zero-fill, numeric
+coercion) costs far more than the data is worth, and batch runs used to do it
+for every date. This module compiles the CSV once into a columnar store next
+to it (``<csv dir>/.cache/<csv stem>.master/``):
+
+- ``codes``          fixed-width 公司代號, row order defines the int index
+- ``industry``       int16 index into the ``industry_codes`` string table
+- ``shares``         float64 已發行普通股數或TDR原股發行股數 (NaN when missing);
+                     meta ``shares_dtype`` records the parsed dtype (int64 when
+                     no value is missing) so `to_frame` can restore it
+- ``name_blob`` / ``name_offsets``
+                     UTF-8 string table: all 公司名稱 followed by all 公司簡稱
+- ``name_missing``   bool per string-table entry, True where the CSV cell was empty
+
+The store is rebuilt only when the CSV's size/mtime changes *and* its content
+hash differs, and every consumer memory-maps the same files.
+`stock_analyzer._read_twse_listed_csv` and `_read_industry_codes` go through
+here transparently.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import is_fresh, read_columns, source_fingerprint, source_sha1, write_columns
+
+MASTER_FORMAT = "company_master/2"
+INDUSTRY_FORMAT = "industry_codes/1"
+LISTED_COLS = ["公司代號", "公司名稱", "公司簡稱", "產業別", "已發行普通股數或TDR原股發行股數"]
+
+
+def _cache_dir(csv_path: Path, kind: str) -> Path:
+    return csv_path.parent / ".cache" / f"{csv_path.stem}.{kind}"
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = bytes(blob)
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def parse_listed_csv(path: str) -> pd.DataFrame:
+    """The original CSV parse used by `_read_twse_listed_csv` (no caching)."""
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    missing = [c for c in LISTED_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"CSV missing required columns: {missing}")
+    # Normalize types
+    df["公司代號"] = df["公司代號"].astype(str).str.zfill(4)
+    df["產業別"] = df["產業別"].astype(str).str.zfill(2)
+    # Shares as numeric
+    df["已發行普通股數或TDR原股發行股數"] = pd.to_numeric(df["已發行普通股數或TDR原股發行股數"], errors="coerce")
+    return df[LISTED_COLS].copy()
+
+
+def parse_industry_codes(path: str) -> Dict[str, str]:
+    """The original industry_codes.csv parse used by `_read_industry_codes` (no caching)."""
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    required = {"code", "name"}
+    if not required.issubset(df.columns):
+        missing = required - set(df.columns)
+        raise ValueError(f"Industry code CSV missing columns: {missing}")
+    df["code"] = df["code"].astype(str).str.zfill(2)
+    df["name"] = df["name"].astype(str).str.strip()
+    return dict(zip(df["code"], df["name"]))
+
+
+@dataclass
+class CompanyMaster:
+    codes: np.ndarray            # <U fixed width
+    industry: np.ndarray         # int16 index into industry_codes
+    industry_codes: List[str]
+    shares: np.ndarray           # float64
+    names: List[str]
+    short_names: List[str]
+    shares_dtype: str = "float64"
+    name_missing: Optional[np.ndarray] = None  # bool, names then short names
+
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def index_of(self) -> Dict[str, int]:
+        return {str(c): i for i, c in enumerate(self.codes)}
+
+    def to_frame(self) -> pd.DataFrame:
+        """Same shape and dtypes as the uncached `parse_listed_csv` result."""
+        n = len(self.codes)
+        names = pd.Series(self.names, dtype=str)
+        short_names = pd.Series(self.short_names, dtype=str)
+        if self.name_missing is not None:
+            names = names.mask(self.name_missing[:n])
+            short_names = short_names.mask(self.name_missing[n:])
+        return pd.DataFrame({
+            "公司代號": self.codes.astype(str),
+            "公司名稱": names,
+            "公司簡稱": short_names,
+            "產業別": np.asarray(self.industry_codes, dtype=object)[self.industry],
+            "已發行普通股數或TDR原股發行股數": np.asarray(self.shares, dtype=float).astype(self.shares_dtype),
+        })
+
+
+def build_company_master(csv_path: str) -> Path:
+    src = Path(csv_path)
+    df = parse_listed_csv(str(src))
+    industry_codes = sorted(df["產業別"].unique().tolist())
+    industry = np.searchsorted(industry_codes, df["產業別"].to_numpy()).astype(np.int16)
+    names = df["公司名稱"].fillna("").astype(str).tolist()
+    short_names = df["公司簡稱"].fillna("").astype(str).tolist()
+    name_missing = np.concatenate([df["公司名稱"].isna().to_numpy(), df["公司簡稱"].isna().to_numpy()])
+    blob, offsets = _encode_strings(names + short_names)
+    store = _cache_dir(src, "master")
+    write_columns(
+        store,
+        {
+            "codes": df["公司代號"].to_numpy().astype(str),
+            "industry": industry,
+            "shares": df["已發行普通股數或TDR原股發行股數"].to_numpy(dtype=float),
+            "name_blob": blob,
+            "name_offsets": offsets,
+            "name_missing": name_missing,
+        },
+        meta={
+            "format": MASTER_FORMAT,
+            "shares_dtype": str(df["已發行普通股數或TDR原股發行股數"].dtype),
+            "source": source_fingerprint(src),
+            "sha1": source_sha1(src),
+            "rows": len(df),
+            "industry_codes": industry_codes,
+        },
+    )
+    return store
+
+
+def load_company_master(csv_path: str) -> CompanyMaster:
+    """Memory-map the compiled master for `csv_path`, rebuilding it if the CSV changed."""
+    src = Path(csv_path)
+    store = _cache_dir(src, "master")
+    if not is_fresh(store, src, MASTER_FORMAT):
+        build_company_master(str(src))
+    cols, meta = read_columns(store)
+    n = int(meta["rows"])
+    strings = _decode_strings(cols["name_blob"], cols["name_offsets"])
+    return CompanyMaster(
+        codes=cols["codes"],
+        industry=cols["industry"],
+        industry_codes=list(meta["industry_codes"]),
+        shares=cols["shares"],
+        names=strings[:n],
+        short_names=strings[n:],
+        shares_dtype=meta["shares_dtype"],
+        name_missing=cols["name_missing"],
+    )
+
+
+def load_industry_codes(csv_path: str) -> Dict[str, str]:
+    """Cached `parse_industry_codes`; rebuilt only when industry_codes.csv changes."""
+    src = Path(csv_path)
+    store = _cache_dir(src, "industry")
+    if not is_fresh(store, src, INDUSTRY_FORMAT):
+        mapping = parse_industry_codes(str(src))
+        blob, offsets = _encode_strings(list(mapping.values()))
+        write_columns(
+            store,
+            {"codes": np.asarray(list(mapping.keys()), dtype=str), "name_blob": blob, "name_offsets": offsets},
+            meta={"format": INDUSTRY_FORMAT, "source": source_fingerprint(src), "sha1": source_sha1(src)},
+        )
+    cols, _ = read_columns(store)
+    return dict(zip(cols["codes"].astype(str).tolist(), _decode_strings(cols["name_blob"], cols["name_offsets"])))
+
+
+def _cache_writable(csv_path: str) -> bool:
+    parent = Path(csv_path).parent
+    return os.access(parent, os.W_OK)
+
+
+def read_listed_frame(csv_path: str, use_cache: Optional[bool] = None) -> pd.DataFrame:
+    """DataFrame view of the company CSV, via the compiled master when the cache dir is writable."""
+    if use_cache is None:
+        use_cache = _cache_writable(csv_path)
+    if not use_cache:
+        return parse_listed_csv(csv_path)
+    return load_company_master(csv_path).to_frame()
+
+
+def read_industry_map(csv_path: str, use_cache: Optional[bool] = None) -> Dict[str, str]:
+    if use_cache is None:
+        use_cache = _cache_writable(csv_path)
+    if not use_cache:
+        return parse_industry_codes(csv_path)
+    return load_industry_codes(csv_path)
@@ -1,57 +1,30 @@
 
 import os
 import json
-import pandas as pd
+from pathlib import Path
+
 import numpy as np
 
+from tai50i_store import load_tai50i
+
 def main():
     # --- 設定 ---
     DATA_DIR = '/Users/david/Library/Mobile Documents/com~apple~CloudDocs/0notebook-fromGithub/資產配置/Data'
     START_DATE_LIMIT = '2002-10-18'
     END_DATE_LIMIT = '2025-10-03'
 
-    # --- 1. 讀取與解析資料 ---
-    all_records = []
+    # --- 1. 讀取資料（月檔已合併為單一欄式資料庫，僅在有新月檔時增量更新）---
     if not os.path.isdir(DATA_DIR):
         print(f"錯誤：找不到資料目錄 {DATA_DIR}")
         return
 
-    file_list = sorted([f for f in os.listdir(DATA_DIR) if f.endswith('.json')])
-
-    for filename in file_list:
-        filepath = os.path.join(DATA_DIR, filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            try:
-                content = json.load(f)
-                if content.get('stat') != 'OK' or 'data' not in content:
-                    continue
-                
-                for item in content['data']:
-                    roc_date_str = item[0].strip()
-                    tr_index_str = item[2].strip()
-                    
-                    parts = roc_date_str.split('/')
-                    year = int(parts[0]) + 1911
-                    month = int(parts[1])
-                    day = int(parts[2])
-                    gregorian_date = f"{year:04d}-{month:02d}-{day:02d}"
-                    
-                    value = float(tr_index_str.replace(',', ''))
-                    
-                    all_records.append({'date': gregorian_date, 'value': value})
-            except (json.JSONDecodeError, IndexError, TypeError, ValueError) as e:
-                print(f"處理檔案 {filename} 時發生錯誤: {e}")
-                continue
-
-    if not all_records:
+    index_df = load_tai50i(Path(DATA_DIR))
+    if index_df.empty:
         print("沒有成功解析任何資料點。")
         return
 
-    # --- 2. 建立並排序 DataFrame ---
-    df = pd.DataFrame(all_records)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values(by='date').set_index('date')
-    df = df[~df.index.duplicated(keep='first')]
+    # --- 2. 取出報酬指數並限定區間 ---
+    df = index_df[['tr_index']].rename(columns={'tr_index': 'value'})
     df = df.loc[START_DATE_LIMIT:END_DATE_LIMIT]
 
     # 增加數據清洗步驟，避免無效值(如0)影響計算
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Multi-period contribution attribution for the TWSE listed universe.
+
+`analyze_twse_today_by_sector` attributes one day's cap-weighted move to
+stocks (`貢獻度`) and sectors (`cap_contrib`). Daily contributions cannot
+simply be summed over a month because returns compound, so this module links
+them with Carino smoothing:
+
+    k_t = ln(1 + R_t) / R_t,  K = ln(1 + R) / R
+    contribution_i = Σ_t (k_t / K) · w_{i,t} · r_{i,t}
+
+where R_t is the market's daily return and R the compounded period return.
+Stock contributions then add up exactly to R. `method="log"` instead returns
+log-linked contributions that add up to ln(1 + R).
+
+Everything is computed from the (day × stock) weight and return matrices in
+one pass; with `freq="M"` every month in the range is attributed at once.
+
+Usage:
+    python contribution_attribution.py --start 2025-01-01 --end 2025-10-31 --freq M \
+        --output_md 分析報告/台股月度貢獻歸因_2025.md
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sector_index_store import daily_matrices
+from stock_analyzer import _read_industry_codes, _read_tw_universe, download_twse_price_history
+
+
+def _linking_coefficients(period_ret: np.ndarray, method: str) -> np.ndarray:
+    """ln(1+x)/x with the removable singularity at 0 filled with 1."""
+    if method not in {"carino", "log"}:
+        raise ValueError("method must be 'carino' or 'log'.")
+    x = np.asarray(period_ret, dtype=float)
+    out = np.ones_like(x)
+    nz = np.abs(x) > 1e-12
+    out[nz] = np.log1p(x[nz]) / x[nz]
+    return out
+
+
+def attribute_contributions(
+    adj: pd.DataFrame,
+    base_df: pd.DataFrame,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    freq: Optional[str] = None,
+    method: str = "carino",
+    industry_map: Optional[Dict[str, str]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Attribute the cap-weighted market return to stocks and sectors per period.
+
+    `adj` is an Adj Close panel (tickers as columns) that must include the
+    trading day before `start` so the first return can be computed. Returns
+    (per_stock, per_industry, per_period):
+
+    - per_stock: period, ticker, 公司代號, 公司名稱, 產業別, 區間報酬, 平均權重, 貢獻度
+    - per_industry: period, 產業別, 產業名稱, cap_contrib, count
+    - per_period: period, start_date, end_date, market_return, trading_days
+    """
+    m = daily_matrices(adj, base_df)
+    day_index = m.dates[1:]
+    keep = np.ones(len(day_index), dtype=bool)
+    if start:
+        keep &= day_index >= pd.to_datetime(start).normalize()
+    if end:
+        keep &= day_index <= pd.to_datetime(end).normalize()
+    if not keep.any():
+        raise ValueError("No trading days with returns inside the requested range.")
+
+    days = day_index[keep]
+    weights = m.weights[keep]
+    rets = m.ret[keep]
+    valid = m.valid[keep]
+    contrib = weights * rets                     # daily 貢獻度 per stock
+    market = contrib.sum(axis=1)                 # daily cap-weighted market return
+
+    if freq:
+        labels = days.to_period(freq).astype(str).to_numpy()
+    else:
+        labels = np.full(len(days), f"{days[0].date()}~{days[-1].date()}")
+    period_codes, group = np.unique(labels, return_inverse=True)
+    n_periods = len(period_codes)
+
+    # Compounded period returns and Carino coefficients, all vectorized by group.
+    log_growth = np.log1p(market)
+    period_log = np.bincount(group, weights=log_growth, minlength=n_periods)
+    period_ret = np.expm1(period_log)
+    k_daily = _linking_coefficients(market, method)
+    if method == "carino":
+        scale = k_daily / _linking_coefficients(period_ret, method)[group]
+    else:
+        scale = k_daily
+    linked = contrib * scale[:, None]
+
+    onehot_periods = np.zeros((n_periods, len(days)))
+    onehot_periods[group, np.arange(len(days))] = 1.0
+    stock_contrib = onehot_periods @ linked                              # (P, N)
+    stock_growth = np.exp(onehot_periods @ np.log1p(np.where(valid, rets, 0.0)))
+    avg_weight = (onehot_periods @ weights) / onehot_periods.sum(axis=1, keepdims=True)
+    traded = (onehot_periods @ valid.astype(float)) > 0
+
+    meta = base_df.drop_duplicates("公司代號").set_index("公司代號")
+    names = meta.loc[m.codes, "公司名稱"].to_numpy()
+    p_idx, n_idx = np.nonzero(traded)
+    per_stock = pd.DataFrame({
+        "period": period_codes[p_idx],
+        "ticker": np.asarray(m.tickers)[n_idx],
+        "公司代號": np.asarray(m.codes)[n_idx],
+        "公司名稱": names[n_idx],
+        "產業別": m.sectors[n_idx],
+        "區間報酬": stock_growth[p_idx, n_idx] - 1.0,
+        "平均權重": avg_weight[p_idx, n_idx],
+        "貢獻度": stock_contrib[p_idx, n_idx],
+    })
+    if industry_map:
+        per_stock["產業名稱"] = per_stock["產業別"].map(industry_map).fillna("")
+
+    sector_codes, onehot_sectors = m.sector_onehot()
+    sector_contrib = stock_contrib @ onehot_sectors                      # (P, S)
+    sector_count = traded.astype(float) @ onehot_sectors
+    per_industry = pd.DataFrame({
+        "period": np.repeat(period_codes, len(sector_codes)),
+        "產業別": np.tile(sector_codes, n_periods),
+        "cap_contrib": sector_contrib.ravel(),
+        "count": sector_count.ravel().astype(int),
+    })
+    per_industry = per_industry[per_industry["count"] > 0].reset_index(drop=True)
+    if industry_map:
+        per_industry["產業名稱"] = per_industry["產業別"].map(industry_map).fillna("")
+
+    first = np.full(n_periods, len(days))
+    last = np.zeros(n_periods, dtype=int)
+    np.minimum.at(first, group, np.arange(len(days)))
+    np.maximum.at(last, group, np.arange(len(days)))
+    per_period = pd.DataFrame({
+        "period": period_codes,
+        "start_date": days[first].strftime("%Y-%m-%d"),
+        "end_date": days[last].strftime("%Y-%m-%d"),
+        "market_return": period_ret if method == "carino" else period_log,
+        "trading_days": np.bincount(group, minlength=n_periods),
+    })
+    return per_stock, per_industry, per_period
+
+
+def _fmt_pct(value: float) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "N/A"
+    return f"{value * 100:.2f}%"
+
+
+def write_attribution_markdown(
+    per_stock: pd.DataFrame,
+    per_industry: pd.DataFrame,
+    per_period: pd.DataFrame,
+    output_path: Path,
+    top_n: int = 5,
+    method: str = "carino",
+) -> None:
+    method_label = "Carino 連結" if method == "carino" else "對數連結（加總為 ln(1+R)）"
+    lines: List[str] = [
+        "# 台股區間報酬貢獻歸因（市值加權）",
+        "",
+        f"- 方法：每日 權重_市值×日報酬，以 {method_label} 跨日複利調整，個股/族群貢獻合計等於區間大盤報酬。",
+        "- 權重：昨收×已發行股數；股數取自上市公司基本資料.csv。",
+        "",
+    ]
+    for _, period in per_period.iterrows():
+        key = period["period"]
+        lines.append(f"## {key}（{period['start_date']} ~ {period['end_date']}，{int(period['trading_days'])} 個交易日）")
+        lines.append(f"- 市值加權大盤：{_fmt_pct(period['market_return'])}")
+        lines.append("")
+
+        sectors = per_industry[per_industry["period"] == key].sort_values("cap_contrib", ascending=False)
+        lines.append("### 族群貢獻")
+        lines.append("| 產業 | 貢獻 | 檔數 |")
+        lines.append("| --- | --- | --- |")
+        shown = pd.concat([sectors.head(top_n), sectors.tail(top_n)]).drop_duplicates("產業別")
+        for _, row in shown.iterrows():
+            label = f"{row['產業別']}-{row.get('產業名稱', '') or ''}".rstrip("-")
+            lines.append(f"| {label} | {_fmt_pct(row['cap_contrib'])} | {int(row['count'])} |")
+        lines.append("")
+
+        stocks = per_stock[per_stock["period"] == key].sort_values("貢獻度", ascending=False)
+        lines.append(f"### 個股貢獻（前後各 {top_n}）")
+        lines.append("| 公司代號 | 公司名稱 | 區間報酬 | 平均權重 | 貢獻 |")
+        lines.append("| --- | --- | --- | --- | --- |")
+        shown = pd.concat([stocks.head(top_n), stocks.tail(top_n)]).drop_duplicates("ticker")
+        for _, row in shown.iterrows():
+            lines.append(
+                f"| {row['公司代號']} | {row['公司名稱']} | {_fmt_pct(row['區間報酬'])} | "
+                f"{_fmt_pct(row['平均權重'])} | {_fmt_pct(row['貢獻度'])} |"
+            )
+        lines.append("")
+
+    output_path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Attribute multi-period TWSE returns to stocks and sectors.")
+    parser.add_argument("--start", required=True, help="First trading day YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="Last trading day YYYY-MM-DD")
+    parser.add_argument("--freq", help="Split into periods, e.g. M (monthly), Q, W; default one period")
+    parser.add_argument("--method", choices=["carino", "log"], default="carino")
+    parser.add_argument("--listed-csv", default="data/上市公司基本資料.csv")
+    parser.add_argument("--industry-csv", default="data/industry_codes.csv")
+    parser.add_argument("--otc-csv", help="Optional path to 上櫃公司基本資料.csv to include TPEx (.TWO) stocks")
+    parser.add_argument("--output_md", required=True, help="Output Markdown path")
+    parser.add_argument("--output_csv", help="Optional CSV of per-stock contributions")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--batch_size", type=int, default=180)
+    args = parser.parse_args()
+
+    start_ts = pd.to_datetime(args.start).normalize()
+    end_ts = pd.to_datetime(args.end).normalize()
+    prices = download_twse_price_history(
+        listed_csv_path=args.listed_csv,
+        start_date=(start_ts - pd.Timedelta(days=10)).strftime("%Y-%m-%d"),
+        end_date=(end_ts + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+        batch_size=args.batch_size,
+        otc_csv_path=args.otc_csv,
+    )
+    prices.index = pd.to_datetime(prices.index)
+    base_df = _read_tw_universe(args.listed_csv, args.otc_csv)
+    try:
+        industry_map = _read_industry_codes(args.industry_csv)
+    except Exception:
+        industry_map = {}
+
+    per_stock, per_industry, per_period = attribute_contributions(
+        prices,
+        base_df,
+        start=args.start,
+        end=args.end,
+        freq=args.freq,
+        method=args.method,
+        industry_map=industry_map,
+    )
+    output_path = Path(args.output_md)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    write_attribution_markdown(per_stock, per_industry, per_period, output_path, args.top_n, args.method)
+    if args.output_csv:
+        per_stock.to_csv(args.output_csv, index=False, encoding="utf-8-sig")
+    print(f"已輸出 {output_path}（{len(per_period)} 個期間、{per_stock['ticker'].nunique()} 檔個股）")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,13 @@ from typing import Dict, Optional
 
 import pandas as pd
 
-from stock_analyzer import analyze_twse_today_by_sector, download_twse_price_history
+from sector_index_store import update_sector_index_store
+from stock_analyzer import (
+    _read_industry_codes,
+    _read_tw_universe,
+    analyze_twse_today_by_sector,
+    download_twse_price_history,
+)
 
 
 SECTOR_REASON_HINTS: Dict[str, str] = {
@@ -147,6 +153,7 @@ def run_reports(
     top_n: int,
     stocks_per_sector: int,
     preloaded_prices: Optional[pd.DataFrame] = None,
+    otc_csv: Optional[str] = None,
 ) -> None:
     if target_date:
         date_obj = pd.to_datetime(target_date).date()
@@ -163,6 +170,7 @@ def run_reports(
         industry_codes_path=industry_csv,
         target_date=display_date,
         preloaded_prices=preloaded_prices,
+        otc_csv_path=otc_csv,
     )
 
     per_stock = _ensure_columns(per_stock)
@@ -191,6 +199,8 @@ def run_batch(
     top_n: int,
     stocks_per_sector: int,
     batch_size: int,
+    index_store: Optional[Path] = None,
+    otc_csv: Optional[str] = None,
 ) -> None:
     start_ts = pd.to_datetime(start_date).normalize()
     end_ts = pd.to_datetime(end_date).normalize()
@@ -201,6 +211,7 @@ def run_batch(
         start_date=buffer_start,
         end_date=buffer_end,
         batch_size=batch_size,
+        otc_csv_path=otc_csv,
     )
     prices.index = pd.to_datetime(prices.index)
     trading_days = [
@@ -217,13 +228,30 @@ def run_batch(
             top_n=top_n,
             stocks_per_sector=stocks_per_sector,
             preloaded_prices=prices,
+            otc_csv=otc_csv,
         )
 
+    if index_store is not None and trading_days:
+        try:
+            industry_map = _read_industry_codes(industry_csv)
+        except Exception:
+            industry_map = {}
+        try:
+            update_sector_index_store(
+                store_dir=index_store,
+                adj=prices.loc[: trading_days[-1]],
+                base_df=_read_tw_universe(listed_csv, otc_csv),
+                industry_map=industry_map,
+            )
+        except ValueError as exc:
+            print(f"族群指數庫未更新：{exc}")
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate daily TWSE sector and stock reports.")
     parser.add_argument("--listed-csv", default="data/上市公司基本資料.csv", help="Path to 上市公司基本資料.csv")
     parser.add_argument("--industry-csv", default="data/industry_codes.csv", help="Path to industry_codes.csv")
+    parser.add_argument("--otc-csv", help="Optional path to 上櫃公司基本資料.csv to include TPEx (.TWO) stocks")
     parser.add_argument("--analysis-dir", default="分析報告", help="Directory for output Markdown files")
     parser.add_argument("--top-n", type=int, default=3, help="Number of top sectors to analyze in detail")
     parser.add_argument("--stocks-per-sector", type=int, default=5, help="Stocks to list per sector")
@@ -231,6 +259,7 @@ def main() -> None:
     parser.add_argument("--batch_start", help="YYYY-MM-DD start date for batch processing")
     parser.add_argument("--batch_end", help="YYYY-MM-DD end date for batch processing")
     parser.add_argument("--batch_size", type=int, default=180, help="Batch size for price downloads")
+    parser.add_argument("--index-store", help="Sector index store directory to extend after a batch run")
 
     args = parser.parse_args()
 
@@ -246,6 +275,8 @@ def main() -> None:
             top_n=args.top_n,
             stocks_per_sector=args.stocks_per_sector,
             batch_size=args.batch_size,
+            index_store=Path(args.index_store) if args.index_store else None,
+            otc_csv=args.otc_csv,
         )
     else:
         run_reports(
@@ -255,6 +286,7 @@ def main() -> None:
             analysis_dir=analysis_dir,
             top_n=args.top_n,
             stocks_per_sector=args.stocks_per_sector,
+            otc_csv=args.otc_csv,
         )
 
 
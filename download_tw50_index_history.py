@@ -1,8 +1,14 @@
-import requests
+import argparse
 import datetime
-import time
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from rate_limit import TokenBucket
 
 # --- 組態設定 ---
 DATA_DIR = "data"
@@ -12,71 +18,162 @@ END_YEAR = 2025
 END_MONTH = 10
 BASE_URL = "https://www.twse.com.tw/rwd/zh/FTSE/TAI50I"
 
+# 速率限制：平均每秒請求數與瞬間可連發數（TWSE 約可容忍每 2~3 秒一次）
+RATE_PER_SEC = 0.4
+BURST = 2
+MAX_WORKERS = 3
+MAX_RETRIES = 3
+
 # 偽裝成瀏覽器發送請求，可提高成功率
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
-def generate_months():
+
+def generate_months(start=(START_YEAR, START_MONTH), end=(END_YEAR, END_MONTH)):
     """產生器函式：生成所有需要抓取的年月"""
-    year = START_YEAR
-    month = START_MONTH
+    year, month = start
     while True:
         yield year, month
-        if year == END_YEAR and month == END_MONTH:
+        if (year, month) == tuple(end):
             break
         month += 1
         if month > 12:
             month = 1
             year += 1
 
-def fetch_and_save():
-    """主程式：每個月的資料抓取並立即儲存成獨立檔案"""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    print(f"開始抓取資料，每筆將儲存至 {DATA_DIR}/")
 
-    for year, month in generate_months():
-        date_str = f"{year}{month:02d}01"
-        url = f"{BASE_URL}?date={date_str}&response=json"
-        filename = os.path.join(DATA_DIR, f"TAI50I_{year}-{month:02d}.json")
+def _is_finalized(year, month, today=None):
+    """該月份已結束（資料不會再變動）才算定稿；當月檔案每次都重新抓取。"""
+    today = today or datetime.date.today()
+    return (year, month) < (today.year, today.month)
 
-        # 若檔案已存在則跳過
-        if os.path.exists(filename):
-            print(f"{filename} 已存在，跳過。")
-            continue
 
-        print(f"正在抓取 {year}-{month:02d} 的資料...", end='', flush=True)
-        try:
-            response = requests.get(url, headers=HEADERS, timeout=10)
-            response.raise_for_status()
+def _needs_fetch(filename, year, month, today=None):
+    """檔案不存在、月份未結束，或檔案是在該月結束前抓的（內容不完整）就需要抓取。"""
+    if not os.path.exists(filename) or not _is_finalized(year, month, today):
+        return True
+    month_end = datetime.date(year + month // 12, month % 12 + 1, 1)
+    fetched_on = datetime.date.fromtimestamp(os.path.getmtime(filename))
+    return fetched_on < month_end
 
-            data = response.json()
-            if data.get("stat") == "OK":
-                with open(filename, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(" ✅ 成功！已儲存。")
-            else:
-                print(f" ❌ 失敗 (stat: {data.get('stat')})")
 
+def _atomic_write_json(filename, data):
+    tmp = f"{filename}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, filename)
+
+
+def fetch_month(session, bucket, base_url, data_dir, year, month):
+    """抓取單月資料；回傳 (year, month, 狀態訊息)。遇到 HTTP 429/5xx 或連線錯誤會退避重試，其他 4xx 直接失敗。"""
+    date_str = f"{year}{month:02d}01"
+    url = f"{base_url}?date={date_str}&response=json"
+    filename = os.path.join(data_dir, f"TAI50I_{year}-{month:02d}.json")
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            response = session.get(url, headers=HEADERS, timeout=10)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.exceptions.HTTPError(f"HTTP {response.status_code}")
+            if response.status_code >= 400:
+                return year, month, f"❌ HTTP {response.status_code}（不重試）"
+            data = response.json()
         except requests.exceptions.RequestException as e:
-            print(f" ❌ 網路錯誤: {e}")
+            if attempt == MAX_RETRIES:
+                return year, month, f"❌ 網路錯誤: {e}"
+            time.sleep(2 ** attempt)
+            continue
         except json.JSONDecodeError:
-            print(" ❌ 回傳內容非有效 JSON")
+            return year, month, "❌ 回傳內容非有效 JSON"
+
+        if data.get("stat") == "OK":
+            _atomic_write_json(filename, data)
+            return year, month, "✅ 成功！已儲存。"
+        return year, month, f"❌ 失敗 (stat: {data.get('stat')})"
+    return year, month, "❌ 重試次數用盡"
+
+
+def fetch_and_save(
+    data_dir=DATA_DIR,
+    base_url=BASE_URL,
+    start=(START_YEAR, START_MONTH),
+    end=(END_YEAR, END_MONTH),
+    rate=RATE_PER_SEC,
+    burst=BURST,
+    max_workers=MAX_WORKERS,
+):
+    """主程式：以權杖桶限速、小併發窗口抓取各月資料，並以原子寫入各自儲存成獨立檔案"""
+    os.makedirs(data_dir, exist_ok=True)
+    print(f"開始抓取資料，每筆將儲存至 {data_dir}/（{rate:g} 次/秒，併發 {max_workers}）")
+
+    pending = []
+    for year, month in generate_months(start, end):
+        filename = os.path.join(data_dir, f"TAI50I_{year}-{month:02d}.json")
+        # 過去月份的檔案若是在月底之後抓的就是完整的，跳過；當月或月中抓的檔案需重抓
+        if not _needs_fetch(filename, year, month):
+            continue
+        pending.append((year, month))
+
+    if not pending:
+        print("所有月份皆已存在，無需抓取。")
+        return
 
-        # 禮貌性暫停，避免被封鎖
-        time.sleep(5)
+    bucket = TokenBucket(rate, burst)
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(fetch_month, session, bucket, base_url, data_dir, year, month)
+            for year, month in pending
+        ]
+        for future in as_completed(futures):
+            year, month, status = future.result()
+            print(f"{year}-{month:02d} {status}", flush=True)
 
     print("\n✅ 全部資料抓取完成！")
 
+
+def _parse_year_month(value):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
 if __name__ == "__main__":
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="台灣50報酬指數歷史資料批次下載")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--base-url", default=BASE_URL, help="可指向本機測試伺服器")
+    parser.add_argument("--start", default=f"{START_YEAR}-{START_MONTH:02d}", help="YYYY-MM")
+    parser.add_argument("--end", default=f"{today.year}-{today.month:02d}", help="YYYY-MM（預設當月）")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SEC, help="平均每秒請求數")
+    parser.add_argument("--burst", type=int, default=BURST, help="權杖桶容量（可連發次數）")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="同時進行的請求數")
+    args = parser.parse_args()
+    try:
+        start, end = _parse_year_month(args.start), _parse_year_month(args.end)
+    except ValueError:
+        parser.error("--start / --end 格式須為 YYYY-MM")
+    if not (1 <= start[1] <= 12 and 1 <= end[1] <= 12):
+        parser.error("--start / --end 的月份須介於 01 與 12")
+    if start > end:
+        parser.error(f"--start {args.start} 晚於 --end {args.end}")
+
     print("======================================================")
     print("台灣50報酬指數歷史資料批次下載腳本")
     print("======================================================")
-    print(f"預計抓取區間: {START_YEAR}/{START_MONTH} - {END_YEAR}/{END_MONTH}")
-    print("每月資料將各自儲存在 data/ 目錄中。")
+    print(f"預計抓取區間: {args.start} - {args.end}")
+    print(f"每月資料將各自儲存在 {args.data_dir}/ 目錄中。")
     print("------------------------------------------------------")
 
     try:
-        fetch_and_save()
+        fetch_and_save(
+            data_dir=args.data_dir,
+            base_url=args.base_url,
+            start=start,
+            end=end,
+            rate=args.rate,
+            burst=args.burst,
+            max_workers=args.workers,
+        )
     except KeyboardInterrupt:
-        print("\n\n⚠️ 操作已由使用者取消。")
\ No newline at end of file
+        print("\n\n⚠️ 操作已由使用者取消。")
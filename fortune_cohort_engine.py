@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Multi-year Fortune Global 500 cohorts vs VT in one process.
+
+The gemini analyzers handle one ranking year per run: they shell out to
+`stock_analyzer.py compare_returns` with ~100 tickers on the command line and
+parse its stdout. This engine instead
+
+1. loads every `fortune_global500_YYYY.csv` that has a ticker column,
+2. takes the top-N of each year as a cohort, starting on the list's
+   publication date (the date in its fortunechina.com URL in list.html),
+3. downloads ONE Adj Close panel for the union of all cohort tickers + VT,
+4. computes every (cohort year × company) return to the end date from that panel.
+
+Returns follow `compare_returns`: first valid price on/after the start date,
+last valid price on/before the end date. Those lookups are one
+forward/backward "next valid row" pass over the panel, shared by all cohorts.
+
+Usage:
+    python fortune_cohort_engine.py --top-n 100 --end 2025-10-23 \
+        --output_csv 歷年全球500大公司/cohort_returns.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from price_panel import normalize_daily_index, valid_row_lookups
+from stock_analyzer import _annualize_days, _download_adj_close_batches
+
+GLOBAL500_DIR = Path(__file__).resolve().parent / "歷年全球500大公司"
+CSV_DIR = GLOBAL500_DIR / "csv_with_ticker"
+LIST_FILE = GLOBAL500_DIR / "list.html"
+BENCHMARK_TICKER = "VT"
+TOP_N = 100
+_URL_DATE = re.compile(r'href="[^"]*?(\d{4})-(\d{2})/(\d{2})/content_\d+\.htm"\s+data-year="(\d{4})"')
+
+
+@dataclass
+class Cohort:
+    year: int
+    start: str                 # YYYY-MM-DD publication date of the ranking
+    members: pd.DataFrame      # rank, company, ticker ("" when none)
+
+
+def publication_dates(list_file: Path = LIST_FILE) -> Dict[int, str]:
+    """Ranking year -> publication date, read from the article URLs in list.html."""
+    if not Path(list_file).exists():
+        return {}
+    text = Path(list_file).read_text(encoding="utf-8")
+    return {int(year): f"{y}-{m}-{d}" for y, m, d, year in _URL_DATE.findall(text)}
+
+
+def _clean_ticker(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    text = str(value).strip()
+    return "" if text.lower() in {"", "nan", "none"} else text
+
+
+def load_cohorts(
+    csv_dir: Path = CSV_DIR,
+    top_n: int = TOP_N,
+    years: Optional[Iterable[int]] = None,
+    start_overrides: Optional[Dict[int, str]] = None,
+    corrections: Optional[Dict[str, str]] = None,
+) -> List[Cohort]:
+    """Top-N members of every ranking CSV with a `ticker` column.
+
+    `corrections` maps company name -> ticker and wins over the CSV value;
+    `start_overrides` replaces the publication date for specific years.
+    """
+    dates = publication_dates()
+    dates.update(start_overrides or {})
+    wanted = set(years) if years else None
+    cohorts: List[Cohort] = []
+    for path in sorted(Path(csv_dir).glob("fortune_global500_*.csv")):
+        year = int(path.stem.rsplit("_", 1)[-1])
+        if wanted is not None and year not in wanted:
+            continue
+        if year not in dates:
+            print(f"略過 {year}：找不到榜單公布日期")
+            continue
+        df = pd.read_csv(path, encoding="utf-8-sig")
+        if "ticker" not in df.columns:
+            continue
+        company_col = next(c for c in df.columns if "公司" in c)
+        members = pd.DataFrame({
+            "rank": pd.to_numeric(df.iloc[:, 0], errors="coerce"),
+            "company": df[company_col].astype(str).str.strip(),
+            "ticker": [_clean_ticker(t) for t in df["ticker"]],
+        }).head(top_n)
+        if corrections:
+            fixed = members["company"].map(corrections)
+            members["ticker"] = fixed.where(fixed.notna(), members["ticker"])
+        cohorts.append(Cohort(year=year, start=dates[year], members=members.reset_index(drop=True)))
+    return cohorts
+
+
+def fetch_price_panel(
+    tickers: List[str],
+    start: str,
+    end: str,
+    batch_size: int = 180,
+    on_batch: Optional[Callable] = None,
+) -> pd.DataFrame:
+    """One Adj Close panel (naive daily index) covering every ticker."""
+    end_plus = (pd.to_datetime(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    panel = _download_adj_close_batches(
+        tickers, batch_size=batch_size, start=start, end=end_plus, period=None, on_batch=on_batch
+    )
+    return normalize_daily_index(panel)
+
+
+def cohort_returns(
+    cohorts: List[Cohort],
+    panel: pd.DataFrame,
+    end: str,
+    benchmark: str = BENCHMARK_TICKER,
+) -> pd.DataFrame:
+    """Long (cohort year × company) table of returns from each cohort's start to `end`."""
+    dates = panel.index.values.astype("datetime64[D]")
+    values = panel.to_numpy(dtype=float)
+    next_valid, prev_valid = valid_row_lookups(values)
+    col_of = {str(c): i for i, c in enumerate(panel.columns)}
+    end_row = int(np.searchsorted(dates, np.datetime64(end, "D"), side="right")) - 1
+
+    def _lookup(ticker: str, start_row: int) -> Tuple[Optional[int], Optional[int], str]:
+        col = col_of.get(ticker)
+        if col is None:
+            return None, None, "No price data downloaded"
+        if start_row >= len(dates) or end_row < 0:
+            return None, None, "No valid data in range"
+        first, last = next_valid[start_row, col], prev_valid[end_row, col]
+        if first < 0 or last < 0 or first > last:
+            return None, None, "No valid data in range"
+        return int(first), int(last), ""
+
+    records = []
+    for cohort in cohorts:
+        start_row = int(np.searchsorted(dates, np.datetime64(cohort.start, "D"), side="left"))
+        b_first, b_last, _ = _lookup(benchmark, start_row)
+        bench_ret = (
+            values[b_last, col_of[benchmark]] / values[b_first, col_of[benchmark]] - 1.0
+            if b_first is not None else np.nan
+        )
+        for member in cohort.members.itertuples(index=False):
+            record = {
+                "cohort_year": cohort.year,
+                "rank": member.rank,
+                "company": member.company,
+                "ticker": member.ticker,
+                "start": cohort.start,
+                "benchmark_return": bench_ret,
+            }
+            if not member.ticker:
+                record["error"] = "No ticker"
+                records.append(record)
+                continue
+            first, last, error = _lookup(member.ticker, start_row)
+            if error:
+                record["error"] = error
+                records.append(record)
+                continue
+            col = col_of[member.ticker]
+            start_price, end_price = values[first, col], values[last, col]
+            total = end_price / start_price - 1.0
+            years = _annualize_days(int((dates[last] - dates[first]).astype(int)))
+            record.update({
+                "start_date": str(dates[first]),
+                "end_date": str(dates[last]),
+                "start_price": round(float(start_price), 6),
+                "end_price": round(float(end_price), 6),
+                "total_return": total,
+                "cagr": (end_price / start_price) ** (1.0 / years) - 1.0,
+                "excess_return": total - bench_ret,
+                "beat_benchmark": bool(total > bench_ret) if np.isfinite(bench_ret) else None,
+            })
+            records.append(record)
+
+    columns = [
+        "cohort_year", "rank", "company", "ticker", "start", "start_date", "end_date",
+        "start_price", "end_price", "total_return", "cagr", "benchmark_return",
+        "excess_return", "beat_benchmark", "error",
+    ]
+    return pd.DataFrame.from_records(records).reindex(columns=columns)
+
+
+def cohort_summary(table: pd.DataFrame) -> pd.DataFrame:
+    """Per-cohort equal-weight mean/median return, VT return and win rate (vs all members)."""
+    grouped = table.groupby("cohort_year")
+    summary = pd.DataFrame({
+        "start": grouped["start"].first(),
+        "members": grouped.size(),
+        "valid": grouped["total_return"].count(),
+        "benchmark_return": grouped["benchmark_return"].first(),
+        "mean_return": grouped["total_return"].mean(),
+        "median_return": grouped["total_return"].median(),
+        "win_count": grouped["beat_benchmark"].apply(lambda s: int((s == True).sum())),  # noqa: E712
+    })
+    summary["win_rate"] = summary["win_count"] / summary["members"]
+    return summary
+
+
+def run_cohorts(
+    csv_dir: Path = CSV_DIR,
+    top_n: int = TOP_N,
+    years: Optional[Iterable[int]] = None,
+    end: Optional[str] = None,
+    benchmark: str = BENCHMARK_TICKER,
+    start_overrides: Optional[Dict[int, str]] = None,
+    corrections: Optional[Dict[str, str]] = None,
+    batch_size: int = 180,
+    on_batch: Optional[Callable] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Load cohorts, fetch one shared price panel and return (per-company table, per-cohort summary).
+
+    `on_batch` is passed to the downloader (see `_download_adj_close_batches`).
+    """
+    end = end or dt.date.today().isoformat()
+    cohorts = load_cohorts(csv_dir, top_n, years, start_overrides, corrections)
+    if not cohorts:
+        raise ValueError(f"No ranking CSV with a ticker column found in {csv_dir}")
+    tickers = sorted({t for c in cohorts for t in c.members["ticker"] if t} | {benchmark})
+    earliest = min(c.start for c in cohorts)
+    panel = fetch_price_panel(tickers, earliest, end, batch_size, on_batch)
+    table = cohort_returns(cohorts, panel, end, benchmark)
+    return table, cohort_summary(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fortune Global 500 top-N cohorts vs VT, every ranking year at once.")
+    parser.add_argument("--csv-dir", default=str(CSV_DIR), help="Directory of fortune_global500_YYYY.csv with tickers")
+    parser.add_argument("--years", type=int, nargs="+", help="Only these ranking years")
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    parser.add_argument("--end", help="YYYY-MM-DD; defaults to today")
+    parser.add_argument("--benchmark", default=BENCHMARK_TICKER)
+    parser.add_argument("--output_csv", help="Per (cohort year, company) returns")
+    parser.add_argument("--summary_csv", help="Per-cohort summary")
+    parser.add_argument("--batch_size", type=int, default=180)
+    args = parser.parse_args()
+
+    table, summary = run_cohorts(
+        Path(args.csv_dir), args.top_n, args.years, args.end, args.benchmark, batch_size=args.batch_size
+    )
+    for path, frame, index in ((args.output_csv, table, False), (args.summary_csv, summary, True)):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            frame.to_csv(path, index=index, encoding="utf-8-sig")
+
+    out = {
+        str(year): {
+            "start": row["start"],
+            "valid": int(row["valid"]),
+            "members": int(row["members"]),
+            "benchmark_return_pct": round(float(row["benchmark_return"]) * 100, 4),
+            "mean_return_pct": round(float(row["mean_return"]) * 100, 4),
+            "median_return_pct": round(float(row["median_return"]) * 100, 4),
+            "win_rate": round(float(row["win_rate"]), 4),
+        }
+        for year, row in summary.iterrows()
+    }
+    print(json.dumps(out, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
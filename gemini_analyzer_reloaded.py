@@ -1,7 +1,7 @@
 import pandas as pd
-import json
 import os
-import subprocess
+
+from fortune_cohort_engine import run_cohorts
 
 # --- Configuration ---
 START_DATE_STR = "2008-10-15"
@@ -12,7 +12,7 @@ BENCHMARK_TICKER = "VT"
 # --- File Paths ---
 CWD = "/Users/david/Library/Mobile Documents/com~apple~CloudDocs/0notebook-fromGithub/資產配置"
 INPUT_CSV = os.path.join(CWD, "歷年全球500大公司/csv_with_ticker/fortune_global500_2008.csv")
-STOCK_ANALYZER_SCRIPT = os.path.join(CWD, "stock_analyzer.py")
+COHORT_YEAR = 2008
 OUTPUT_RETURNS_CSV = os.path.join(CWD, "歷年全球500大公司/2008_top100_returns_gemini.csv")
 OUTPUT_FAILURES_CSV = os.path.join(CWD, "歷年全球500大公司/2008_top100_failures_gemini.csv")
 OUTPUT_SUMMARY_MD = os.path.join(CWD, "分析報告/2008_top100_summary_gemini.md")
@@ -34,73 +34,40 @@ NO_TICKER_COMPANIES = [
     "U.S. Postal Service", "Lukoil", "Toshiba", "Petronas", "Suez", "Merrill Lynch"
 ]
 
-def get_tickers_to_process():
-    """Reads CSV, applies corrections, and returns a list of tickers."""
-    df = pd.read_csv(INPUT_CSV)
-    df.rename(columns={'公司': 'company'}, inplace=True)
-    df_top100 = df.head(TOP_N).copy()
-    df_top100['ticker'] = df_top100['ticker'].astype(str)
-
-    company_to_ticker_map = dict(zip(df_top100['company'], df_top100['ticker']))
-
-    for company, ticker in TICKER_CORRECTIONS.items():
-        df_top100.loc[df_top100['company'] == company, 'ticker'] = ticker
-
-    tickers = df_top100['ticker'].unique().tolist()
-    tickers = [t for t in tickers if pd.notna(t) and t.lower() != 'nan']
-    
-    # Ensure benchmark is in the list
-    if BENCHMARK_TICKER not in tickers:
-        tickers.append(BENCHMARK_TICKER)
-        
-    return tickers, dict(zip(df_top100['ticker'], df_top100['company']))
-
 def main():
     """Main execution function."""
-    tickers, ticker_to_company_map = get_tickers_to_process()
-
-    # 1. Run stock_analyzer.py to get the data
-    cmd = [
-        "python3", STOCK_ANALYZER_SCRIPT, "compare_returns",
-        "--tickers"] + tickers + [
-        "--start", START_DATE_STR,
-        "--end", END_DATE_STR
-    ]
-    
-    process = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-    if process.returncode != 0:
-        print(f"Error running stock_analyzer.py: {process.stderr}")
-        return
-
-    try:
-        analysis_result = json.loads(process.stdout)
-    except json.JSONDecodeError:
-        print(f"Failed to decode JSON from stock_analyzer.py output: {process.stdout}")
-        return
+    # 1. Compute the cohort's returns in-process (one shared price panel, no subprocess)
+    table, _ = run_cohorts(
+        csv_dir=os.path.dirname(INPUT_CSV),
+        top_n=TOP_N,
+        years=[COHORT_YEAR],
+        end=END_DATE_STR,
+        benchmark=BENCHMARK_TICKER,
+        start_overrides={COHORT_YEAR: START_DATE_STR},
+        corrections=TICKER_CORRECTIONS,
+    )
 
     # 2. Process the results
     returns_data = []
     failures_data = []
-    vt_return = None
-
-    # Map original company names back to the results
-    for item in analysis_result.get("items", []):
-        ticker = item.get('ticker')
-        company_name = ticker_to_company_map.get(ticker, ticker) # Default to ticker if no name
-        
-        if "error" in item:
-            failures_data.append({"company": company_name, "ticker": ticker, "reason": item["error"]})
+    vt_return = table["benchmark_return"].iloc[0] if not table.empty else None
+    if pd.isna(vt_return):
+        vt_return = None
+
+    for item in table.itertuples(index=False):
+        if item.company in NO_TICKER_COMPANIES or not item.ticker:
+            continue
+        if pd.notna(item.error):
+            failures_data.append({"company": item.company, "ticker": item.ticker, "reason": item.error})
         else:
             returns_data.append({
-                "company": company_name,
-                "ticker": ticker,
-                "start_price": item["start_price"],
-                "end_price": item["end_price"],
-                "total_return": item["total_return"]
+                "company": item.company,
+                "ticker": item.ticker,
+                "start_price": item.start_price,
+                "end_price": item.end_price,
+                "total_return": item.total_return
             })
-            if ticker == BENCHMARK_TICKER:
-                vt_return = item["total_return"]
-    
+
     # Add companies that had no ticker to begin with
     for company in NO_TICKER_COMPANIES:
         failures_data.append({"company": company, "ticker": "", "reason": "No ticker provided in source"})
@@ -163,7 +130,7 @@ def main():
 
 約四分之一的公司在此期間的表現超越了VT，這些公司主要集中在科技、醫療保健和非必需消費品領域，成功抓住了數位轉型、健康需求增長和全球消費升級的浪潮。特別是蘋果（Apple）以驚人的報酬率獨佔鰲頭，反映了其在智慧型手機時代的絕對主導地位。
 
-- **超越VT比例**: {win_count / valid_returns_count:.2% if valid_returns_count > 0 else 0}
+- **超越VT比例**: {(win_count / valid_returns_count if valid_returns_count > 0 else 0):.2%}
 - **產業特徵**: 科技硬體、軟體服務、醫療保健、零售。
 
 **報酬率前10名 (Top 10)**
@@ -176,7 +143,7 @@ def main():
 
 超過七成的公司表現不及VT，其中金融和能源產業成為重災區。許多在2008年名列前茅的銀行（如美國銀行、花旗集團）至今未能從金融海嘯的衝擊中完全恢復，股價長期低迷。傳統能源公司則面臨油價波動和轉型壓力。此現象凸顯了單一產業的週期性風險以及持有指數型產品分散風險的優勢。
 
-- **落後VT比例**: {(valid_returns_count - win_count) / valid_returns_count:.2% if valid_returns_count > 0 else 0}
+- **落後VT比例**: {((valid_returns_count - win_count) / valid_returns_count if valid_returns_count > 0 else 0):.2%}
 - **產業特徵**: 金融服務（特別是銀行）、傳統能源（石油與天然氣）、汽車製造。
 
 **報酬率後10名 (Bottom 10)**
@@ -210,14 +177,14 @@ def main():
     with open(OUTPUT_SUMMARY_MD, 'w', encoding='utf-8') as f:
         f.write(md_content)
 
-    print("---"任務完成"---")
+    print("--- 任務完成 ---")
     if not returns_df.empty:
         print(f"VT 總報酬: {vt_return:.2%}")
         print(f"等權重平均報酬: {avg_return:.2%}")
         print(f"勝率 (相對100家母體): {win_rate:.2%}")
         print(f"Top 1 公司: {top_10.iloc[0]['company']} ({top_10.iloc[0]['total_return']:.2%})")
         print(f"Bottom 1 公司: {bottom_10.iloc[-1]['company']} ({bottom_10.iloc[-1]['total_return']:.2%})")
-    print("\n---"輸出檔案路徑"---")
+    print("\n--- 輸出檔案路徑 ---")
     print(f"報酬數據: {OUTPUT_RETURNS_CSV}")
     print(f"失敗紀錄: {OUTPUT_FAILURES_CSV}")
     print(f"分析報告: {OUTPUT_SUMMARY_MD}")
@@ -1,13 +1,12 @@
-import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
-import numpy as np
 import os
 
+from fortune_cohort_engine import run_cohorts
+
 # --- Configuration ---
 START_DATE_STR = "2008-10-15"
 END_DATE_STR = "2025-10-23"
-DATE_BUFFER_DAYS = 5
+COHORT_YEAR = 2008
 TOP_N = 100
 BENCHMARK_TICKER = "VT"
 
@@ -47,102 +46,38 @@ NO_TICKER_COMPANIES = [
     "U.S. Postal Service", "Lukoil", "Toshiba", "Petronas", "Suez", "Merrill Lynch"
 ]
 
-def get_price_data(ticker, start_str, end_str):
-    """Downloads stock data for a given ticker and date range with buffers."""
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    buffer_start = start_date - timedelta(days=DATE_BUFFER_DAYS)
-    buffer_end = end_date + timedelta(days=DATE_BUFFER_DAYS)
-    
-    try:
-        data = yf.download(ticker, start=buffer_start, end=buffer_end, auto_adjust=True, progress=False)
-        if data.empty:
-            return None, "No data returned from yfinance"
-        
-        # Handle duplicate index entries by grouping by index and taking the mean
-        if not data.index.is_unique:
-            data = data.groupby(data.index).mean()
-            
-        return data, None
-    except Exception as e:
-        return None, f"yfinance download error: {e}"
-
-def calculate_return(data, start_str, end_str):
-    """Calculates total return from price data using nearest valid trading days."""
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-
-    try:
-        start_price_series = data.loc[start_date:]['Close'].dropna()
-        if start_price_series.empty:
-            return None, None, "Could not find valid start price"
-        start_price = start_price_series.head(1).item()
-    except (IndexError, ValueError):
-        return None, None, "Could not extract scalar start price"
-
-    try:
-        end_price_series = data.loc[:end_date]['Close'].dropna()
-        if end_price_series.empty:
-            return None, None, "Could not find valid end price"
-        end_price = end_price_series.tail(1).item()
-    except (IndexError, ValueError):
-        return None, None, "Could not extract scalar end price"
-
-    if start_price == 0:
-        return None, None, "Start price is zero"
-        
-    total_return = (end_price / start_price) - 1
-    return start_price, end_price, total_return
-
 def main():
     """Main execution function."""
-    # 1. Load and prepare data
-    df = pd.read_csv(INPUT_CSV)
-    df.rename(columns={'公司': 'company'}, inplace=True)
-    df_top100 = df.head(TOP_N).copy()
-    df_top100['ticker'] = df_top100['ticker'].astype(str)
-
-    # Apply manual ticker corrections
-    for company, ticker in TICKER_CORRECTIONS.items():
-        df_top100.loc[df_top100['company'] == company, 'ticker'] = ticker
+    # 1-2. Load the top-N cohort and compute every return from one shared price panel
+    table, _ = run_cohorts(
+        csv_dir=os.path.dirname(INPUT_CSV),
+        top_n=TOP_N,
+        years=[COHORT_YEAR],
+        end=END_DATE_STR,
+        benchmark=BENCHMARK_TICKER,
+        start_overrides={COHORT_YEAR: START_DATE_STR},
+        corrections=TICKER_CORRECTIONS,
+    )
 
     returns_data = []
     failures_data = []
-
-    # 2. Process each company
-    for _, row in df_top100.iterrows():
-        company = row['company']
-        ticker = row['ticker']
-
-        if company in NO_TICKER_COMPANIES or pd.isna(ticker) or ticker.lower() == 'nan':
-            failures_data.append({"company": company, "ticker": ticker, "reason": "No ticker provided in source or manual list"})
-            continue
-
-        data, error = get_price_data(ticker, START_DATE_STR, END_DATE_STR)
-        if error:
-            failures_data.append({"company": company, "ticker": ticker, "reason": error})
-            continue
-
-        start_p, end_p, total_ret = calculate_return(data, START_DATE_STR, END_DATE_STR)
-        if not isinstance(total_ret, (int, float)):
-            failures_data.append({"company": company, "ticker": ticker, "reason": total_ret})
+    for row in table.itertuples(index=False):
+        if row.company in NO_TICKER_COMPANIES or not row.ticker:
+            failures_data.append({"company": row.company, "ticker": row.ticker, "reason": "No ticker provided in source or manual list"})
+        elif pd.notna(row.error):
+            failures_data.append({"company": row.company, "ticker": row.ticker, "reason": row.error})
         else:
             returns_data.append({
-                "company": company,
-                "ticker": ticker,
-                "start_price": start_p,
-                "end_price": end_p,
-                "total_return": total_ret
+                "company": row.company,
+                "ticker": row.ticker,
+                "start_price": row.start_price,
+                "end_price": row.end_price,
+                "total_return": row.total_return
             })
 
-    # 3. Calculate benchmark (VT) return
-    vt_data, vt_error = get_price_data(BENCHMARK_TICKER, START_DATE_STR, END_DATE_STR)
-    if vt_error:
-        print(f"CRITICAL: Could not download data for benchmark {BENCHMARK_TICKER}. Aborting.")
-        return
-    
-    vt_start_p, vt_end_p, vt_return = calculate_return(vt_data, START_DATE_STR, END_DATE_STR)
-    if not isinstance(vt_return, (int, float)):
+    # 3. Benchmark (VT) return from the same panel
+    vt_return = table["benchmark_return"].iloc[0] if not table.empty else float("nan")
+    if pd.isna(vt_return):
         print(f"CRITICAL: Could not calculate return for benchmark {BENCHMARK_TICKER}. Aborting.")
         return
 
@@ -1,10 +1,20 @@
 import argparse
+import bisect
 import datetime as dt
 import json
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from columnar_store import is_fresh, read_columns, source_fingerprint, source_sha1, write_columns
 
 DATA_PATH = Path(__file__).resolve().parent / "data" / "0050成份股時間點回溯資料庫.json"
+# Compiled timeline: sorted effective dates + packed membership bitsets.
+TIMELINE_STORE = DATA_PATH.parent / ".cache" / f"{DATA_PATH.stem}.timeline"
+TIMELINE_FORMAT = "0050_timeline/1"
 
 # Some legacy codes were later relisted under new ticker numbers.
 # Map them so lookups always surface the up-to-date identifier.
@@ -59,23 +69,99 @@ def _build_timeline(
     return timeline
 
 
-def _constituents_as_of(
-    timeline: Iterable[Tuple[Optional[dt.date], Set[str]]],
-    target: dt.date,
-) -> Set[str]:
-    effective: Optional[Set[str]] = None
-    for event_date, members in timeline:
-        if event_date is None or event_date <= target:
-            effective = members
-        else:
-            break
-    if effective is None:
-        raise RuntimeError("Timeline is empty; cannot determine constituents.")
+@dataclass
+class CompiledTimeline:
+    """Constituent timeline as sorted effective dates plus membership bitsets.
+
+    Row k of `bits` is the (CODE_REMAP-normalized) member set effective from
+    `effective[k]` until the next entry; row 0 is the base set, effective from
+    `dt.date.min`.
+    """
+    effective: List[dt.date]
+    codes: List[str]
+    bits: np.ndarray                 # (n_entries, ceil(n_codes / 8)) uint8, packed
+    metadata: Dict[str, str]
+
+    def _row(self, target: dt.date) -> int:
+        return bisect.bisect_right(self.effective, target) - 1
+
+    def members_as_of(self, target: dt.date) -> Set[str]:
+        row = np.unpackbits(self.bits[self._row(target)], count=len(self.codes)).astype(bool)
+        return {code for code, member in zip(self.codes, row) if member}
+
+    def membership_matrix(self, dates: Sequence[dt.date]) -> np.ndarray:
+        """Boolean (date × code) matrix, columns ordered like `codes`."""
+        eff = np.array(self.effective, dtype="datetime64[D]")
+        targets = np.array(dates, dtype="datetime64[D]")
+        rows = np.searchsorted(eff, targets, side="right") - 1
+        return np.unpackbits(self.bits, axis=1, count=len(self.codes)).astype(bool)[rows]
+
+    def membership_between(self, start: dt.date, end: dt.date) -> Tuple[List[dt.date], np.ndarray]:
+        """Membership for every weekday (TWSE trading-day approximation) in [start, end]."""
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        days = days[np.is_busday(days)]
+        return days.astype(dt.date).tolist(), self.membership_matrix(days.astype(dt.date).tolist())
+
+
+def _compile_timeline(data: Dict) -> CompiledTimeline:
+    events = sorted(data["historical_changes"], key=lambda e: e["date"])
+    current = set(data["current_constituents"])
+    base = _compute_base_constituents(events, current)
+    timeline = _build_timeline(events, base)
+
+    codes = sorted({CODE_REMAP.get(c, c) for _, members in timeline for c in members})
+    col = {code: i for i, code in enumerate(codes)}
+    dense = np.zeros((len(timeline), len(codes)), dtype=bool)
+    for k, (_, members) in enumerate(timeline):
+        for code in members:
+            dense[k, col[CODE_REMAP.get(code, code)]] = True
+    effective = [dt.date.min] + [event_date for event_date, _ in timeline[1:]]
+    return CompiledTimeline(
+        effective=effective,
+        codes=codes,
+        bits=np.packbits(dense, axis=1),
+        metadata=dict(data["stock_metadata"]),
+    )
 
-    normalized: Set[str] = set()
-    for code in effective:
-        normalized.add(CODE_REMAP.get(code, code))
-    return normalized
+
+def load_timeline() -> CompiledTimeline:
+    """Load the compiled timeline, recompiling it only when the JSON database changed.
+
+    The in-process memo is keyed on the JSON file's size/mtime, so a
+    long-running process picks up an edited database on its next call.
+    """
+    fingerprint = source_fingerprint(DATA_PATH)
+    return _load_timeline(fingerprint["size"], fingerprint["mtime_ns"])
+
+
+@lru_cache(maxsize=1)
+def _load_timeline(size: int, mtime_ns: int) -> CompiledTimeline:
+    if not is_fresh(TIMELINE_STORE, DATA_PATH, TIMELINE_FORMAT):
+        compiled = _compile_timeline(_load_database())
+        try:
+            write_columns(
+                TIMELINE_STORE,
+                {
+                    "effective": np.array(compiled.effective, dtype="datetime64[D]"),
+                    "codes": np.array(compiled.codes, dtype=str),
+                    "bits": compiled.bits,
+                },
+                meta={
+                    "format": TIMELINE_FORMAT,
+                    "source": source_fingerprint(DATA_PATH),
+                    "sha1": source_sha1(DATA_PATH),
+                    "stock_metadata": compiled.metadata,
+                },
+            )
+        except OSError:
+            return compiled
+    cols, meta = read_columns(TIMELINE_STORE)
+    return CompiledTimeline(
+        effective=cols["effective"].astype(dt.date).tolist(),
+        codes=cols["codes"].astype(str).tolist(),
+        bits=np.asarray(cols["bits"]),
+        metadata=dict(meta["stock_metadata"]),
+    )
 
 
 def _format_output(
@@ -94,15 +180,21 @@ def _format_output(
 
 
 def query_constituents(as_of: dt.date, codes_only: bool = False) -> str:
-    data = _load_database()
-    events = sorted(data["historical_changes"], key=lambda e: e["date"])
-    current = set(data["current_constituents"])
-    base = _compute_base_constituents(events, current)
-    timeline = _build_timeline(events, base)
+    timeline = load_timeline()
+    ordered = sorted(timeline.members_as_of(as_of))
+    return _format_output(ordered, timeline.metadata, codes_only)
 
-    members = _constituents_as_of(timeline, as_of)
-    ordered = sorted(members)
-    return _format_output(ordered, data["stock_metadata"], codes_only)
+
+def write_membership_csv(start: dt.date, end: dt.date, path: Path) -> None:
+    """Write a weekday × code 0/1 membership matrix for [start, end] as CSV."""
+    timeline = load_timeline()
+    days, matrix = timeline.membership_between(start, end)
+    keep = matrix.any(axis=0)
+    codes = [code for code, k in zip(timeline.codes, keep) if k]
+    lines = [",".join(["date"] + codes)]
+    for day, row in zip(days, matrix[:, keep].astype(int)):
+        lines.append(",".join([day.isoformat()] + [str(v) for v in row]))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
 
 def main(argv: Optional[Sequence[str]] = None) -> None:
@@ -118,9 +210,22 @@ def main(argv: Optional[Sequence[str]] = None) -> None:
         action="store_true",
         help="Print codes only, without company names.",
     )
+    parser.add_argument(
+        "--matrix-through",
+        help="With --matrix-csv: end date (YYYY-MM or YYYY-MM-DD) of a daily membership matrix starting at DATE.",
+    )
+    parser.add_argument(
+        "--matrix-csv",
+        help="Write the weekday × code membership matrix to this CSV instead of printing a list.",
+    )
     args = parser.parse_args(argv)
 
     as_of = _parse_date(args.date)
+    if args.matrix_csv:
+        through = _parse_date(args.matrix_through) if args.matrix_through else dt.date.today()
+        write_membership_csv(as_of, through, Path(args.matrix_csv))
+        print(f"Wrote membership matrix {as_of} ~ {through} to {args.matrix_csv}")
+        return
     result = query_constituents(as_of, codes_only=args.codes_only)
     print(result)
 
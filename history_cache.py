@@ -0,0 +1,232 @@
+"""Daily OHLCV history cache for the MCP server (`mcp_stock.py`).
+
+Each ticker's full daily history (Open/High/Low/Close/Adj Close/Volume,
+``period="max"``) is kept in memory and in a per-ticker columnar store under
+``data/.cache/history/<ticker>.ohlcv``. Daily requests for any start/end or
+period are answered by slicing that frame, so one download per ticker per
+``max_age_minutes`` serves every daily query. A new process maps the stores
+back in without touching the network, which is what the server's startup
+warm-up does for its hot ticker set.
+
+The stores are shared by every server process on the machine. Before
+downloading, a process takes the ticker store's writer lock and re-reads
+the store, so when another instance has just refreshed a ticker (or is
+refreshing it now) this one maps that copy instead of downloading again.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import read_columns, read_meta, store_exists, store_lock, write_columns
+
+HISTORY_DIR = Path(__file__).resolve().parent / "data" / ".cache" / "history"
+HISTORY_FORMAT = "ohlcv_daily/1"
+MAX_AGE_MINUTES = 60.0
+# (store column, DataFrame column)
+FIELDS = (
+    ("open", "Open"),
+    ("high", "High"),
+    ("low", "Low"),
+    ("close", "Close"),
+    ("adj_close", "Adj Close"),
+    ("volume", "Volume"),
+)
+_PERIOD_MONTHS = {"1mo": 1, "3mo": 3, "6mo": 6, "1y": 12, "2y": 24, "5y": 60, "10y": 120}
+_PERIOD_ROWS = {"1d": 1, "5d": 5}
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now().replace(microsecond=0)
+
+
+def slice_history(
+    df: pd.DataFrame,
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    today: Optional[dt.date] = None,
+) -> Optional[pd.DataFrame]:
+    """The rows `yf.download` would return for start/end (end exclusive) or period.
+
+    Returns None for a period this cache cannot translate, so the caller can
+    fall back to a direct download.
+    """
+    if start or end:
+        window = df.loc[pd.Timestamp(start):] if start else df
+        return window.loc[window.index < pd.Timestamp(end)] if end else window
+    period = period or "1y"
+    if period == "max":
+        return df
+    if period in _PERIOD_ROWS:
+        return df.tail(_PERIOD_ROWS[period])
+    today = today or dt.date.today()
+    if period == "ytd":
+        return df.loc[pd.Timestamp(today.year, 1, 1):]
+    if period in _PERIOD_MONTHS:
+        return df.loc[pd.Timestamp(today) - pd.DateOffset(months=_PERIOD_MONTHS[period]):]
+    return None
+
+
+class HistoryCache:
+    """Thread-safe memory + disk cache of full daily histories, keyed by ticker."""
+
+    def __init__(self, root: Path = HISTORY_DIR, max_age_minutes: float = MAX_AGE_MINUTES):
+        self.root = Path(root)
+        self.max_age = dt.timedelta(minutes=max_age_minutes)
+        self._frames: Dict[str, Tuple[dt.datetime, pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "shared_hits": 0, "misses": 0, "stale_served": 0}
+
+    def _path(self, ticker: str) -> Path:
+        return self.root / f"{quote(ticker, safe='')}.ohlcv"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def note_stale_served(self) -> None:
+        """Count a stale entry that a caller served from `lookup` after an upstream failure."""
+        self._count("stale_served")
+
+    def _load(self, ticker: str) -> Optional[Tuple[dt.datetime, pd.DataFrame]]:
+        path = self._path(ticker)
+        if not store_exists(path) or read_meta(path).get("format") != HISTORY_FORMAT:
+            return None
+        cols, meta = read_columns(path)
+        frame = pd.DataFrame(
+            {name: cols[key] for key, name in FIELDS},
+            index=pd.DatetimeIndex(cols["dates"].astype("datetime64[ns]")),
+        )
+        return dt.datetime.fromisoformat(meta["fetched_at"]), frame
+
+    def lookup(self, ticker: str, reload_stale: bool = False) -> Optional[Tuple[dt.datetime, pd.DataFrame]]:
+        """(fetched_at, frame) from memory, else from disk (then kept in memory); None if absent.
+
+        With `reload_stale`, a stale in-memory copy is replaced by a newer stored one if
+        another process has refreshed it meanwhile (no download either way).
+        """
+        with self._lock:
+            entry = self._frames.get(ticker)
+        if entry is not None:
+            if reload_stale and not self.is_fresh(entry[0]):
+                return self._newer_on_disk(ticker, entry)
+            return entry
+        entry = self._load(ticker)
+        if entry is not None:
+            with self._lock:
+                self._frames.setdefault(ticker, entry)
+        return entry
+
+    def is_fresh(self, fetched_at: dt.datetime) -> bool:
+        return _now() - fetched_at <= self.max_age
+
+    def _newer_on_disk(
+        self, ticker: str, entry: Optional[Tuple[dt.datetime, pd.DataFrame]]
+    ) -> Optional[Tuple[dt.datetime, pd.DataFrame]]:
+        """The stored copy if another process wrote a newer one than `entry`, else `entry`."""
+        disk = self._load(ticker)
+        if disk is None or (entry is not None and disk[0] <= entry[0]):
+            return entry
+        with self._lock:
+            self._frames[ticker] = disk
+        return disk
+
+    def _refresh(
+        self,
+        ticker: str,
+        entry: Optional[Tuple[dt.datetime, pd.DataFrame]],
+        fetch: Callable[[str], pd.DataFrame],
+    ) -> Tuple[pd.DataFrame, bool]:
+        """(fresh history, downloaded here?) under the store's writer lock, so concurrent
+        processes download each ticker once and the others pick up the stored copy."""
+        with store_lock(self._path(ticker)):
+            entry = self._newer_on_disk(ticker, entry)
+            if entry is not None and self.is_fresh(entry[0]):
+                return entry[1], False
+            return self.put(ticker, fetch(ticker)), True
+
+    def put(self, ticker: str, frame: pd.DataFrame, fetched_at: Optional[dt.datetime] = None) -> pd.DataFrame:
+        """Store a freshly downloaded history (flat OHLCV columns, daily index)."""
+        fetched_at = fetched_at or _now()
+        index = pd.to_datetime(frame.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        frame = pd.DataFrame(
+            {name: frame[name].to_numpy(dtype=float) if name in frame else np.nan for _, name in FIELDS},
+            index=index.normalize(),
+        )
+        frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+        write_columns(
+            self._path(ticker),
+            {"dates": frame.index.values.astype("datetime64[D]"), **{key: frame[name].to_numpy() for key, name in FIELDS}},
+            meta={"format": HISTORY_FORMAT, "ticker": ticker, "fetched_at": fetched_at.isoformat()},
+        )
+        with self._lock:
+            self._frames[ticker] = (fetched_at, frame)
+        return frame
+
+    def get(self, ticker: str, fetch: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+        """Fresh full history for `ticker`, calling `fetch(ticker)` only on a miss or stale entry."""
+        return self.get_or_stale(ticker, fetch, allow_stale=False)[0]
+
+    def get_or_stale(
+        self,
+        ticker: str,
+        fetch: Callable[[str], pd.DataFrame],
+        allow_stale: bool = True,
+    ) -> Tuple[pd.DataFrame, Optional[dt.datetime]]:
+        """(history, stale_as_of): like `get`, but if refreshing fails and an older copy exists,
+        return that copy with its fetch time instead of raising (stale_as_of is None when fresh)."""
+        with self._lock:
+            in_memory = ticker in self._frames
+        entry = self.lookup(ticker)
+        if entry is not None and self.is_fresh(entry[0]):
+            self._count("memory_hits" if in_memory else "disk_hits")
+            return entry[1], None
+        try:
+            frame, fetched = self._refresh(ticker, entry, fetch)
+        except Exception:
+            self._count("misses")
+            if entry is None or not allow_stale:
+                raise
+            self._count("stale_served")
+            return entry[1], entry[0]
+        self._count("misses" if fetched else "shared_hits")
+        return frame, None
+
+    def warm(
+        self,
+        tickers: Iterable[str],
+        fetch: Optional[Callable[[str], pd.DataFrame]] = None,
+        max_workers: int = 4,
+    ) -> Dict[str, str]:
+        """Map the stored histories of `tickers` into memory; download missing/stale ones if `fetch` is given.
+
+        Returns ticker -> "fresh" | "loaded" (stale, kept) | "fetched" | "shared" (refreshed by
+        another process) | "missing" | "error: ...".
+        """
+
+        def one(ticker: str) -> Tuple[str, str]:
+            entry = self.lookup(ticker)
+            if entry is not None and self.is_fresh(entry[0]):
+                return ticker, "fresh"
+            if fetch is None:
+                return ticker, "loaded" if entry is not None else "missing"
+            try:
+                _, fetched = self._refresh(ticker, entry, fetch)
+            except Exception as e:
+                return ticker, f"error: {e}"
+            return ticker, "fetched" if fetched else "shared"
+
+        tickers = list(dict.fromkeys(tickers))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers) or 1))) as pool:
+            return dict(pool.map(one, tickers))
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Intraday TWSE sector heatmap with incremental updates.
+
+During the session this polls 1m/5m bars for the listed universe and keeps
+sector aggregates up to date with add/subtract deltas: only tickers whose
+latest bar changed are touched, and each sector's running sums
+
+    cap_prev = Σ 昨收×股數,   move = Σ 股數×(現價-昨收),   ret_sum = Σ 報酬,   count
+
+are adjusted by the difference between the ticker's old and new term, so a
+poll costs O(changed tickers) instead of a full regroup. Weights follow
+`analyze_twse_today_by_sector` (昨收×已發行股數 from `_read_twse_listed_csv`).
+
+After every poll a snapshot JSON is atomically rewritten so dashboards can
+simply re-read the file.
+
+Usage:
+    python intraday_sector_monitor.py --interval 5m --poll-seconds 60 \
+        --snapshot 分析報告/intraday_sector_snapshot.json
+
+    # Offline replay of recorded bars (columns: timestamp,ticker,close)
+    python intraday_sector_monitor.py --replay-bars bars.csv --replay-prev-close prev.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from stock_analyzer import _build_tw_tickers, _read_industry_codes, _read_twse_listed_csv
+
+SHARES_COL = "已發行普通股數或TDR原股發行股數"
+
+
+# -----------------------------
+# Bar providers
+# -----------------------------
+
+class YahooBarProvider:
+    """Latest intraday bar per ticker from yfinance, downloaded in batches."""
+
+    def __init__(self, interval: str = "5m", batch_size: int = 180):
+        self.interval = interval
+        self.batch_size = batch_size
+
+    def previous_closes(self, tickers: List[str]) -> Dict[str, float]:
+        import yfinance as yf
+
+        today = pd.Timestamp.now(tz="Asia/Taipei").normalize().tz_localize(None)
+        out: Dict[str, float] = {}
+        for i in range(0, len(tickers), self.batch_size):
+            batch = tickers[i : i + self.batch_size]
+            try:
+                df = yf.download(batch, period="7d", interval="1d", auto_adjust=False,
+                                 progress=False, group_by="column")
+            except Exception:
+                continue
+            if df is None or df.empty:
+                continue
+            close = df["Close"] if isinstance(df.columns, pd.MultiIndex) else df[["Close"]].set_axis(batch[:1], axis=1)
+            close.index = pd.to_datetime(close.index).tz_localize(None).normalize()
+            close = close[close.index < today]
+            last = close.ffill().iloc[-1] if not close.empty else pd.Series(dtype=float)
+            out.update({t: float(v) for t, v in last.items() if pd.notna(v) and v > 0})
+        return out
+
+    def latest_bars(self, tickers: List[str]) -> Dict[str, Tuple[pd.Timestamp, float]]:
+        import yfinance as yf
+
+        out: Dict[str, Tuple[pd.Timestamp, float]] = {}
+        for i in range(0, len(tickers), self.batch_size):
+            batch = tickers[i : i + self.batch_size]
+            try:
+                df = yf.download(batch, period="1d", interval=self.interval, auto_adjust=False,
+                                 progress=False, group_by="column")
+            except Exception:
+                continue
+            if df is None or df.empty:
+                continue
+            close = df["Close"] if isinstance(df.columns, pd.MultiIndex) else df[["Close"]].set_axis(batch[:1], axis=1)
+            out.update(_last_valid_bars(close))
+        return out
+
+
+class ReplayBarProvider:
+    """Replays recorded bars from a local CSV, advancing one bar timestamp per poll.
+
+    The bars file has columns `timestamp,ticker,close`; the previous-close file
+    has `ticker,prev_close`. Useful for testing the monitor outside trading hours.
+    """
+
+    def __init__(self, bars_path: str, prev_close_path: str):
+        bars = pd.read_csv(bars_path, parse_dates=["timestamp"])
+        self._wide = bars.pivot_table(index="timestamp", columns="ticker", values="close", aggfunc="last").sort_index()
+        prev = pd.read_csv(prev_close_path)
+        self._prev = dict(zip(prev["ticker"].astype(str), prev["prev_close"].astype(float)))
+        self._cursor = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._cursor >= len(self._wide)
+
+    def previous_closes(self, tickers: List[str]) -> Dict[str, float]:
+        return {t: self._prev[t] for t in tickers if t in self._prev}
+
+    def latest_bars(self, tickers: List[str]) -> Dict[str, Tuple[pd.Timestamp, float]]:
+        self._cursor = min(self._cursor + 1, len(self._wide))
+        seen = self._wide.iloc[: self._cursor]
+        cols = [t for t in tickers if t in seen.columns]
+        return _last_valid_bars(seen[cols])
+
+
+def _last_valid_bars(close: pd.DataFrame) -> Dict[str, Tuple[pd.Timestamp, float]]:
+    """(timestamp, close) of the last non-NaN bar for each column."""
+    if close.empty:
+        return {}
+    values = close.to_numpy(float)
+    has = np.isfinite(values)
+    rows = len(values) - 1 - np.argmax(has[::-1], axis=0)
+    out: Dict[str, Tuple[pd.Timestamp, float]] = {}
+    for j, ticker in enumerate(close.columns):
+        if has[:, j].any():
+            out[str(ticker)] = (pd.Timestamp(close.index[rows[j]]), float(values[rows[j], j]))
+    return out
+
+
+# -----------------------------
+# Incremental sector state
+# -----------------------------
+
+@dataclass
+class IntradaySectorState:
+    tickers: List[str]
+    sector_codes: List[str]
+    sector_of: np.ndarray            # sector index per ticker
+    shares: np.ndarray
+    prev_close: np.ndarray           # NaN when unknown
+    last_price: np.ndarray = field(init=False)
+    last_bar: Dict[str, pd.Timestamp] = field(init=False, default_factory=dict)
+    cap_prev: np.ndarray = field(init=False)
+    move: np.ndarray = field(init=False)
+    ret_sum: np.ndarray = field(init=False)
+    count: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        n, s = len(self.tickers), len(self.sector_codes)
+        self.last_price = np.full(n, np.nan)
+        self.cap_prev = np.zeros(s)
+        self.move = np.zeros(s)
+        self.ret_sum = np.zeros(s)
+        self.count = np.zeros(s, dtype=int)
+        self._pos = {t: i for i, t in enumerate(self.tickers)}
+
+    def _terms(self, i: int, price: float) -> Tuple[float, float, float, int]:
+        prev = self.prev_close[i]
+        if not (np.isfinite(price) and np.isfinite(prev) and prev > 0 and price > 0):
+            return 0.0, 0.0, 0.0, 0
+        return self.shares[i] * prev, self.shares[i] * (price - prev), price / prev - 1.0, 1
+
+    def apply(self, bars: Dict[str, Tuple[pd.Timestamp, float]]) -> List[str]:
+        """Apply bars that differ from what we have; returns the tickers that changed.
+
+        A bar with the same timestamp but a new close is still applied: Yahoo
+        keeps the timestamp of the forming bar while its close moves.
+        """
+        changed: List[str] = []
+        for ticker, (ts, price) in bars.items():
+            i = self._pos.get(ticker)
+            if i is None:
+                continue
+            if self.last_bar.get(ticker) == ts and (
+                price == self.last_price[i] or (np.isnan(price) and np.isnan(self.last_price[i]))
+            ):
+                continue
+            s = self.sector_of[i]
+            old = self._terms(i, self.last_price[i])
+            new = self._terms(i, price)
+            self.cap_prev[s] += new[0] - old[0]
+            self.move[s] += new[1] - old[1]
+            self.ret_sum[s] += new[2] - old[2]
+            self.count[s] += new[3] - old[3]
+            self.last_price[i] = price
+            self.last_bar[ticker] = ts
+            changed.append(ticker)
+        return changed
+
+    def snapshot(self, industry_map: Optional[Dict[str, str]] = None) -> Dict:
+        total_cap = float(self.cap_prev.sum())
+        rows = []
+        for k, code in enumerate(self.sector_codes):
+            if self.count[k] == 0:
+                continue
+            cap = float(self.cap_prev[k])
+            rows.append({
+                "產業別": code,
+                "產業名稱": (industry_map or {}).get(code, ""),
+                "count": int(self.count[k]),
+                "mean": float(self.ret_sum[k] / self.count[k]),
+                "cap_mean": float(self.move[k] / cap) if cap > 0 else None,
+                "cap_contrib": float(self.move[k] / total_cap) if total_cap > 0 else None,
+            })
+        rows.sort(key=lambda r: r["cap_contrib"] if r["cap_contrib"] is not None else float("-inf"), reverse=True)
+        n_priced = int(self.count.sum())
+        bar_times = list(self.last_bar.values())
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "last_bar": max(bar_times).isoformat() if bar_times else None,
+            "stocks": n_priced,
+            "market_eq": float(self.ret_sum.sum() / n_priced) if n_priced else None,
+            "market_cap": float(self.move.sum() / total_cap) if total_cap > 0 else None,
+            "sectors": rows,
+        }
+
+
+def build_state(listed_csv: str, prev_close: Dict[str, float]) -> IntradaySectorState:
+    base_df = _read_twse_listed_csv(listed_csv)
+    tickers = _build_tw_tickers(base_df["公司代號"].tolist())
+    sectors = base_df["產業別"].astype(str).to_numpy()
+    sector_codes = sorted(set(sectors))
+    return IntradaySectorState(
+        tickers=tickers,
+        sector_codes=sector_codes,
+        sector_of=np.searchsorted(sector_codes, sectors),
+        shares=base_df[SHARES_COL].fillna(0).to_numpy(float),
+        prev_close=np.array([prev_close.get(t, np.nan) for t in tickers], dtype=float),
+    )
+
+
+def write_snapshot(snapshot: Dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(snapshot, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def run_monitor(
+    provider,
+    listed_csv: str,
+    snapshot_path: Path,
+    industry_csv: Optional[str] = None,
+    poll_seconds: float = 60.0,
+    max_polls: Optional[int] = None,
+) -> IntradaySectorState:
+    industry_map: Dict[str, str] = {}
+    if industry_csv:
+        try:
+            industry_map = _read_industry_codes(industry_csv)
+        except Exception:
+            industry_map = {}
+
+    base_tickers = _build_tw_tickers(_read_twse_listed_csv(listed_csv)["公司代號"].tolist())
+    state = build_state(listed_csv, provider.previous_closes(base_tickers))
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        changed = state.apply(provider.latest_bars(state.tickers))
+        write_snapshot(state.snapshot(industry_map), snapshot_path)
+        polls += 1
+        print(f"[{datetime.now():%H:%M:%S}] 更新 {len(changed)} 檔，快照已寫入 {snapshot_path}", flush=True)
+        if getattr(provider, "exhausted", False):
+            break
+        if max_polls is None or polls < max_polls:
+            time.sleep(poll_seconds)
+    return state
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Continuously refreshed intraday TWSE sector snapshot.")
+    parser.add_argument("--listed-csv", default="data/上市公司基本資料.csv")
+    parser.add_argument("--industry-csv", default="data/industry_codes.csv")
+    parser.add_argument("--snapshot", default="分析報告/intraday_sector_snapshot.json", help="Snapshot JSON path")
+    parser.add_argument("--interval", choices=["1m", "5m"], default="5m")
+    parser.add_argument("--poll-seconds", type=float, default=60.0)
+    parser.add_argument("--max-polls", type=int, help="Stop after N polls (default: run until interrupted)")
+    parser.add_argument("--batch_size", type=int, default=180)
+    parser.add_argument("--replay-bars", help="CSV of recorded bars (timestamp,ticker,close) to replay")
+    parser.add_argument("--replay-prev-close", help="CSV of previous closes (ticker,prev_close) for replay")
+    args = parser.parse_args(argv)
+
+    if args.replay_bars:
+        if not args.replay_prev_close:
+            parser.error("--replay-bars requires --replay-prev-close")
+        provider = ReplayBarProvider(args.replay_bars, args.replay_prev_close)
+        poll_seconds = 0.0
+    else:
+        provider = YahooBarProvider(interval=args.interval, batch_size=args.batch_size)
+        poll_seconds = args.poll_seconds
+
+    try:
+        run_monitor(
+            provider,
+            listed_csv=args.listed_csv,
+            snapshot_path=Path(args.snapshot),
+            industry_csv=args.industry_csv,
+            poll_seconds=poll_seconds,
+            max_polls=args.max_polls,
+        )
+    except KeyboardInterrupt:
+        print("\n已停止盤中監控。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Low-overhead latency and counter instrumentation for the MCP stock server.
+
+Every tool call is split into three stages, each recorded in a fixed-bucket
+histogram per tool:
+
+- ``fetch``      time spent inside `fetch_timer()` blocks (yfinance downloads)
+- ``compute``    the rest of the tool body
+- ``serialize``  JSON encoding of the result (also gives the bytes returned),
+                 sampled on the first and every `SERIALIZE_SAMPLE_EVERY`-th call
+                 of a tool, since FastMCP encodes the result again anyway;
+                 ``bytes_out`` is extrapolated from the sampled sizes
+
+Histograms are a few integer counters with log-spaced bucket bounds, so
+recording is a bisect plus an increment under a lock; percentiles are
+estimated from the bucket bounds. Per-ticker fetch histograms make slow
+tickers visible. `snapshot()` is what the `server_stats` tool returns, and
+`start_periodic_dump()` appends the same snapshot to a JSON Lines file.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import datetime as dt
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+STAGES = ("fetch", "compute", "serialize")
+SLOW_TICKERS = 10
+SERIALIZE_SAMPLE_EVERY = 20
+TOP_TICKERS = 20
+
+_fetch_seconds: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("fetch_seconds", default=None)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (not thread-safe; `ServerMetrics` holds the lock)."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding the q-quantile; the max for the overflow bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return float(BUCKET_BOUNDS_MS[i]) if i < len(BUCKET_BOUNDS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": {
+                (f"<={b}ms" if i < len(BUCKET_BOUNDS_MS) else f">{BUCKET_BOUNDS_MS[-1]}ms"): n
+                for i, (b, n) in enumerate(zip(BUCKET_BOUNDS_MS + (None,), self.counts))
+                if n
+            },
+        }
+
+
+class ServerMetrics:
+    """Per-tool stage histograms and counters, plus per-ticker fetch latency."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started_at = dt.datetime.now().replace(microsecond=0)
+        self._stages: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._tool_counters: Dict[str, Dict[str, int]] = {}
+        self._counters: Dict[str, int] = {}
+        self._tickers: Dict[str, LatencyHistogram] = {}
+        self._requests: Dict[str, int] = {}
+        self._sources: Dict[str, Callable[[], Dict[str, int]]] = {}
+
+    # -- recording -----------------------------------------------------------------
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def count_tool(self, tool: str, name: str, n: int = 1) -> None:
+        with self._lock:
+            counters = self._tool_counters.setdefault(tool, {})
+            counters[name] = counters.get(name, 0) + n
+
+    def note_request(self, ticker: str) -> None:
+        """Count a request for `ticker` (cached or not); feeds `top_tickers` for the warm-up hot set."""
+        with self._lock:
+            self._requests[ticker] = self._requests.get(ticker, 0) + 1
+
+    def add_source(self, name: str, read: Callable[[], Dict[str, int]]) -> None:
+        """Include counters kept elsewhere (e.g. a cache module) in every snapshot."""
+        self._sources[name] = read
+
+    def _observe_stage(self, tool: str, stage: str, seconds: float) -> None:
+        with self._lock:
+            stages = self._stages.setdefault(tool, {})
+            stages.setdefault(stage, LatencyHistogram()).observe(seconds)
+
+    @contextmanager
+    def fetch_timer(self, ticker: Optional[str] = None) -> Iterator[None]:
+        """Time an upstream download; counts toward the current tool call's fetch stage."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            acc = _fetch_seconds.get()
+            if acc is not None:
+                acc[0] += elapsed
+            if ticker:
+                with self._lock:
+                    self._tickers.setdefault(ticker, LatencyHistogram()).observe(elapsed)
+
+    def run_tool(self, tool: str, fn: Callable, *args, **kwargs):
+        """Run a synchronous tool body, recording fetch / compute and (sampled) serialize / bytes returned."""
+        token = _fetch_seconds.set([0.0])
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.count_tool(tool, "errors")
+            raise
+        finally:
+            fetched = _fetch_seconds.get()[0]
+            _fetch_seconds.reset(token)
+        t1 = time.perf_counter()
+        self._observe_stage(tool, "fetch", fetched)
+        self._observe_stage(tool, "compute", max(t1 - t0 - fetched, 0.0))
+        with self._lock:
+            counters = self._tool_counters.setdefault(tool, {})
+            calls = counters.get("calls", 0)
+            counters["calls"] = calls + 1
+        if calls % SERIALIZE_SAMPLE_EVERY == 0:
+            size = len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+            self._observe_stage(tool, "serialize", time.perf_counter() - t1)
+            self.count_tool(tool, "serialize_samples")
+            self.count_tool(tool, "sampled_bytes", size)
+        return result
+
+    # -- reporting -----------------------------------------------------------------
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            tools = {
+                tool: {
+                    **self._tool_counters.get(tool, {}),
+                    "stages": {stage: hists[stage].snapshot() for stage in STAGES if stage in hists},
+                }
+                for tool, hists in sorted(self._stages.items())
+            }
+            for tool, counters in self._tool_counters.items():
+                tools.setdefault(tool, dict(counters))
+            for counters in tools.values():
+                sampled = counters.pop("sampled_bytes", 0)
+                if counters.get("serialize_samples"):
+                    counters["bytes_out"] = round(sampled / counters["serialize_samples"] * counters.get("calls", 0))
+            slow = sorted(self._tickers.items(), key=lambda kv: kv[1].total_ms / kv[1].count, reverse=True)
+            slow_tickers = [
+                {"ticker": t, "fetches": h.count, "mean_ms": round(h.total_ms / h.count, 1), "max_ms": round(h.max_ms, 1)}
+                for t, h in slow[:SLOW_TICKERS]
+            ]
+            counters = dict(self._counters)
+            tickers_seen = len(self._tickers)
+            top = sorted(self._requests.items(), key=lambda kv: kv[1], reverse=True)[:TOP_TICKERS]
+        for name, read in self._sources.items():
+            for key, value in read().items():
+                counters[f"{name}_{key}"] = value
+        now = dt.datetime.now().replace(microsecond=0)
+        return {
+            "time": now.isoformat(),
+            "uptime_seconds": int((now - self.started_at).total_seconds()),
+            "counters": counters,
+            "tools": tools,
+            "slow_tickers": slow_tickers,
+            "tickers_seen": tickers_seen,
+            "top_tickers": [[t, n] for t, n in top],
+        }
+
+    def dump_jsonl(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+    def start_periodic_dump(self, path: Path, interval_seconds: float = 60.0) -> threading.Thread:
+        """Append a snapshot to `path` every `interval_seconds` from a daemon thread."""
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.dump_jsonl(path)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=loop, name="mcp-stats-dump", daemon=True)
+        thread.start()
+        return thread
+
+
+def last_snapshot(path: Path, tail_bytes: int = 1 << 16) -> Optional[Dict]:
+    """The last complete snapshot in a JSON Lines dump (reads only the file's tail)."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with path.open("rb") as f:
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - tail_bytes))
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            continue
+    return None
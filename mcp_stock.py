@@ -7,6 +7,8 @@ MCP Stock Analyzer Server (Python + yfinance)
 - 避免把整段 OHLCV 都丟回去吃 token：
   - `get_price_history` 預設只回「日期+收盤價」，除非 `full=True` 才回傳完整 OHLCV。
   - 新增 `get_summary_return`：只回必要統計（start/end 價、總報酬率、CAGR）。
+- 工具以 async 註冊，下載與計算在有上限的執行緒池中進行（各工具另有併發上限與逾時），
+  慢的全歷史查詢不會卡住其他輕量查詢。
 
 提供工具：
 - get_stock_info：股票基本資訊
@@ -15,12 +17,25 @@ MCP Stock Analyzer Server (Python + yfinance)
 - calc_return：區間報酬率與 CAGR（含精確時間對齊）
 - compare_returns：多標的區間報酬率 / CAGR 比較
 - calc_risk_metrics：風險指標（年化波動、Sharpe、Beta、最大回撤、Downside）
+- batch：一次執行多個 calc_return / calc_risk_metrics / get_annual_returns，只下載一次資料
+- server_stats：各工具與各階段（fetch / compute / serialize）延遲分布、快取與錯誤計數
 
 需求：
     pip install fastmcp yfinance pandas numpy
 
 啟動：
     python mcp_stock.py
+    python mcp_stock.py --stats-jsonl logs/mcp_stats.jsonl --stats-interval 60   # 定期輸出統計
+    python mcp_stock.py --hot-tickers VT SPY 0050.TW   # 啟動後在背景預載熱門標的
+
+日線歷史以每檔完整歷史快取在記憶體與 data/.cache/history/（預設 60 分鐘後重新下載），
+啟動後背景預載 mcp_hot_tickers.json、統計檔中最常查詢的標的（或預設 VT、SPY、^TWII、2330.TW），
+第一次查詢這些標的就和穩定狀態一樣快。
+每個用戶端各自啟動一個 mcp_stock.py，但快取檔是共用的：下載前會先鎖住該標的的快取並重讀磁碟，
+其他伺服器程序剛下載（或正在下載）的標的會直接映射使用，不會重複下載。
+
+Yahoo 連續失敗（限流、5xx、連線錯誤；打錯代號不算）時斷路器開啟，期間不再打上游：有快取的日線查詢改回傳
+最後一份快取，結果附上 `stale_as_of`（該份資料的下載時間）；斷路器恢復後在背景重新下載這些標的。
 
 Claude 設定（claude_mcp.json 範例）：
 {
@@ -33,14 +48,35 @@ Claude 設定（claude_mcp.json 範例）：
 }
 """
 
+import argparse
+import asyncio
+import contextvars
+import datetime as dt
+import functools
+import inspect
+import json
 import math
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from dataclasses import asdict, dataclass
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import yfinance as yf
 from mcp.server.fastmcp import FastMCP
+from yfinance.exceptions import YFDataException, YFPricesMissingError, YFRateLimitError
+
+import price_cache
+from circuit_breaker import CircuitOpenError, breaker_for, snapshot_all
+from history_cache import HistoryCache, slice_history
+from mcp_metrics import ServerMetrics, last_snapshot
+from price_panel import normalize_daily_index, valid_row_lookups
 
 # -----------------------------
 # 小工具
@@ -68,6 +104,180 @@ def _nan_none(v):
     return v
 
 
+# (輸出欄名, DataFrame 欄名)
+_COMPACT_FIELDS = (("adj_close", "Adj Close"),)
+_FULL_FIELDS = (
+    ("open", "Open"),
+    ("high", "High"),
+    ("low", "Low"),
+    ("close", "Close"),
+    ("adj_close", "Adj Close"),
+    ("volume", "Volume"),
+)
+
+
+def _column_values(df: pd.DataFrame, name: str) -> np.ndarray:
+    """單一欄位的 float 陣列；相容 yfinance 單檔下載時的 (Price, Ticker) 多層欄位。"""
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    col = df[name]
+    if isinstance(col, pd.DataFrame):
+        col = col.iloc[:, 0]
+    return col.to_numpy(dtype=float, na_value=np.nan)
+
+
+def _json_list(values: np.ndarray, precision: Optional[int] = None, integer: bool = False) -> List:
+    """NumPy 陣列 -> JSON 可用的 list（NaN 轉 None），不逐格呼叫 Python 函式。"""
+    missing = ~np.isfinite(values)
+    if integer:
+        out = np.where(missing, 0, values).astype(np.int64).astype(object)
+    else:
+        out = (np.round(values, precision) if precision is not None else values).astype(object)
+    if missing.any():
+        out[missing] = None
+    return out.tolist()
+
+
+def _history_columns(
+    df: pd.DataFrame,
+    fields: Tuple[Tuple[str, str], ...],
+    date_format: str = "iso",
+    precision: Optional[int] = None,
+) -> Dict[str, List]:
+    """把歷史股價轉成平行陣列 {"date": [...], 欄名: [...]}（皆為 JSON 原生型別）。"""
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    days = index.values.astype("datetime64[D]")
+    if date_format == "epoch_day":
+        dates = days.astype(np.int64).tolist()
+    else:
+        dates = np.datetime_as_string(days, unit="D").tolist()
+    out: Dict[str, List] = {"date": dates}
+    for key, name in fields:
+        out[key] = _json_list(_column_values(df, name), precision, integer=(key == "volume"))
+    return out
+
+
+def _uniform_indices(n: int, n_out: int) -> np.ndarray:
+    return np.linspace(0, n - 1, n_out).round().astype(int)
+
+
+def _lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets：從 y 中挑出 n_out 個最能保留形狀的點（回傳列索引）。
+
+    首尾兩點必留；中間分成 n_out-2 段，每段挑與「前一個選中點」及「下一段平均點」
+    所圍三角形面積最大的點。各段平均以 reduceat 一次算完、段內面積以向量運算；
+    只有「前一個選中點」這個依賴需要逐段走訪。
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return _uniform_indices(n, n_out)
+    y = pd.Series(y).ffill().bfill().fillna(0.0).to_numpy(dtype=float)
+    x = np.arange(n, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out-2 段，涵蓋 [1, n-1)
+    counts = np.diff(edges)
+    avg_y = np.add.reduceat(y[1 : n - 1], edges[:-1] - 1) / counts
+    avg_x = (edges[:-1] + edges[1:] - 1) / 2.0
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def _ohlc_buckets(df: pd.DataFrame, n_out: int) -> pd.DataFrame:
+    """把日線等分成 n_out 段，每段合併成一根 K 棒（忽略 NaN）。"""
+    starts = np.linspace(0, len(df), n_out + 1).astype(int)[:-1]
+    ends = np.append(starts[1:], len(df)) - 1
+
+    def first_valid(values: np.ndarray) -> np.ndarray:
+        # 每段第一個非 NaN 值：先往回補值，再取段首
+        return pd.Series(values).bfill().to_numpy()[starts]
+
+    def last_valid(values: np.ndarray) -> np.ndarray:
+        return pd.Series(values).ffill().to_numpy()[ends]
+
+    volume = _column_values(df, "Volume")
+    with np.errstate(invalid="ignore"):
+        high = np.fmax.reduceat(_column_values(df, "High"), starts)
+        low = np.fmin.reduceat(_column_values(df, "Low"), starts)
+    return pd.DataFrame(
+        {
+            "Open": first_valid(_column_values(df, "Open")),
+            "High": high,
+            "Low": low,
+            "Close": last_valid(_column_values(df, "Close")),
+            "Adj Close": last_valid(_column_values(df, "Adj Close")),
+            "Volume": np.add.reduceat(np.nan_to_num(volume), starts),
+        },
+        index=df.index[starts],
+    )
+
+
+def _upstream_unavailable(ticker: str) -> ValueError:
+    return ValueError(
+        f"Yahoo Finance 暫時無法連線（約 {yahoo.retry_after():.0f} 秒後重試），且沒有 {ticker} 的快取資料。"
+    )
+
+
+def _upstream_failure(exc: Exception) -> bool:
+    """Yahoo 本身出問題（限流、5xx、連線失敗、回傳非 JSON 的維修頁）才算斷路器的失敗；
+    代號錯誤、下市或區間內沒有資料代表 Yahoo 有正常回應，不算。"""
+    if isinstance(exc, (YFRateLimitError, YFDataException, json.JSONDecodeError)):
+        return True
+    if isinstance(exc, YFPricesMissingError):
+        status = re.search(r"status_code = (\d+)", exc.debug_info or "")
+        return status is not None and (int(status.group(1)) == 429 or int(status.group(1)) >= 500)
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # requests / curl_cffi 的連線、逾時、DNS、SSL 錯誤都是 OSError
+    return isinstance(exc, OSError)
+
+
+def _download_history(ticker: str, interval: str = "1d", **params) -> pd.DataFrame:
+    """經由 Yahoo 斷路器向 yfinance 下載單檔歷史股價（計時並計入上游錯誤）。
+
+    用 Ticker.history 而不是 yf.download：後者會吞掉所有例外只回空表，分不出限流與打錯代號。
+    只有 _upstream_failure 認定的錯誤會計入斷路器；沒有資料時回「請確認代號」的錯誤。
+    斷路器開啟時直接丟 CircuitOpenError，不打上游。
+    """
+
+    def download() -> pd.DataFrame:
+        with metrics.fetch_timer(ticker):
+            return yf.Ticker(ticker).history(interval=interval, auto_adjust=False, actions=False, **params)
+
+    try:
+        df = yahoo.call(download)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        if _upstream_failure(e):
+            metrics.count("upstream_errors")
+            raise
+        df = None
+    if df is None or df.empty:
+        raise ValueError(f"無法取得 {ticker} 的歷史股價，請確認代號或時間區間是否正確。")
+    df = _ensure_datetime_index(df)
+    # 與 yf.download 相同：日線以上的頻率不帶時區
+    if interval[-1] not in ("m", "h") and df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+def _download_full_history(ticker: str) -> pd.DataFrame:
+    return _download_history(ticker, period="max")
+
+
 def _fetch_history(
     ticker: str,
     period: Optional[str] = None,
@@ -75,19 +285,29 @@ def _fetch_history(
     start: Optional[str] = None,
     end: Optional[str] = None,
 ) -> pd.DataFrame:
-    """取回歷史股價（優先使用 start/end；否則用 period）。"""
-    if start or end:
-        df = yf.download(ticker, start=start, end=end, interval=interval, auto_adjust=False, progress=False)
-    else:
-        period = period or "1y"
-        df = yf.download(ticker, period=period, interval=interval, auto_adjust=False, progress=False)
+    """取回歷史股價（優先使用 start/end；否則用 period）。
 
-    if df is None or df.empty:
-        raise ValueError(f"無法取得 {ticker} 的歷史股價，請確認代號或時間區間是否正確。")
+    日線從 history 快取（每檔完整歷史，過期才重新下載）切出所需區間；其他頻率直接下載。
+    上游失敗或斷路器開啟時，日線改用過期的快取並記下 stale_as_of（見 _note_stale）。
+    """
+    metrics.note_request(ticker)
+    df = None
+    try:
+        if interval == "1d":
+            full, stale_as_of = history.get_or_stale(ticker, _download_full_history)
+            if stale_as_of is not None:
+                _note_stale(ticker, stale_as_of)
+            df = slice_history(full, period, start, end)
+        if df is None:
+            params = {"start": start, "end": end} if start or end else {"period": period or "1y"}
+            df = _download_history(ticker, interval=interval, **params)
+    except CircuitOpenError:
+        raise _upstream_unavailable(ticker) from None
 
-    df = _ensure_datetime_index(df)
+    if df.empty:
+        raise ValueError(f"無法取得 {ticker} 的歷史股價，請確認代號或時間區間是否正確。")
     if "Adj Close" not in df.columns:
-        df["Adj Close"] = df["Close"]
+        df = df.assign(**{"Adj Close": df["Close"]})
     return df
 
 
@@ -116,21 +336,282 @@ class ReturnStats:
         return d
 
 
+def _risk_metrics(
+    ticker: str,
+    price: pd.Series,
+    bench_price: Optional[pd.Series],
+    start: str,
+    end: str,
+    benchmark: str,
+    risk_free_rate_annual: float,
+) -> Dict:
+    """calc_risk_metrics 的計算本體；`price`、`bench_price` 為已去除 NaN 的 Adj Close。"""
+    if price.empty:
+        raise ValueError(f"{ticker} 在指定區間內無有效資料。")
+
+    rets = price.pct_change().dropna()
+
+    # 年化波動
+    daily_std = float(rets.std())
+    vol_annual = daily_std * math.sqrt(252.0)
+
+    # Sharpe
+    rf_daily = risk_free_rate_annual / 252.0
+    avg_daily = float(rets.mean())
+    sharpe = (avg_daily - rf_daily) / daily_std * math.sqrt(252.0) if daily_std > 0 else None
+
+    # 最大回撤
+    cum = (1 + rets).cumprod()
+    running_max = cum.cummax()
+    drawdown = cum / running_max - 1.0
+    max_dd = float(drawdown.min())
+
+    # Downside Deviation
+    downside = rets[rets < 0]
+    downside_std = float(downside.std()) if not downside.empty else 0.0
+    downside_dev_annual = downside_std * math.sqrt(252.0)
+
+    # Beta 相對基準
+    beta = None
+    try:
+        bench_rets = bench_price.pct_change().dropna()
+        df2 = pd.DataFrame({"asset": rets, "bench": bench_rets}).dropna()
+        if not df2.empty and df2["bench"].var() > 0:
+            cov = float(np.cov(df2["asset"], df2["bench"], ddof=1)[0][1])
+            var_b = float(np.var(df2["bench"], ddof=1))
+            beta = cov / var_b if var_b > 0 else None
+    except Exception:
+        beta = None
+
+    def r(v, n=6):
+        if v is None:
+            return None
+        try:
+            return round(float(v), n)
+        except Exception:
+            return v
+
+    return {
+        "ticker": ticker,
+        "start": start,
+        "end": end,
+        "benchmark": benchmark,
+        "risk_free_rate_annual": risk_free_rate_annual,
+        "n_days": int((price.index[-1] - price.index[0]).days),
+        "annual_volatility": r(vol_annual),
+        "sharpe_ratio": r(sharpe),
+        "beta": r(beta),
+        "max_drawdown": r(max_dd),
+        "downside_deviation_annual": r(downside_dev_annual),
+    }
+
+
 # -----------------------------
 # MCP 伺服器
 # -----------------------------
 
-mcp = FastMCP("stock-analyzer")
+# 日線歷史快取（記憶體 + data/.cache/history/）；啟動後在背景預載熱門標的
+history = HistoryCache()
+DEFAULT_HOT_TICKERS = ("VT", "SPY", "^TWII", "2330.TW")
+HOT_TICKERS_FILE = Path(__file__).resolve().parent / "mcp_hot_tickers.json"
+WARMUP_TOP_N = 20
+WARMUP_WORKERS = 4
+_warmup_tickers: List[str] = []
+
+
+def hot_tickers(
+    config: Optional[Path] = None,
+    stats_jsonl: Optional[Path] = None,
+    top_n: int = WARMUP_TOP_N,
+) -> List[str]:
+    """暖機名單：設定檔（JSON list 或 {"tickers": [...]}）加上統計檔最後一筆快照中
+    最常被查詢的前 top_n 檔；兩者皆無時用 DEFAULT_HOT_TICKERS。"""
+    tickers: List[str] = []
+    if config and Path(config).exists():
+        data = json.loads(Path(config).read_text(encoding="utf-8"))
+        tickers.extend(data.get("tickers", []) if isinstance(data, dict) else data)
+    if stats_jsonl:
+        snapshot = last_snapshot(Path(stats_jsonl)) or {}
+        tickers.extend(t for t, _ in snapshot.get("top_tickers", [])[:top_n])
+    return list(dict.fromkeys(tickers or DEFAULT_HOT_TICKERS))
+
+
+def _warm_up(tickers: List[str]) -> None:
+    t0 = time.perf_counter()
+    status = history.warm(tickers, fetch=_download_full_history, max_workers=WARMUP_WORKERS)
+    counts: Dict[str, int] = {}
+    for s in status.values():
+        key = s.split(":")[0]
+        counts[key] = counts.get(key, 0) + 1
+    # stdout 是 MCP 通道，訊息一律寫到 stderr
+    print(f"[warm-up] {len(tickers)} 檔完成（{counts}），耗時 {time.perf_counter() - t0:.1f}s", file=sys.stderr, flush=True)
+
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP):
+    # stdio 傳輸建立後才會進入 lifespan；暖機在背景執行緒進行，不擋住第一個請求
+    if _warmup_tickers:
+        threading.Thread(target=_warm_up, args=(list(_warmup_tickers),), name="mcp-warmup", daemon=True).start()
+    yield {}
+
+
+mcp = FastMCP("stock-analyzer", lifespan=_lifespan)
+
+# 各工具 fetch / compute / serialize（抽樣）耗時、錯誤與回傳位元組；由 server_stats 工具查詢。
+# 快取計數只列伺服器實際使用的兩個：history（單檔日線、年報酬）與 price_cache（batch / compare_returns 的區間面板）
+metrics = ServerMetrics()
+metrics.add_source("history_cache", lambda: dict(history.stats))
+metrics.add_source("price_cache", lambda: dict(price_cache.cache_stats))
+STATS_DUMP_INTERVAL = 60.0
+
+# 所有 yfinance 請求共用的 Yahoo 斷路器；開啟期間日線查詢改回傳過期快取
+YAHOO_HOST = "query1.finance.yahoo.com"
+yahoo = breaker_for(YAHOO_HOST, is_failure=_upstream_failure)
+# 讓 Ticker.history / get_info 把限流與連線錯誤丟出來，而不是記 log 後回傳空資料
+yf.config.debug.hide_exceptions = False
+# 這次工具呼叫用到的過期資料時間（由 _run_tool 收集，附到結果的 stale_as_of）
+_stale_marks: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("stale_marks", default=None)
+# 回傳過期資料的標的，斷路器恢復後在背景重新下載
+_revalidate_pending: set = set()
+_revalidate_lock = threading.Lock()
+
+
+def _note_stale(ticker: str, fetched_at: dt.datetime) -> None:
+    marks = _stale_marks.get()
+    if marks is not None:
+        marks.append(fetched_at.isoformat())
+    with _revalidate_lock:
+        _revalidate_pending.add(ticker)
+
+
+def _revalidate() -> None:
+    """斷路器恢復時呼叫：在背景重新下載期間以過期快取回應過的標的。"""
+    with _revalidate_lock:
+        tickers = sorted(_revalidate_pending)
+        _revalidate_pending.clear()
+    if tickers:
+        print(f"[revalidate] Yahoo 恢復連線，背景更新 {len(tickers)} 檔過期快取", file=sys.stderr, flush=True)
+        threading.Thread(target=_warm_up, args=(tickers,), name="mcp-revalidate", daemon=True).start()
+
+
+yahoo.on_close(_revalidate)
+
+# 工具本體皆為同步函式（yfinance + pandas 會阻塞），丟到有上限的執行緒池，
+# 讓事件迴圈保持可回應；每個工具另有併發上限與逾時。
+# TOOL_LIMITS 裡的慢工具（上限總和 14）共用 SLOW_WORKERS 條執行緒，超過的在池內排隊；
+# 其他輕量工具（get_summary_return、calc_return 等）用自己的 LIGHT_WORKERS 條執行緒，
+# 所以慢查詢再多也不會卡住輕量查詢。
+SLOW_WORKERS = 8
+LIGHT_WORKERS = 4
+DEFAULT_LIMIT: Tuple[int, float] = (6, 30.0)  # (同時執行數, 逾時秒數)
+TOOL_LIMITS: Dict[str, Tuple[int, float]] = {
+    "get_price_history": (2, 60.0),
+    "compare_returns": (2, 120.0),
+    "calc_risk_metrics": (4, 60.0),
+    "get_annual_returns": (2, 90.0),
+    "calculate_portfolio_performance": (2, 180.0),
+    "batch": (2, 300.0),
+}
+
+_slow_executor = ThreadPoolExecutor(max_workers=SLOW_WORKERS, thread_name_prefix="mcp-stock-slow")
+_light_executor = ThreadPoolExecutor(max_workers=LIGHT_WORKERS, thread_name_prefix="mcp-stock")
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+# 工具本體（在執行緒池中）透過 _report_progress 回報進度；由 _offload 接到 MCP progress 通知。
+_progress_sink: contextvars.ContextVar[Optional[Callable[[float, Optional[float], Optional[str]], None]]] = (
+    contextvars.ContextVar("progress_sink", default=None)
+)
+
+
+def _report_progress(done: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+    """回報進度（message 可放部分結果）；不在 MCP 請求中（例如被其他腳本 import 呼叫）時不做事。"""
+    sink = _progress_sink.get()
+    if sink is not None:
+        sink(done, total, message)
+
+
+def _request_progress_sink(loop: asyncio.AbstractEventLoop) -> Optional[Callable]:
+    """目前 MCP 請求的進度回報函式（可在工作執行緒呼叫）；沒有請求時回傳 None。"""
+    ctx = mcp.get_context()
+    try:
+        ctx.request_context
+    except ValueError:
+        return None
+
+    def sink(done: float, total: Optional[float], message: Optional[str]) -> None:
+        # 用戶端沒帶 progressToken 時 report_progress 本身不會送出任何東西
+        asyncio.run_coroutine_threadsafe(ctx.report_progress(done, total, message), loop)
+
+    return sink
+
+
+def _run_tool(name: str, fn: Callable, *args, **kwargs):
+    """執行工具本體（計入 metrics）；用到過期快取時把最舊的資料時間標在結果的 stale_as_of。
+
+    dict 結果加一個 stale_as_of 欄位；list 結果（例如逐列歷史股價）每列都加，保持回傳型別不變。
+    """
+    marks: List[str] = []
+    _stale_marks.set(marks)
+    result = metrics.run_tool(name, fn, *args, **kwargs)
+    if marks:
+        stale_as_of = min(marks)
+        metrics.count_tool(name, "stale_results")
+        if isinstance(result, dict):
+            result = {**result, "stale_as_of": stale_as_of}
+        elif isinstance(result, list):
+            result = [{**row, "stale_as_of": stale_as_of} if isinstance(row, dict) else row for row in result]
+    return result
+
+
+async def _offload(name: str, fn: Callable, *args, **kwargs):
+    """在執行緒池中執行阻塞的工具本體，套用該工具的併發上限與逾時。
+
+    逾時從呼叫進來就開始計算，包含等待併發名額的時間；逾時只會讓呼叫端先收到錯誤，
+    還在排隊的呼叫會被取消，已開始的下載無法中斷，會在背景跑完。併發名額要等執行緒真的
+    結束才歸還，所以重試逾時的慢查詢不會佔滿執行緒池。
+    """
+    limit, timeout = TOOL_LIMITS.get(name, DEFAULT_LIMIT)
+    executor = _slow_executor if name in TOOL_LIMITS else _light_executor
+    sem = _semaphores.setdefault(name, asyncio.Semaphore(limit))
+    loop = asyncio.get_running_loop()
+    try:
+        async with asyncio.timeout(timeout):
+            await sem.acquire()
+            context = contextvars.copy_context()
+            context.run(_progress_sink.set, _request_progress_sink(loop))
+            try:
+                future = executor.submit(context.run, functools.partial(_run_tool, name, fn, *args, **kwargs))
+            except BaseException:
+                sem.release()
+                raise
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(sem.release))
+            return await asyncio.wrap_future(future)
+    except TimeoutError:
+        metrics.count_tool(name, "timeouts")
+        raise ValueError(f"{name} 執行逾時（超過 {timeout:g} 秒），請縮小查詢區間後再試。") from None
+
+
+def _register_async(fn: Callable) -> None:
+    """把同步工具包成 async 版註冊到 MCP；模組層級的同步函式保留給其他腳本直接 import。"""
+
+    @functools.wraps(fn)
+    async def tool(*args, **kwargs):
+        return await _offload(fn.__name__, fn, *args, **kwargs)
+
+    mcp.add_tool(tool)
 
 
-@mcp.tool()
 def get_stock_info(ticker: str) -> Dict:
     """取得股票基本資訊（公司名稱、上市地、貨幣、可用區間等）。"""
     t = yf.Ticker(ticker)
     info = {}
     try:
-        info = t.get_info()
+        with metrics.fetch_timer(ticker):
+            info = yahoo.call(t.get_info)
+    except CircuitOpenError:
+        info = {}
     except Exception:
+        metrics.count("upstream_errors")
         info = {}
 
     try:
@@ -154,7 +635,6 @@ def get_stock_info(ticker: str) -> Dict:
     return {k: _nan_none(v) for k, v in out.items()}
 
 
-@mcp.tool()
 def get_price_history(
     ticker: str,
     period: Optional[str] = "1y",
@@ -163,47 +643,51 @@ def get_price_history(
     end: Optional[str] = None,
     full: bool = False,
     max_points: int = 1000,
-) -> List[Dict]:
+    layout: str = "rows",
+    date_format: str = "iso",
+    precision: Optional[int] = None,
+    downsample: str = "lttb",
+) -> Union[List[Dict], Dict]:
     """取得歷史股價。
     - 預設僅回傳「日期 + 收盤價（Adj Close）」，以節省 token。
     - `full=True` 時，回傳完整 OHLCV。
-    - `max_points` 可限制回傳點數（>0 時生效）；若資料過多會做等距抽樣。
+    - `max_points` 可限制回傳點數（>0 時生效），資料過多時依 `downsample` 縮減：
+      - "lttb"（預設）：Largest-Triangle-Three-Buckets，依 Adj Close 挑點，保留崩跌低點與高峰。
+      - "ohlc"：等分成 max_points 段，每段合併成一根 K 棒（首開、最高、最低、末收、成交量加總），
+        一律回傳 OHLCV 欄位，日期為該段第一天。
+      - "uniform"：舊版的等距抽樣。
+    - `layout="columns"` 改回傳欄式結構 {"date": [...], "adj_close": [...], ...}，
+      長區間（例如 20 年完整 OHLCV）體積小得多。
+    - `date_format="epoch_day"` 以 1970-01-01 起算的天數（整數）表示日期。
+    - `precision` 指定價格四捨五入的小數位數（None 為不處理）。
     """
+    if layout not in ("rows", "columns"):
+        raise ValueError("layout 只能是 'rows' 或 'columns'。")
+    if date_format not in ("iso", "epoch_day"):
+        raise ValueError("date_format 只能是 'iso' 或 'epoch_day'。")
+    if downsample not in ("lttb", "ohlc", "uniform"):
+        raise ValueError("downsample 只能是 'lttb'、'ohlc' 或 'uniform'。")
+
     df = _fetch_history(ticker, period=period, interval=interval, start=start, end=end)
 
-    # 等距抽樣（如果需要）
     if isinstance(max_points, int) and max_points > 0 and len(df) > max_points:
-        idx = np.linspace(0, len(df) - 1, max_points).round().astype(int)
-        df = df.iloc[idx]
-
-    if not full:
-        # 精簡輸出：日期 + Adj Close
-        out = []
-        for ts, row in df.iterrows():
-            out.append({
-                "date": ts.strftime("%Y-%m-%d"),
-                "adj_close": _nan_none(row.get("Adj Close")),
-            })
-        return out
-
-    # 完整輸出：OHLCV + Adj Close
-    out = []
-    for ts, row in df.iterrows():
-        out.append(
-            {
-                "date": ts.strftime("%Y-%m-%d"),
-                "open": _nan_none(row.get("Open")),
-                "high": _nan_none(row.get("High")),
-                "low": _nan_none(row.get("Low")),
-                "close": _nan_none(row.get("Close")),
-                "adj_close": _nan_none(row.get("Adj Close")),
-                "volume": _nan_none(row.get("Volume")),
-            }
-        )
-    return out
+        if downsample == "ohlc":
+            df, full = _ohlc_buckets(df, max_points), True
+        elif downsample == "lttb":
+            df = df.iloc[_lttb_indices(_column_values(df, "Adj Close"), max_points)]
+        else:
+            df = df.iloc[_uniform_indices(len(df), max_points)]
+
+    fields = _FULL_FIELDS if full else _COMPACT_FIELDS
+    columns = _history_columns(df, fields, date_format, precision)
+    if layout == "columns":
+        return {"ticker": ticker, "count": len(df), **columns}
+
+    # 逐列輸出（相容舊格式）：[{date, adj_close}] 或 [{date, open, ..., volume}]
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
 
 
-@mcp.tool()
 def get_summary_return(ticker: str, start: str, end: str) -> Dict:
     """輕量版報酬率摘要（只回必要統計），最省 token。
     回傳欄位：ticker, start_date, end_date, start_price, end_price, total_return_pct, cagr_pct
@@ -231,7 +715,6 @@ def get_summary_return(ticker: str, start: str, end: str) -> Dict:
     }
 
 
-@mcp.tool()
 def calc_return(ticker: str, start: str, end: str) -> Dict:
     """完整區間報酬率（數值 + 原始小數），適合要做後續計算的情境。"""
     df = _fetch_history(ticker, start=start, end=end, interval="1d")
@@ -259,21 +742,24 @@ def calc_return(ticker: str, start: str, end: str) -> Dict:
     return stats.to_dict()
 
 
-@mcp.tool()
 def compare_returns(tickers: List[str], start: str, end: str) -> Dict:
-    """多標的區間報酬率比較，回傳每檔的 total_return 與 CAGR；同時附上依報酬率排序。"""
+    """多標的區間報酬率比較，回傳每檔的 total_return 與 CAGR；同時附上依報酬率排序。
+    所有標的一次批次下載；在 MCP 中每算完一檔就以進度通知送出該檔結果。
+    """
+    requests = [
+        {"id": str(i), "tool": "calc_return", "args": {"ticker": t, "start": start, "end": end}}
+        for i, t in enumerate(tickers)
+    ]
+    out = batch(requests)["results"]
     results: List[Dict] = []
-    for t in tickers:
-        try:
-            results.append(calc_return(t, start, end))
-        except Exception as e:
-            results.append({"ticker": t, "error": str(e)})
+    for i, t in enumerate(tickers):
+        r = out[str(i)]
+        results.append({"ticker": t, "error": r["error"]} if "error" in r else r)
     sortable = [r for r in results if isinstance(r, dict) and "total_return" in r]
     ranking = sorted(sortable, key=lambda x: x["total_return"], reverse=True)
     return {"items": results, "ranking": ranking}
 
 
-@mcp.tool()
 def calc_risk_metrics(
     ticker: str,
     start: str,
@@ -283,68 +769,13 @@ def calc_risk_metrics(
 ) -> Dict:
     """風險指標：年化波動、Sharpe、Beta、最大回撤、Downside Deviation。"""
     price = _fetch_history(ticker, start=start, end=end, interval="1d")["Adj Close"].dropna()
-    if price.empty:
-        raise ValueError(f"{ticker} 在指定區間內無有效資料。")
-
-    rets = price.pct_change().dropna()
-
-    # 年化波動
-    daily_std = float(rets.std())
-    vol_annual = daily_std * math.sqrt(252.0)
-
-    # Sharpe
-    rf_daily = risk_free_rate_annual / 252.0
-    avg_daily = float(rets.mean())
-    sharpe = (avg_daily - rf_daily) / daily_std * math.sqrt(252.0) if daily_std > 0 else None
-
-    # 最大回撤
-    cum = (1 + rets).cumprod()
-    running_max = cum.cummax()
-    drawdown = cum / running_max - 1.0
-    max_dd = float(drawdown.min())
-
-    # Downside Deviation
-    downside = rets[rets < 0]
-    downside_std = float(downside.std()) if not downside.empty else 0.0
-    downside_dev_annual = downside_std * math.sqrt(252.0)
-
-    # Beta 相對基準
-    beta = None
     try:
         bench_price = _fetch_history(benchmark, start=start, end=end, interval="1d")["Adj Close"].dropna()
-        bench_rets = bench_price.pct_change().dropna()
-        df2 = pd.DataFrame({"asset": rets, "bench": bench_rets}).dropna()
-        if not df2.empty and df2["bench"].var() > 0:
-            cov = float(np.cov(df2["asset"], df2["bench"], ddof=1)[0][1])
-            var_b = float(np.var(df2["bench"], ddof=1))
-            beta = cov / var_b if var_b > 0 else None
     except Exception:
-        beta = None
+        bench_price = None
+    return _risk_metrics(ticker, price, bench_price, start, end, benchmark, risk_free_rate_annual)
 
-    def r(v, n=6):
-        if v is None:
-            return None
-        try:
-            return round(float(v), n)
-        except Exception:
-            return v
-
-    return {
-        "ticker": ticker,
-        "start": start,
-        "end": end,
-        "benchmark": benchmark,
-        "risk_free_rate_annual": risk_free_rate_annual,
-        "n_days": int((price.index[-1] - price.index[0]).days),
-        "annual_volatility": r(vol_annual),
-        "sharpe_ratio": r(sharpe),
-        "beta": r(beta),
-        "max_drawdown": r(max_dd),
-        "downside_deviation_annual": r(downside_dev_annual),
-    }
 
-
-@mcp.tool()
 def get_annual_returns(ticker: str) -> List[Dict]:
     """取得指定標的自掛牌以來每年的報酬率。"""
     # 1. Fetch complete history
@@ -377,7 +808,6 @@ def get_annual_returns(ticker: str) -> List[Dict]:
     return results
 
 
-@mcp.tool()
 def calculate_portfolio_performance(
     allocations: Dict[str, float], 
     start: Optional[str] = None, 
@@ -469,5 +899,326 @@ def calculate_portfolio_performance(
     }
 
 
-if __name__ == "__main__":
+BATCH_TOOLS = ("calc_return", "calc_risk_metrics", "get_annual_returns")
+BATCH_DOWNLOAD_SIZE = 20  # 小批次：併發下載較快，進度通知也較細
+
+
+def _batch_plan(requests: List[Dict]) -> Tuple[List[Tuple[str, str, Dict]], Dict[str, str], List[str], Dict]:
+    """檢查子請求並規劃要下載的資料。
+
+    回傳 (可執行的 (id, tool, 參數), 無效請求的錯誤訊息, 需要的標的, 下載參數)。
+    參數依原工具的簽章綁定並補上預設值，所以子請求與單獨呼叫工具的語意相同。
+    """
+    planned: List[Tuple[str, str, Dict]] = []
+    errors: Dict[str, str] = {}
+    tickers: List[str] = []
+    for i, req in enumerate(requests):
+        req_id = str(req.get("id", i))
+        tool = req.get("tool")
+        if tool not in BATCH_TOOLS:
+            errors[req_id] = f"不支援的 tool：{tool!r}（可用：{', '.join(BATCH_TOOLS)}）"
+            continue
+        try:
+            bound = inspect.signature(globals()[tool]).bind(**(req.get("args") or {}))
+        except TypeError as e:
+            errors[req_id] = f"參數錯誤：{e}"
+            continue
+        bound.apply_defaults()
+        args = dict(bound.arguments)
+        planned.append((req_id, tool, args))
+        tickers.append(args["ticker"])
+        if tool == "calc_risk_metrics":
+            tickers.append(args["benchmark"])
+
+    if any(tool == "get_annual_returns" for _, tool, _ in planned):
+        window = {"period": "max"}
+    elif planned:
+        window = {
+            "start": min(args["start"] for _, _, args in planned),
+            "end": max(args["end"] for _, _, args in planned),
+        }
+    else:
+        window = {}
+    return planned, errors, list(dict.fromkeys(tickers)), window
+
+
+def _upstream_healthy(ticker: str) -> bool:
+    """單筆探測：Yahoo 對 ticker 有正常回應（即使沒有資料）就是 True。不經斷路器，由呼叫端記錄結果。"""
+    try:
+        with metrics.fetch_timer(ticker):
+            yf.Ticker(ticker).history(period="5d", auto_adjust=False, actions=False)
+    except Exception as e:
+        return not _upstream_failure(e)
+    return True
+
+
+def _history_adj_close(tickers: List[str], fresh_only: bool = False) -> pd.DataFrame:
+    """history 快取中這些標的的 Adj Close 面板（不下載）；沒有快取的標的不列入。
+
+    fresh_only 時只取新鮮的；否則過期的也取，並記為 stale（上游失敗時的退路）。
+    """
+    series: Dict[str, pd.Series] = {}
+    for ticker in dict.fromkeys(tickers):
+        entry = history.lookup(ticker, reload_stale=True)
+        if entry is None:
+            continue
+        fetched_at, frame = entry
+        if history.is_fresh(fetched_at):
+            series[ticker] = frame["Adj Close"]
+        elif not fresh_only:
+            series[ticker] = frame["Adj Close"]
+            history.note_stale_served()
+            _note_stale(ticker, fetched_at)
+    return pd.DataFrame(series)
+
+
+def _history_full_adj_close(
+    tickers: List[str], on_done: Callable[[int], None]
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """逐檔經由 history 快取取得完整歷史（並行下載、寫回快取），回傳 (Adj Close 面板, 標的錯誤訊息)。"""
+    series: Dict[str, pd.Series] = {}
+    errors: Dict[str, str] = {}
+
+    def one(ticker: str) -> None:
+        try:
+            full, stale_as_of = history.get_or_stale(ticker, _download_full_history)
+        except CircuitOpenError:
+            errors[ticker] = str(_upstream_unavailable(ticker))
+            return
+        except Exception as e:
+            errors[ticker] = str(e)
+            return
+        if stale_as_of is not None:
+            _note_stale(ticker, stale_as_of)
+        series[ticker] = full["Adj Close"]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(WARMUP_WORKERS, len(tickers)))) as pool:
+        # 每個工作帶著目前的 context，stale 標記才會記到這次工具呼叫上
+        futures = [pool.submit(contextvars.copy_context().run, one, t) for t in tickers]
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            on_done(done)
+    return pd.DataFrame(series), errors
+
+
+def _window_adj_close(tickers: List[str], window: Dict[str, str], total: int) -> pd.DataFrame:
+    """start/end 區間的 Adj Close：經由 price_cache（跨程序共用的面板，只批次下載缺的部分）。
+
+    失敗的批次與斷路器開啟時的全部標的改用 history 快取（可能過期，記為 stale）。
+    """
+    failed: List[str] = []
+    downloaded = [False]
+
+    def on_batch(done: int, n: int, batch_tickers: List[str], adj: Optional[pd.DataFrame]) -> None:
+        # 下載器對失敗的批次只會略過（整批代號都錯也一樣）；記下要改用快取的標的，
+        # 並用一檔的單筆請求分辨是 Yahoo 出問題還是代號無效，只有前者計入斷路器
+        downloaded[0] = True
+        if adj is None:
+            failed.extend(batch_tickers)
+            if _upstream_healthy(batch_tickers[0]):
+                yahoo.record_success()
+            else:
+                metrics.count("upstream_errors")
+                yahoo.record_failure()
+        else:
+            yahoo.record_success()
+        _report_progress(done, total, f"已下載 {done}/{n} 批（{len(batch_tickers)} 檔）")
+
+    panel = pd.DataFrame()
+    if yahoo.allow():
+        # price_cache 的 end 含當日；window 的 end 與 yf.download 相同不含當日
+        end = (dt.date.fromisoformat(window["end"]) - dt.timedelta(days=1)).isoformat()
+        try:
+            with metrics.fetch_timer():
+                panel = price_cache.cached_adj_close(
+                    tickers, window["start"], end, batch_size=BATCH_DOWNLOAD_SIZE, on_batch=on_batch
+                )
+        except Exception as e:
+            if _upstream_failure(e):
+                yahoo.record_failure()
+            else:
+                yahoo.record_success()
+            raise
+        finally:
+            if not downloaded[0]:
+                # 全部由 price_cache 供應，沒有真的打上游：歸還半開狀態的探測名額
+                yahoo.release()
+        panel = panel.dropna(axis=1, how="all")
+    else:
+        failed = list(tickers)
+    fallback = _history_adj_close([t for t in failed if t not in panel.columns])
+    if fallback.empty:
+        return panel
+    return fallback if panel.empty else pd.concat([panel, fallback], axis=1)
+
+
+def batch(requests: List[Dict]) -> Dict:
+    """一次執行多個分析請求，只下載一次資料。
+
+    `requests` 每筆為 {"id": "自訂識別碼", "tool": 工具名稱, "args": {...該工具的參數}}，
+    tool 可為 calc_return、calc_risk_metrics、get_annual_returns。
+    所有子請求需要的標的（含 benchmark）與日期範圍合併成一個 Adj Close 面板：history 快取中
+    新鮮的標的（例如暖機過的熱門標的）直接使用，其餘的經由 price_cache 一次批次下載缺的部分；
+    有 get_annual_returns 時改為逐檔抓完整歷史寫入 history 快取。下載都會寫回共用快取，
+    其他伺服器程序也能直接使用。下載失敗的批次（或斷路器開啟時的全部標的）改用 history
+    快取，結果附上 stale_as_of。
+    回傳 {"results": {id: 結果或 {"error": 訊息}}, "tickers": 下載標的數}。
+
+    在 MCP 中執行時會送出進度通知：每下載完一批回報一次，之後每完成一個子請求，
+    就把 {"id": ..., "result": ...} 的 JSON 放在通知的 message 裡，用戶端不必等全部算完。
+    """
+    planned, errors, tickers, window = _batch_plan(requests)
+    for t in tickers:
+        metrics.note_request(t)
+    results: Dict[str, Dict] = {req_id: {"error": msg} for req_id, msg in errors.items()}
+    if not planned:
+        return {"results": results, "tickers": 0}
+
+    # history 快取中新鮮的標的（啟動暖機的熱門標的、單檔工具剛抓過的）直接用，只下載其餘的
+    fresh = _history_adj_close(tickers, fresh_only=True)
+    rest = [t for t in tickers if t not in fresh.columns]
+    if "period" in window:
+        n_steps = len(rest)
+    else:
+        n_steps = -(-len(rest) // BATCH_DOWNLOAD_SIZE)
+    total = n_steps + len(planned)
+    ticker_errors: Dict[str, str] = {}
+    parts = [fresh]
+    if rest and "period" in window:
+        # 年報酬要完整歷史：逐檔經由 history 快取下載（寫回快取、過期時可用舊資料）
+        downloaded, ticker_errors = _history_full_adj_close(rest, lambda done: _report_progress(
+            done, total, f"已下載 {done}/{len(rest)} 檔完整歷史"
+        ))
+        parts.append(downloaded)
+    elif rest:
+        parts.append(_window_adj_close(rest, window, total))
+    panel = pd.concat([p for p in parts if not p.empty], axis=1) if any(not p.empty for p in parts) else None
+    if panel is None:
+        error = next(iter(ticker_errors.values()), None) or str(_upstream_unavailable("這些標的"))
+        results.update({req_id: {"error": ticker_errors.get(args["ticker"], error)} for req_id, _, args in planned})
+        return {"results": results, "tickers": len(tickers)}
+    panel = normalize_daily_index(panel.loc[:, ~panel.columns.duplicated()]).reindex(columns=tickers)
+    dates = panel.index.values.astype("datetime64[D]")
+    values = panel.to_numpy(dtype=float)
+    next_valid, prev_valid = valid_row_lookups(values)
+    col_of = {t: i for i, t in enumerate(tickers)}
+
+    def row(day: str) -> int:
+        return int(np.searchsorted(dates, np.datetime64(day, "D"), side="left"))
+
+    def span(ticker: str, first_row: int, last_row: int) -> Optional[Tuple[int, int]]:
+        """[first_row, last_row] 內第一個與最後一個有效價格的列。"""
+        col = col_of[ticker]
+        if first_row >= len(dates) or last_row < 0 or first_row > last_row:
+            return None
+        first, last = next_valid[first_row, col], prev_valid[last_row, col]
+        if first < 0 or last < 0 or first > last:
+            return None
+        return int(first), int(last)
+
+    def series(ticker: str, start: str, end: str) -> pd.Series:
+        col = panel[ticker].iloc[row(start) : row(end)]
+        return col.dropna()
+
+    def day(i: int) -> str:
+        return str(dates[i])
+
+    done = 0
+    for req_id, tool, args in planned:
+        ticker = args["ticker"]
+        try:
+            if ticker in ticker_errors:
+                raise ValueError(ticker_errors[ticker])
+            if tool == "calc_return":
+                # 與 yf.download 相同：end 不含當日
+                found = span(ticker, row(args["start"]), row(args["end"]) - 1)
+                if found is None:
+                    raise ValueError(f"{ticker} 在指定區間內無有效資料。")
+                first, last = found
+                start_price, end_price = values[first, col_of[ticker]], values[last, col_of[ticker]]
+                years = _annualize_days(int((dates[last] - dates[first]).astype(int)))
+                results[req_id] = ReturnStats(
+                    ticker=ticker,
+                    start_date=day(first),
+                    end_date=day(last),
+                    start_price=round(float(start_price), 6),
+                    end_price=round(float(end_price), 6),
+                    total_return=float(end_price / start_price - 1.0),
+                    cagr=float((end_price / start_price) ** (1.0 / years) - 1.0),
+                ).to_dict()
+            elif tool == "calc_risk_metrics":
+                bench = series(args["benchmark"], args["start"], args["end"])
+                results[req_id] = _risk_metrics(
+                    ticker,
+                    series(ticker, args["start"], args["end"]),
+                    bench if not bench.empty else None,
+                    args["start"],
+                    args["end"],
+                    args["benchmark"],
+                    args["risk_free_rate_annual"],
+                )
+            else:
+                years = np.unique(dates.astype("datetime64[Y]"))
+                annual = []
+                for year in years:
+                    found = span(ticker, row(str(year) + "-01-01"), row(str(year + 1) + "-01-01") - 1)
+                    if found is None:
+                        continue
+                    first, last = found
+                    ret = values[last, col_of[ticker]] / values[first, col_of[ticker]] - 1.0
+                    annual.append({
+                        "year": int(str(year)),
+                        "start_date": day(first),
+                        "end_date": day(last),
+                        "return_pct": float(round(ret * 100, 4)),
+                    })
+                if not annual:
+                    raise ValueError(f"無法取得 {ticker} 的歷史股價。")
+                results[req_id] = annual
+        except Exception as e:
+            results[req_id] = {"error": str(e)}
+        done += 1
+        _report_progress(n_steps + done, total, json.dumps({"id": req_id, "result": results[req_id]}, ensure_ascii=False))
+    return {"results": results, "tickers": len(tickers)}
+
+
+def server_stats() -> Dict:
+    """伺服器統計：各工具呼叫數、錯誤、逾時、回傳位元組，以及 fetch / compute / serialize
+    的延遲分布（p50/p90/p99）、快取命中數、上游錯誤數、最慢的標的與斷路器狀態。"""
+    return {**metrics.snapshot(), "circuit_breakers": snapshot_all()}
+
+
+for _tool in (
+    get_stock_info,
+    get_price_history,
+    get_summary_return,
+    calc_return,
+    compare_returns,
+    calc_risk_metrics,
+    get_annual_returns,
+    calculate_portfolio_performance,
+    batch,
+    server_stats,
+):
+    _register_async(_tool)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MCP stock analyzer server (stdio).")
+    parser.add_argument("--stats-jsonl", help="定期把 server_stats 快照附加到此 JSON Lines 檔")
+    parser.add_argument("--stats-interval", type=float, default=STATS_DUMP_INTERVAL, help="快照間隔秒數")
+    parser.add_argument("--hot-tickers", nargs="+", help="啟動後預載的標的（會與設定檔、統計檔名單合併）")
+    parser.add_argument("--warmup-config", default=str(HOT_TICKERS_FILE), help="暖機名單 JSON（list 或 {\"tickers\": [...]}）")
+    parser.add_argument("--no-warmup", action="store_true", help="不做啟動暖機")
+    args = parser.parse_args()
+    if args.stats_jsonl:
+        metrics.start_periodic_dump(Path(args.stats_jsonl), args.stats_interval)
+    if not args.no_warmup:
+        listed = hot_tickers(Path(args.warmup_config), Path(args.stats_jsonl) if args.stats_jsonl else None)
+        _warmup_tickers.extend(dict.fromkeys((args.hot_tickers or []) + listed))
     mcp.run(transport="stdio")
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,227 @@
+"""On-disk Adj Close cache in front of `stock_analyzer._download_adj_close_batches`.
+
+The whole cache is one (date × ticker) panel in a columnar store
+(``data/.cache/adj_close.prices``):
+
+- ``dates``    datetime64[D], ascending
+- ``tickers``  fixed-width ticker symbols, column order of ``prices``
+- ``prices``   float64 matrix, NaN where a ticker has no price
+
+``meta["coverage"][ticker] = [start, end, fetched_at]`` records which date
+range was downloaded for a ticker and when. A request is served from the
+memory-mapped panel when every ticker covers it; otherwise only the missing
+or stale tickers are downloaded, in one batched call, and merged into a new
+store version. Ranges ending in the last few days are refetched once they
+are older than ``max_age_hours``, because the latest bars are still moving;
+older ranges never expire.
+
+Tickers that come back without a single price (unknown symbols, but also
+symbols Yahoo throttled, which yfinance reports the same way) get no
+coverage. They are recorded in ``meta["empty"][ticker] = [start, end,
+fetched_at]`` instead and are not re-requested for that range until
+``max_age_hours`` have passed, whatever the range's age.
+
+Several processes can use the same store. Downloads run without any lock, so
+a slow cold fetch in one process does not hold up cache misses elsewhere.
+Only the merge takes the store's writer lock: it re-reads the panel and
+coverage, keeps tickers another process stored meanwhile (or stored over a
+range ours does not contain), and writes the merged panel, so two processes
+never overwrite each other's tickers.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import read_columns, read_meta, store_exists, store_lock, write_columns
+from price_panel import normalize_daily_index
+
+DEFAULT_PRICE_CACHE = Path(__file__).resolve().parent / "data" / ".cache" / "adj_close.prices"
+PRICE_CACHE_FORMAT = "adj_close_panel/1"
+MAX_AGE_HOURS = 12.0
+
+# Process-wide ticker counts: served from the store vs. sent to the downloader.
+cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now().replace(microsecond=0)
+
+
+def load_panel(store: Path = DEFAULT_PRICE_CACHE) -> pd.DataFrame:
+    """The whole cached panel as a DataFrame (empty if there is no cache yet)."""
+    if not store_exists(store) or read_meta(store).get("format") != PRICE_CACHE_FORMAT:
+        return pd.DataFrame(dtype=float)
+    cols, _ = read_columns(store)
+    return pd.DataFrame(
+        cols["prices"],
+        index=pd.DatetimeIndex(cols["dates"].astype("datetime64[ns]")),
+        columns=cols["tickers"].astype(str).tolist(),
+    )
+
+
+def _coverage(store: Path, key: str = "coverage") -> Dict[str, List[str]]:
+    """Per-ticker ``[start, end, fetched_at]`` entries from the store meta (`key` is "coverage" or "empty")."""
+    if not store_exists(store):
+        return {}
+    meta = read_meta(store)
+    if meta.get("format") != PRICE_CACHE_FORMAT:
+        return {}
+    return dict(meta.get(key, {}))
+
+
+def _is_covered(entry: Optional[List[str]], start: str, end: str, now: dt.datetime, max_age_hours: float) -> bool:
+    if not entry:
+        return False
+    have_start, have_end, fetched_at = entry
+    if start < have_start or end > have_end:
+        return False
+    # Ranges reaching into the last couple of days may still receive new bars.
+    recent = (now.date() - dt.date.fromisoformat(end)).days <= 3
+    if recent:
+        age = now - dt.datetime.fromisoformat(fetched_at)
+        return age.total_seconds() <= max_age_hours * 3600
+    return True
+
+
+def _is_known_empty(entry: Optional[List[str]], start: str, end: str, now: dt.datetime, max_age_hours: float) -> bool:
+    """True if Yahoo returned no prices for a range covering [start, end] less than `max_age_hours` ago."""
+    if not entry:
+        return False
+    have_start, have_end, fetched_at = entry
+    if start < have_start or end > have_end:
+        return False
+    return (now - dt.datetime.fromisoformat(fetched_at)).total_seconds() <= max_age_hours * 3600
+
+
+def _missing(
+    store: Path, tickers: List[str], start: str, end: str, now: dt.datetime, max_age_hours: float
+) -> List[str]:
+    coverage, empty = _coverage(store), _coverage(store, "empty")
+    return [
+        t
+        for t in tickers
+        if not _is_covered(coverage.get(t), start, end, now, max_age_hours)
+        and not _is_known_empty(empty.get(t), start, end, now, max_age_hours)
+    ]
+
+
+def cached_adj_close(
+    tickers: Sequence[str],
+    start: str,
+    end: str,
+    store: Path = DEFAULT_PRICE_CACHE,
+    max_age_hours: float = MAX_AGE_HOURS,
+    batch_size: int = 180,
+    on_batch: Optional[Callable[[int, int, List[str], Optional[pd.DataFrame]], None]] = None,
+) -> pd.DataFrame:
+    """Adj Close panel for `tickers` between `start` and `end` (inclusive, YYYY-MM-DD).
+
+    Tickers Yahoo answered for without data come back as all-NaN columns;
+    they are remembered for `max_age_hours` only, so they are not
+    re-requested on every run but a transient throttle is not cached for
+    good. Tickers whose batch failed outright are left uncached and retried
+    next time. `on_batch` is passed to the downloader (called only for batches
+    actually downloaded).
+    """
+    store = Path(store)
+    tickers = list(dict.fromkeys(tickers))
+    now = _now()
+    missing = _missing(store, tickers, start, end, now, max_age_hours)
+    if missing:
+        panel = _update_panel(store, missing, start, end, now, max_age_hours, batch_size, on_batch)
+    else:
+        panel = load_panel(store)
+    with _stats_lock:
+        cache_stats["hits"] += len(tickers) - len(missing)
+        cache_stats["misses"] += len(missing)
+
+    if panel.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=tickers, dtype=float)
+    window = panel.loc[pd.Timestamp(start) : pd.Timestamp(end)]
+    return window.reindex(columns=tickers).dropna(how="all")
+
+
+def _update_panel(
+    store: Path,
+    missing: List[str],
+    start: str,
+    end: str,
+    now: dt.datetime,
+    max_age_hours: float,
+    batch_size: int,
+    on_batch: Optional[Callable[[int, int, List[str], Optional[pd.DataFrame]], None]] = None,
+) -> pd.DataFrame:
+    """Download `missing` without the store lock, then merge them in under it; returns the merged panel."""
+    from stock_analyzer import _download_adj_close_batches
+
+    coverage = _coverage(store)
+    # Extend to the union with what is already cached so coverage stays one contiguous range.
+    fetch_start = min([start] + [coverage[t][0] for t in missing if t in coverage])
+    fetch_end = max([end] + [coverage[t][1] for t in missing if t in coverage])
+    end_plus = (dt.date.fromisoformat(fetch_end) + dt.timedelta(days=1)).isoformat()
+    try:
+        fresh = normalize_daily_index(
+            _download_adj_close_batches(
+                missing, batch_size=batch_size, start=fetch_start, end=end_plus, period=None, on_batch=on_batch
+            )
+        )
+    except RuntimeError:
+        fresh = None
+
+    with store_lock(store):
+        panel = load_panel(store)
+        if fresh is None:
+            return panel
+        coverage, empty = _coverage(store), _coverage(store, "empty")
+        # Another process may have stored some of these while we downloaded; keep its
+        # entries, and never shrink a coverage range that grew beyond what we fetched.
+        still_missing = set(_missing(store, missing, start, end, now, max_age_hours))
+        answered = [
+            t
+            for t in missing
+            if t in fresh.columns
+            and t in still_missing
+            and (t not in coverage or (fetch_start <= coverage[t][0] and coverage[t][1] <= fetch_end))
+        ]
+        if not answered:
+            return panel
+        # All-NaN columns keep whatever the panel already had and only get a short-lived "empty" mark.
+        fetched = [t for t in answered if fresh[t].notna().any()]
+        fetched_at = now.isoformat()
+        for t in answered:
+            if t in fetched:
+                coverage[t] = [fetch_start, fetch_end, fetched_at]
+                empty.pop(t, None)
+            else:
+                empty[t] = [start, end, fetched_at]
+        keep = [c for c in panel.columns if c not in set(fetched)]
+        if fetched:
+            panel = fresh[fetched] if panel.empty else pd.concat([panel[keep], fresh[fetched]], axis=1).sort_index()
+        _write_panel(store, panel, coverage, fetched_at, empty)
+    return panel
+
+
+def _write_panel(
+    store: Path,
+    panel: pd.DataFrame,
+    coverage: Dict[str, List[str]],
+    updated_at: str,
+    empty: Optional[Dict[str, List[str]]] = None,
+) -> None:
+    write_columns(
+        store,
+        {
+            "dates": panel.index.values.astype("datetime64[D]"),
+            "tickers": np.asarray(panel.columns, dtype=str),
+            "prices": panel.to_numpy(dtype=float),
+        },
+        meta={"format": PRICE_CACHE_FORMAT, "coverage": coverage, "empty": empty or {}, "updated_at": updated_at},
+    )
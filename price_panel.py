@@ -0,0 +1,36 @@
+"""Helpers shared by the modules that work on date × ticker price panels.
+
+`normalize_daily_index` turns whatever index a download returned into naive
+calendar days, and `valid_row_lookups` precomputes, for every cell, the
+nearest row with a usable price, so start/end prices can be looked up without
+scanning.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_daily_index(frame: pd.DataFrame) -> pd.DataFrame:
+    """Tz-naive, midnight-normalized, sorted daily index with one row per day."""
+    index = pd.to_datetime(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize()
+    # Listings in different time zones can land on the same calendar day twice.
+    return frame.groupby(level=0).first().sort_index()
+
+
+def valid_row_lookups(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For every (row, col): nearest row >= row / <= row with a finite positive price (-1 if none)."""
+    n = len(values)
+    ok = np.isfinite(values) & (values > 0)
+    rows = np.arange(n)[:, None]
+    next_valid = np.where(ok, rows, n)
+    next_valid = np.minimum.accumulate(next_valid[::-1], axis=0)[::-1]
+    prev_valid = np.where(ok, rows, -1)
+    prev_valid = np.maximum.accumulate(prev_valid, axis=0)
+    return np.where(next_valid == n, -1, next_valid), prev_valid
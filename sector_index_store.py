@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Persist chain-linked TWSE sector index levels for instant range queries.
+
+For every trading day the cap-weighted (昨收×已發行股數) and equal-weighted
+returns of each 產業別 are chain-linked into index levels (base 100), and each
+sector's contribution to the cap-weighted market move is accumulated in index
+points. A date-range question then only needs two stored rows:
+
+- sector return   = level[end] / level[start] - 1
+- contribution    = (contrib_points[end] - contrib_points[start]) / market_level[start]
+
+The sector contributions add up exactly to the market return over the same
+range, just like `cap_contrib` does for a single day in
+`stock_analyzer.analyze_twse_today_by_sector`.
+
+Usage:
+    python sector_index_store.py build --start 2025-01-01 --end 2025-11-30
+    python sector_index_store.py query --start 2025-10-31 --end 2025-11-28
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import read_columns, store_exists, write_columns
+from stock_analyzer import _read_industry_codes, _read_tw_universe, download_twse_price_history
+
+DEFAULT_STORE = Path("data") / "sector_index_store"
+STORE_FORMAT = "sector_index/1"
+BASE_LEVEL = 100.0
+SHARES_COL = "已發行普通股數或TDR原股發行股數"
+
+
+def _code_from_ticker(ticker: str) -> str:
+    return str(ticker).split(".")[0]
+
+
+@dataclass
+class DailyMatrices:
+    """Per-stock daily return/cap matrices aligned to one Adj Close panel.
+
+    Row t of `ret`/`cap`/`valid` describes the move from dates[t] to
+    dates[t + 1]; `cap` is the previous close × shares (0 where invalid).
+    """
+    dates: pd.DatetimeIndex
+    tickers: List[str]
+    codes: List[str]
+    sectors: np.ndarray         # 產業別 per ticker
+    valid: np.ndarray           # (T-1, N) bool
+    ret: np.ndarray             # (T-1, N) daily return, 0 where invalid
+    cap: np.ndarray             # (T-1, N) previous-day market cap
+
+    @property
+    def weights(self) -> np.ndarray:
+        """Previous-day cap weights in the whole market, i.e. `權重_市值` for every day."""
+        total = self.cap.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(total > 0, self.cap / total, 0.0)
+
+    def sector_onehot(self) -> Tuple[List[str], np.ndarray]:
+        sector_codes = sorted(set(self.sectors))
+        onehot = np.zeros((len(self.tickers), len(sector_codes)))
+        onehot[np.arange(len(self.tickers)), np.searchsorted(sector_codes, self.sectors)] = 1.0
+        return sector_codes, onehot
+
+
+def daily_matrices(adj: pd.DataFrame, base_df: pd.DataFrame) -> DailyMatrices:
+    """Build the vectorized return and cap matrices for every listed ticker in `adj`."""
+    adj = adj.sort_index()
+    meta = base_df.drop_duplicates("公司代號").set_index("公司代號")
+    tickers = [t for t in adj.columns if _code_from_ticker(t) in meta.index]
+    if not tickers:
+        raise ValueError("None of the price columns match the listed company file.")
+    codes = [_code_from_ticker(t) for t in tickers]
+
+    shares = pd.to_numeric(meta.loc[codes, SHARES_COL], errors="coerce").fillna(0).to_numpy(float)
+    px = adj[tickers].to_numpy(float)
+    prev, last = px[:-1], px[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = np.isfinite(prev) & np.isfinite(last) & (prev > 0) & (last > 0)
+        ret = np.where(valid, last / np.where(valid, prev, 1.0) - 1.0, 0.0)
+    cap = np.where(valid, prev, 0.0) * shares
+    return DailyMatrices(
+        dates=pd.DatetimeIndex(adj.index),
+        tickers=tickers,
+        codes=codes,
+        sectors=meta.loc[codes, "產業別"].astype(str).to_numpy(),
+        valid=valid,
+        ret=ret,
+        cap=cap,
+    )
+
+
+def _sector_daily_returns(
+    adj: pd.DataFrame,
+    base_df: pd.DataFrame,
+) -> Tuple[pd.DatetimeIndex, List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized per-day sector returns from an Adj Close panel.
+
+    Returns (dates, sector_codes, cap_ret, eq_ret, contrib) where the arrays
+    are shaped (len(dates) - 1, n_sectors) and row t describes the move from
+    dates[t] to dates[t + 1]. `contrib` is each sector's share of the
+    cap-weighted market return (weight × return summed within the sector).
+    """
+    m = daily_matrices(adj, base_df)
+    sector_codes, onehot = m.sector_onehot()
+
+    sector_cap = m.cap @ onehot
+    sector_wret = (m.cap * m.ret) @ onehot
+    sector_cnt = m.valid.astype(float) @ onehot
+    sector_sum = m.ret @ onehot
+    total_cap = m.cap.sum(axis=1, keepdims=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cap_ret = np.where(sector_cap > 0, sector_wret / sector_cap, np.nan)
+        eq_ret = np.where(sector_cnt > 0, sector_sum / sector_cnt, np.nan)
+        contrib = np.where(total_cap > 0, sector_wret / total_cap, 0.0)
+    return m.dates, sector_codes, cap_ret, eq_ret, contrib
+
+
+def _chain(base: np.ndarray, rets: np.ndarray) -> np.ndarray:
+    """Chain-link daily returns onto `base`; missing returns keep the level flat."""
+    growth = 1.0 + np.nan_to_num(rets, nan=0.0)
+    return base * np.cumprod(growth, axis=0)
+
+
+@dataclass
+class SectorIndexStore:
+    dates: np.ndarray           # datetime64[D], shape (T,)
+    sector_codes: List[str]
+    sector_names: Dict[str, str]
+    cap_level: np.ndarray       # (T, S) cap-weighted sector index
+    eq_level: np.ndarray        # (T, S) equal-weighted sector index
+    market_level: np.ndarray    # (T,) cap-weighted market index
+    contrib_points: np.ndarray  # (T, S) cumulative contribution in market index points
+
+    def _row_as_of(self, value: str) -> int:
+        ts = np.datetime64(pd.to_datetime(value).date(), "D")
+        pos = int(np.searchsorted(self.dates, ts, side="right")) - 1
+        if pos < 0:
+            raise ValueError(f"{value} is before the first stored date {self.dates[0]}.")
+        return pos
+
+    def range_summary(self, start: str, end: str) -> pd.DataFrame:
+        """Sector returns and contributions from the close as of `start` to the close as of `end`.
+
+        Both dates resolve to the last stored trading day on or before them, so
+        `start` acts as the base close (e.g. the last day of the previous month).
+        """
+        i, j = self._row_as_of(start), self._row_as_of(end)
+        if j < i:
+            raise ValueError("end must not be before start.")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cap_ret = self.cap_level[j] / self.cap_level[i] - 1.0
+            eq_ret = self.eq_level[j] / self.eq_level[i] - 1.0
+        contrib = (self.contrib_points[j] - self.contrib_points[i]) / self.market_level[i]
+        out = pd.DataFrame({
+            "產業別": self.sector_codes,
+            "產業名稱": [self.sector_names.get(c, "") for c in self.sector_codes],
+            "cap_return": cap_ret,
+            "eq_return": eq_ret,
+            "cap_contrib": contrib,
+        })
+        out.attrs["start_date"] = str(self.dates[i])
+        out.attrs["end_date"] = str(self.dates[j])
+        out.attrs["market_return"] = float(self.market_level[j] / self.market_level[i] - 1.0)
+        return out.sort_values("cap_contrib", ascending=False).reset_index(drop=True)
+
+
+def load_sector_index_store(store_dir: Path = DEFAULT_STORE) -> SectorIndexStore:
+    cols, meta = read_columns(store_dir)
+    if meta.get("format") != STORE_FORMAT:
+        raise ValueError(f"Unsupported sector index store format: {meta.get('format')}")
+    return SectorIndexStore(
+        dates=cols["dates"],
+        sector_codes=list(meta["sector_codes"]),
+        sector_names=dict(meta.get("sector_names", {})),
+        cap_level=cols["cap_level"],
+        eq_level=cols["eq_level"],
+        market_level=cols["market_level"],
+        contrib_points=cols["contrib_points"],
+    )
+
+
+def update_sector_index_store(
+    store_dir: Path,
+    adj: pd.DataFrame,
+    base_df: pd.DataFrame,
+    industry_map: Optional[Dict[str, str]] = None,
+) -> SectorIndexStore:
+    """Create the store from `adj`, or append the trading days after the last stored date.
+
+    When appending, `adj` must contain the last stored date so the first new
+    day can be linked to its previous close.
+    """
+    adj = adj.copy()
+    adj.index = pd.to_datetime(adj.index).normalize()
+    adj = adj[~adj.index.duplicated(keep="last")].sort_index()
+
+    existing: Optional[SectorIndexStore] = None
+    if store_exists(store_dir):
+        existing = load_sector_index_store(store_dir)
+        last = pd.Timestamp(existing.dates[-1])
+        if last not in adj.index:
+            raise ValueError(
+                f"Price frame must include the last stored date {last.date()} to extend the store."
+            )
+        adj = adj.loc[last:]
+        if len(adj) < 2:
+            return existing
+    elif len(adj) < 2:
+        raise ValueError("Need at least two trading days of prices to build the store.")
+
+    dates, new_codes, cap_ret, eq_ret, contrib = _sector_daily_returns(adj, base_df)
+
+    if existing is None:
+        codes = new_codes
+        base_cap = np.full(len(codes), BASE_LEVEL)
+        base_eq = np.full(len(codes), BASE_LEVEL)
+        base_market = BASE_LEVEL
+        base_points = np.zeros(len(codes))
+        old = None
+    else:
+        codes = sorted(set(existing.sector_codes) | set(new_codes))
+        pos = [existing.sector_codes.index(c) if c in existing.sector_codes else -1 for c in codes]
+
+        def _widen(arr: np.ndarray, fill: float) -> np.ndarray:
+            out = np.full((arr.shape[0], len(codes)), fill)
+            for k, p in enumerate(pos):
+                if p >= 0:
+                    out[:, k] = arr[:, p]
+            return out
+
+        old = {
+            "cap_level": _widen(existing.cap_level, np.nan),
+            "eq_level": _widen(existing.eq_level, np.nan),
+            "contrib_points": _widen(existing.contrib_points, 0.0),
+        }
+        base_cap = np.nan_to_num(old["cap_level"][-1], nan=BASE_LEVEL)
+        base_eq = np.nan_to_num(old["eq_level"][-1], nan=BASE_LEVEL)
+        base_market = float(existing.market_level[-1])
+        base_points = old["contrib_points"][-1]
+
+    align = [new_codes.index(c) if c in new_codes else -1 for c in codes]
+
+    def _align(arr: np.ndarray, fill: float) -> np.ndarray:
+        out = np.full((arr.shape[0], len(codes)), fill)
+        for k, p in enumerate(align):
+            if p >= 0:
+                out[:, k] = arr[:, p]
+        return out
+
+    cap_ret = _align(cap_ret, np.nan)
+    eq_ret = _align(eq_ret, np.nan)
+    contrib = _align(contrib, 0.0)
+
+    cap_level = _chain(base_cap, cap_ret)
+    eq_level = _chain(base_eq, eq_ret)
+    market_level = base_market * np.cumprod(1.0 + contrib.sum(axis=1))
+    market_prev = np.concatenate(([base_market], market_level[:-1]))
+    contrib_points = base_points + np.cumsum(market_prev[:, None] * contrib, axis=0)
+    new_dates = dates[1:].values.astype("datetime64[D]")
+
+    if old is None:
+        all_dates = np.concatenate((dates[:1].values.astype("datetime64[D]"), new_dates))
+        cap_level = np.vstack((base_cap, cap_level))
+        eq_level = np.vstack((base_eq, eq_level))
+        market_level = np.concatenate(([base_market], market_level))
+        contrib_points = np.vstack((base_points, contrib_points))
+    else:
+        all_dates = np.concatenate((np.asarray(existing.dates), new_dates))
+        cap_level = np.vstack((old["cap_level"], cap_level))
+        eq_level = np.vstack((old["eq_level"], eq_level))
+        market_level = np.concatenate((np.asarray(existing.market_level), market_level))
+        contrib_points = np.vstack((old["contrib_points"], contrib_points))
+
+    names = dict(existing.sector_names) if existing else {}
+    names.update(industry_map or {})
+    write_columns(
+        store_dir,
+        {
+            "dates": all_dates,
+            "cap_level": cap_level,
+            "eq_level": eq_level,
+            "market_level": market_level,
+            "contrib_points": contrib_points,
+        },
+        meta={
+            "format": STORE_FORMAT,
+            "base_level": BASE_LEVEL,
+            "sector_codes": codes,
+            "sector_names": {c: names[c] for c in codes if c in names},
+            "first_date": str(all_dates[0]),
+            "last_date": str(all_dates[-1]),
+        },
+    )
+    return load_sector_index_store(store_dir)
+
+
+def _format_pct(value: float) -> Optional[float]:
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value) * 100, 4)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the persistent TWSE sector index store.")
+    parser.add_argument("--store", default=str(DEFAULT_STORE), help="Directory of the sector index store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Download prices and create/extend the store.")
+    build.add_argument("--start", required=True, help="YYYY-MM-DD first base date (ignored when extending)")
+    build.add_argument("--end", required=True, help="YYYY-MM-DD last trading day to include")
+    build.add_argument("--listed-csv", default="data/上市公司基本資料.csv")
+    build.add_argument("--industry-csv", default="data/industry_codes.csv")
+    build.add_argument("--otc-csv", help="Optional path to 上櫃公司基本資料.csv to include TPEx (.TWO) stocks")
+    build.add_argument("--batch_size", type=int, default=180)
+
+    query = sub.add_parser("query", help="Sector returns/contributions between two dates.")
+    query.add_argument("--start", required=True, help="Base date YYYY-MM-DD (close as of this day)")
+    query.add_argument("--end", required=True, help="End date YYYY-MM-DD (close as of this day)")
+
+    args = parser.parse_args()
+    store_dir = Path(args.store)
+
+    if args.command == "build":
+        start = args.start
+        if store_exists(store_dir):
+            start = str(load_sector_index_store(store_dir).dates[-1])
+        end_plus = (pd.to_datetime(args.end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        prices = download_twse_price_history(
+            listed_csv_path=args.listed_csv,
+            start_date=start,
+            end_date=end_plus,
+            batch_size=args.batch_size,
+            otc_csv_path=args.otc_csv,
+        )
+        base_df = _read_tw_universe(args.listed_csv, args.otc_csv)
+        try:
+            industry_map = _read_industry_codes(args.industry_csv)
+        except Exception:
+            industry_map = {}
+        store = update_sector_index_store(store_dir, prices, base_df, industry_map)
+        print(f"已更新 {store_dir}：{store.dates[0]} ~ {store.dates[-1]}，共 {len(store.dates)} 個交易日。")
+        return
+
+    store = load_sector_index_store(store_dir)
+    summary = store.range_summary(args.start, args.end)
+    print(json.dumps({
+        "start_date": summary.attrs["start_date"],
+        "end_date": summary.attrs["end_date"],
+        "market_return_pct": _format_pct(summary.attrs["market_return"]),
+        "sectors": [
+            {
+                "產業別": row["產業別"],
+                "產業名稱": row["產業名稱"],
+                "cap_return_pct": _format_pct(row["cap_return"]),
+                "eq_return_pct": _format_pct(row["eq_return"]),
+                "cap_contrib_pct": _format_pct(row["cap_contrib"]),
+            }
+            for _, row in summary.iterrows()
+        ],
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Consolidated TAI50I (臺灣50指數 / 臺灣50報酬指數) daily store.
+
+download_tw50_index_history.py saves one TWSE JSON file per month
+(`TAI50I_YYYY-MM.json`, ROC dates and comma-formatted numbers). This module
+ingests them into a single columnar store (`<data dir>/.cache/TAI50I.store`)
+with three columns: date (datetime64[D]), price_index, tr_index.
+
+Ingest is incremental: the store remembers each monthly file's size/mtime
+and only re-parses files that are new or changed. Loading is a memory map,
+so metric runs no longer json.load ~280 files.
+
+Usage:
+    python tai50i_store.py --data-dir data
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import read_columns, read_meta, store_exists, store_lock, write_columns
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+STORE_FORMAT = "tai50i/1"
+FILE_GLOB = "TAI50I_*.json"
+
+
+def store_path(data_dir: Path) -> Path:
+    return Path(data_dir) / ".cache" / "TAI50I.store"
+
+
+def _file_state(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _roc_to_datetime64(roc: np.ndarray) -> np.ndarray:
+    """Vectorized ' 92/01/02' -> 2003-01-02 conversion."""
+    parts = np.char.split(np.char.strip(roc.astype(str)), "/")
+    ymd = np.array(parts.tolist(), dtype=int)
+    iso = np.char.add(
+        np.char.add(np.char.zfill((ymd[:, 0] + 1911).astype(str), 4), "-"),
+        np.char.add(np.char.add(np.char.zfill(ymd[:, 1].astype(str), 2), "-"), np.char.zfill(ymd[:, 2].astype(str), 2)),
+    )
+    return iso.astype("datetime64[D]")
+
+
+def _parse_numbers(values: np.ndarray) -> np.ndarray:
+    cleaned = np.char.replace(np.char.strip(values.astype(str)), ",", "")
+    out = pd.to_numeric(pd.Series(cleaned), errors="coerce").to_numpy(dtype=float, copy=True)
+    out[out == 0] = np.nan
+    return out
+
+
+def _parse_month_file(path: Path) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    content = json.loads(path.read_text(encoding="utf-8"))
+    rows = [item[:3] for item in content.get("data", []) if len(item) >= 3] if content.get("stat") == "OK" else []
+    if not rows:
+        return np.array([], dtype="datetime64[D]"), np.array([]), np.array([])
+    table = np.array(rows, dtype=str)
+    return _roc_to_datetime64(table[:, 0]), _parse_numbers(table[:, 1]), _parse_numbers(table[:, 2])
+
+
+def _parse_month_files(paths: List[Path]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Parse each monthly file on its own, so one malformed file is skipped instead of aborting the ingest."""
+    parsed = [(np.array([], dtype="datetime64[D]"), np.array([]), np.array([]))]
+    for path in paths:
+        try:
+            parsed.append(_parse_month_file(path))
+        except (json.JSONDecodeError, OSError, IndexError, TypeError, ValueError) as e:
+            print(f"處理檔案 {path.name} 時發生錯誤: {e}")
+    dates, price, tr = zip(*parsed)
+    return np.concatenate(dates), np.concatenate(price), np.concatenate(tr)
+
+
+def _known_files(store: Path) -> Dict[str, List[int]]:
+    if store_exists(store):
+        meta = read_meta(store)
+        if meta.get("format") == STORE_FORMAT:
+            return meta.get("files", {})
+    return {}
+
+
+def _pending_changes(known: Dict[str, List[int]], states: Dict[str, List[int]]) -> Tuple[List[str], List[str]]:
+    """(changed or new files, files gone from disk) relative to what the store has ingested."""
+    changed = [name for name, state in states.items() if known.get(name) != state]
+    removed = [name for name in known if name not in states]
+    return changed, removed
+
+
+def ingest(data_dir: Path = DATA_DIR) -> Dict[str, int]:
+    """Bring the store up to date with the monthly files; returns counts of parsed files/rows."""
+    data_dir = Path(data_dir)
+    store = store_path(data_dir)
+    files = {p.name: p for p in sorted(data_dir.glob(FILE_GLOB))}
+    states = {name: _file_state(p) for name, p in files.items()}
+
+    known = _known_files(store)
+    if not any(_pending_changes(known, states)):
+        rows = int(read_meta(store).get("rows", 0)) if store_exists(store) else 0
+        return {"parsed_files": 0, "rows": rows}
+
+    # Read-modify-write: hold the store lock and re-read what is stored, since
+    # another process may have ingested the same files meanwhile.
+    with store_lock(store):
+        known = _known_files(store)
+        changed, removed = _pending_changes(known, states)
+        if not changed and not removed:
+            return {"parsed_files": 0, "rows": int(read_meta(store).get("rows", 0))}
+
+        dates = np.array([], dtype="datetime64[D]")
+        price = np.array([])
+        tr = np.array([])
+        if known:
+            cols, _ = read_columns(store, mmap=False)
+            dates, price, tr = cols["dates"], cols["price_index"], cols["tr_index"]
+            # Drop the months that will be re-parsed or no longer exist.
+            stale_months = np.array(
+                [n[len("TAI50I_"):-len(".json")] for n in changed + removed], dtype="datetime64[M]"
+            )
+            keep = ~np.isin(dates.astype("datetime64[M]"), stale_months)
+            dates, price, tr = dates[keep], price[keep], tr[keep]
+
+        new_dates, new_price, new_tr = _parse_month_files([files[n] for n in changed])
+        dates = np.concatenate((dates, new_dates))
+        price = np.concatenate((price, new_price))
+        tr = np.concatenate((tr, new_tr))
+        order = np.argsort(dates, kind="stable")
+        dates, price, tr = dates[order], price[order], tr[order]
+        first = np.r_[True, dates[1:] != dates[:-1]]
+        dates, price, tr = dates[first], price[first], tr[first]
+
+        write_columns(
+            store,
+            {"dates": dates, "price_index": price, "tr_index": tr},
+            meta={"format": STORE_FORMAT, "files": states, "rows": int(len(dates))},
+        )
+    return {"parsed_files": len(changed), "rows": int(len(dates))}
+
+
+def load_tai50i(data_dir: Path = DATA_DIR, refresh: bool = True) -> pd.DataFrame:
+    """Daily 臺灣50指數 (`price_index`) and 臺灣50報酬指數 (`tr_index`) indexed by date.
+
+    Empty when there are no monthly files (and no store) yet.
+    """
+    if refresh:
+        ingest(data_dir)
+    store = store_path(data_dir)
+    if not store_exists(store):
+        return pd.DataFrame(
+            {"price_index": [], "tr_index": []}, index=pd.DatetimeIndex([], name="date"), dtype=float
+        )
+    cols, _ = read_columns(store)
+    return pd.DataFrame(
+        {"price_index": cols["price_index"], "tr_index": cols["tr_index"]},
+        index=pd.DatetimeIndex(cols["dates"].astype("datetime64[ns]"), name="date"),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest TAI50I monthly JSON files into one columnar store.")
+    parser.add_argument("--data-dir", default=str(DATA_DIR), help="Directory containing TAI50I_YYYY-MM.json")
+    args = parser.parse_args()
+    stats = ingest(Path(args.data_dir))
+    print(f"已更新 {store_path(Path(args.data_dir))}：解析 {stats['parsed_files']} 個月檔，共 {stats['rows']} 筆。")
+
+
+if __name__ == "__main__":
+    main()
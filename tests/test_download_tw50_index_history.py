@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import download_tw50_index_history as dl
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the TWSE TAI50I endpoint, keyed on the ?date= month."""
+
+    hits = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        date = parse_qs(urlparse(self.path).query)["date"][0]
+        with self.lock:
+            self.hits[date] += 1
+            n = self.hits[date]
+        if date == "20090101" and n == 1:
+            status = 429
+        elif date == "20090201":
+            status = 404
+        elif date == "20090401":
+            status = 500
+        else:
+            status = 200
+        body = json.dumps({"stat": "OK", "date": date, "data": [[date, "1.00", "2.00"]]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    _StandIn.hits.clear()
+    monkeypatch.setattr(dl.time, "sleep", lambda _: None)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/TAI50I"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _fetch(server, data_dir):
+    dl.fetch_and_save(data_dir=str(data_dir), base_url=server, start=(2009, 1), end=(2009, 4),
+                      rate=1000, burst=10, max_workers=2)
+
+
+def test_fetch_and_save_against_stand_in(server, tmp_path):
+    _fetch(server, tmp_path)
+
+    assert sorted(os.listdir(tmp_path)) == ["TAI50I_2009-01.json", "TAI50I_2009-03.json"]
+    saved = json.loads((tmp_path / "TAI50I_2009-01.json").read_text(encoding="utf-8"))
+    assert saved["date"] == "20090101"
+    # 429 is retried, 404 fails fast, 5xx is retried until MAX_RETRIES.
+    assert _StandIn.hits["20090101"] == 2
+    assert _StandIn.hits["20090201"] == 1
+    assert _StandIn.hits["20090301"] == 1
+    assert _StandIn.hits["20090401"] == dl.MAX_RETRIES
+
+    # Finished months fetched after month end are skipped on the next run.
+    _StandIn.hits.clear()
+    _fetch(server, tmp_path)
+    assert "20090101" not in _StandIn.hits and "20090301" not in _StandIn.hits
+    assert _StandIn.hits["20090201"] == 1
+
+
+def test_needs_fetch_refetches_files_saved_mid_month(tmp_path):
+    path = tmp_path / "TAI50I_2009-03.json"
+    today = dl.datetime.date(2025, 1, 1)
+    assert dl._needs_fetch(str(path), 2009, 3, today)
+
+    path.write_text("{}", encoding="utf-8")
+    mid_month = dl.datetime.datetime(2009, 3, 15).timestamp()
+    os.utime(path, (mid_month, mid_month))
+    assert dl._needs_fetch(str(path), 2009, 3, today)
+
+    after = dl.datetime.datetime(2009, 4, 2).timestamp()
+    os.utime(path, (after, after))
+    assert not dl._needs_fetch(str(path), 2009, 3, today)
+    # The current month is always refetched.
+    assert dl._needs_fetch(str(path), 2009, 3, dl.datetime.date(2009, 3, 20))
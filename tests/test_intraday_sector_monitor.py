@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from intraday_sector_monitor import IntradaySectorState, ReplayBarProvider
+
+TICKERS = ["1101.TW", "2330.TW", "2317.TW"]
+SHARES = {"1101.TW": 100.0, "2330.TW": 50.0, "2317.TW": 200.0}
+PREV = {"1101.TW": 10.0, "2330.TW": 500.0, "2317.TW": 100.0}
+
+
+def _state() -> IntradaySectorState:
+    return IntradaySectorState(
+        tickers=TICKERS,
+        sector_codes=["01", "24"],
+        sector_of=np.array([0, 1, 1]),
+        shares=np.array([SHARES[t] for t in TICKERS]),
+        prev_close=np.array([PREV[t] for t in TICKERS]),
+    )
+
+
+@pytest.fixture
+def provider(tmp_path):
+    bars = pd.DataFrame(
+        [
+            ("2024-05-02 09:05", "1101.TW", 10.5),
+            ("2024-05-02 09:05", "2330.TW", 510.0),
+            ("2024-05-02 09:10", "2330.TW", 490.0),
+            ("2024-05-02 09:10", "2317.TW", 102.0),
+            ("2024-05-02 09:15", "2317.TW", 99.0),
+        ],
+        columns=["timestamp", "ticker", "close"],
+    )
+    bars.to_csv(tmp_path / "bars.csv", index=False)
+    pd.DataFrame({"ticker": list(PREV), "prev_close": list(PREV.values())}).to_csv(
+        tmp_path / "prev.csv", index=False
+    )
+    return ReplayBarProvider(str(tmp_path / "bars.csv"), str(tmp_path / "prev.csv"))
+
+
+def _expected(prices):
+    """Full regroup of the sector sums, to compare against the incremental state."""
+    out = {0: [0.0, 0.0, 0.0, 0], 1: [0.0, 0.0, 0.0, 0]}
+    for t, price in prices.items():
+        s = 0 if t == "1101.TW" else 1
+        out[s][0] += SHARES[t] * PREV[t]
+        out[s][1] += SHARES[t] * (price - PREV[t])
+        out[s][2] += price / PREV[t] - 1.0
+        out[s][3] += 1
+    return out
+
+
+def _assert_matches(state, prices):
+    expected = _expected(prices)
+    for s in (0, 1):
+        cap, move, ret, count = expected[s]
+        assert state.cap_prev[s] == pytest.approx(cap)
+        assert state.move[s] == pytest.approx(move)
+        assert state.ret_sum[s] == pytest.approx(ret)
+        assert state.count[s] == count
+
+
+def test_replay_applies_only_new_bars(provider):
+    assert provider.previous_closes(TICKERS + ["9999.TW"]) == PREV
+    state = _state()
+
+    assert sorted(state.apply(provider.latest_bars(TICKERS))) == ["1101.TW", "2330.TW"]
+    _assert_matches(state, {"1101.TW": 10.5, "2330.TW": 510.0})
+
+    # 1101 has no new bar at 09:10, so only 2330 and 2317 are touched.
+    assert sorted(state.apply(provider.latest_bars(TICKERS))) == ["2317.TW", "2330.TW"]
+    _assert_matches(state, {"1101.TW": 10.5, "2330.TW": 490.0, "2317.TW": 102.0})
+
+    assert state.apply(provider.latest_bars(TICKERS)) == ["2317.TW"]
+    final = {"1101.TW": 10.5, "2330.TW": 490.0, "2317.TW": 99.0}
+    _assert_matches(state, final)
+    assert provider.exhausted
+
+    # Polling past the end replays the same bars, which must be a no-op.
+    assert state.apply(provider.latest_bars(TICKERS)) == []
+    _assert_matches(state, final)
+
+    snap = state.snapshot({"01": "水泥工業", "24": "半導體業"})
+    assert snap["stocks"] == 3
+    assert snap["last_bar"] == "2024-05-02T09:15:00"
+    total_cap = sum(SHARES[t] * PREV[t] for t in TICKERS)
+    total_move = sum(SHARES[t] * (final[t] - PREV[t]) for t in TICKERS)
+    assert snap["market_cap"] == pytest.approx(total_move / total_cap)
+
+
+def test_unknown_tickers_and_prices_are_ignored():
+    state = _state()
+    ts = pd.Timestamp("2024-05-02 09:05")
+    assert state.apply({"9999.TW": (ts, 1.0), "1101.TW": (ts, float("nan"))}) == ["1101.TW"]
+    assert state.count.sum() == 0
+    assert state.cap_prev.sum() == 0
+
+
+def test_forming_bar_with_same_timestamp_updates_price():
+    state = _state()
+    ts = pd.Timestamp("2024-05-02 09:05")
+    assert state.apply({"2330.TW": (ts, 505.0)}) == ["2330.TW"]
+    # Yahoo keeps the forming bar's timestamp while its close moves.
+    assert state.apply({"2330.TW": (ts, 512.0)}) == ["2330.TW"]
+    _assert_matches(state, {"2330.TW": 512.0})
+    assert state.apply({"2330.TW": (ts, 512.0)}) == []
+    _assert_matches(state, {"2330.TW": 512.0})
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Survivorship-free point-in-time backtest of the actual 0050 members.
+
+Holds exactly the constituents in force on each day (from
+`get_0050_constituents.load_timeline`) and rebalances at every constituent
+change:
+
+- equal weight: reset to 1/N at the close before each change, then drift
+- cap weight:   previous close × 已發行股數, which drifts with prices by itself
+
+Both are computed for the whole 2002–present history in one vectorized pass
+over a (day × code) Adj Close panel, so the resulting levels are total-return
+series and directly comparable with the TAI50I 臺灣50報酬指數 that
+compute_tw50_metrics.py evaluates.
+
+Note: Yahoo has no history for some delisted members and the share counts
+come from today's 上市公司基本資料.csv, so coverage is reported alongside the
+returns.
+
+Usage:
+    python tw50_pit_backtest.py --start 2002-10-18 --output_csv 分析報告/0050_pit_backtest.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import math
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from get_0050_constituents import CompiledTimeline, load_timeline
+from stock_analyzer import _build_tw_tickers, _download_adj_close_batches, _read_twse_listed_csv
+from tai50i_store import load_tai50i
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+SHARES_COL = "已發行普通股數或TDR原股發行股數"
+
+
+def pit_portfolio_returns(
+    prices: pd.DataFrame,
+    timeline: CompiledTimeline,
+    shares: Optional[Dict[str, float]] = None,
+    max_ffill: int = 5,
+) -> pd.DataFrame:
+    """Daily equal- and cap-weight returns of the point-in-time 0050 portfolio.
+
+    `prices` is an Adj Close panel with 0050 codes (no suffix) as columns.
+    Row t's return uses the members effective on day t with weights set at the
+    close of day t-1. Returns a frame with ew_ret, cw_ret, members, ew_covered
+    and cw_covered (members with usable prices / shares).
+    """
+    prices = prices.sort_index()
+    codes = [c for c in timeline.codes if c in prices.columns]
+    px = prices[codes].ffill(limit=max_ffill).to_numpy(float)
+    dates = prices.index
+
+    membership = timeline.membership_matrix(list(dates.date))
+    membership = membership[:, [timeline.codes.index(c) for c in codes]]
+
+    # Segment = run of days with the same membership row; anchor = close before the segment.
+    eff = np.array(timeline.effective, dtype="datetime64[D]")
+    seg = np.searchsorted(eff, dates.values.astype("datetime64[D]"), side="right") - 1
+    seg_start = np.r_[True, seg[1:] != seg[:-1]]
+    first_row = np.maximum.accumulate(np.where(seg_start, np.arange(len(dates)), 0))
+    anchor = np.maximum(first_row - 1, 0)
+
+    now, prev = px[1:], px[:-1]
+    base = px[anchor[1:]]
+    members = membership[1:]
+    ok = members & np.isfinite(now) & np.isfinite(prev) & np.isfinite(base) & (base > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth_now = np.where(ok, now / base, 0.0)
+        growth_prev = np.where(ok, prev / base, 0.0)
+        ew_ret = growth_now.sum(axis=1) / growth_prev.sum(axis=1) - 1.0
+
+        sh = np.array([(shares or {}).get(c, np.nan) for c in codes], dtype=float)
+        cw_ok = ok & np.isfinite(sh) & (sh > 0)
+        cap_now = np.where(cw_ok, now * sh, 0.0).sum(axis=1)
+        cap_prev = np.where(cw_ok, prev * sh, 0.0).sum(axis=1)
+        cw_ret = cap_now / cap_prev - 1.0
+
+    return pd.DataFrame({
+        "ew_ret": ew_ret,
+        "cw_ret": cw_ret,
+        "members": members.sum(axis=1),
+        "ew_covered": ok.sum(axis=1),
+        "cw_covered": cw_ok.sum(axis=1),
+    }, index=dates[1:])
+
+
+def _summary(levels: pd.Series) -> Dict:
+    levels = levels.dropna()
+    rets = levels.pct_change().dropna()
+    years = (levels.index[-1] - levels.index[0]).days / 365.25
+    cagr = (levels.iloc[-1] / levels.iloc[0]) ** (1 / years) - 1 if years > 0 else 0.0
+    vol = rets.std() * math.sqrt(252)
+    sharpe = rets.mean() / rets.std() * math.sqrt(252) if rets.std() > 0 else 0.0
+    max_dd = (levels / levels.cummax() - 1).min()
+    return {
+        "start_date": levels.index[0].strftime("%Y-%m-%d"),
+        "end_date": levels.index[-1].strftime("%Y-%m-%d"),
+        "cagr_pct": round(float(cagr) * 100, 4),
+        "annual_volatility_pct": round(float(vol) * 100, 4),
+        "sharpe_ratio": round(float(sharpe), 4),
+        "max_drawdown_pct": round(float(max_dd) * 100, 4),
+    }
+
+
+def run_backtest(
+    start: str,
+    end: Optional[str],
+    listed_csv: str,
+    batch_size: int = 180,
+) -> pd.DataFrame:
+    timeline = load_timeline()
+    tickers = _build_tw_tickers(timeline.codes)
+    end = end or dt.date.today().isoformat()
+    end_plus = (pd.to_datetime(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    start_minus = (pd.to_datetime(start) - pd.Timedelta(days=10)).strftime("%Y-%m-%d")
+    prices = _download_adj_close_batches(tickers, batch_size=batch_size, start=start_minus, end=end_plus, period=None)
+    prices.index = pd.to_datetime(prices.index).tz_localize(None).normalize()
+    prices.columns = [str(c).split(".")[0] for c in prices.columns]
+
+    base_df = _read_twse_listed_csv(listed_csv)
+    shares = dict(zip(base_df["公司代號"], base_df[SHARES_COL]))
+
+    out = pit_portfolio_returns(prices, timeline, shares)
+    out = out.loc[pd.to_datetime(start):]
+    out["ew_level"] = 100 * (1 + out["ew_ret"].fillna(0)).cumprod()
+    out["cw_level"] = 100 * (1 + out["cw_ret"].fillna(0)).cumprod()
+
+    tr = load_tai50i(DATA_DIR)["tr_index"].reindex(out.index).ffill()
+    if tr.notna().any():
+        out["tai50i_tr_level"] = 100 * tr / tr.dropna().iloc[0]
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Point-in-time backtest of the actual 0050 constituents.")
+    parser.add_argument("--start", default="2002-10-18", help="YYYY-MM-DD first return date")
+    parser.add_argument("--end", help="YYYY-MM-DD last date; defaults to today")
+    parser.add_argument("--listed-csv", default="data/上市公司基本資料.csv", help="Share counts for cap weights")
+    parser.add_argument("--output_csv", help="Optional CSV of daily returns and levels")
+    parser.add_argument("--batch_size", type=int, default=180)
+    args = parser.parse_args()
+
+    out = run_backtest(args.start, args.end, args.listed_csv, args.batch_size)
+    if args.output_csv:
+        Path(args.output_csv).parent.mkdir(parents=True, exist_ok=True)
+        out.to_csv(args.output_csv, index_label="date", encoding="utf-8-sig")
+
+    results = {
+        "等權_時點成分股": _summary(out["ew_level"]),
+        "市值加權_時點成分股": _summary(out["cw_level"]),
+        "平均覆蓋率": {
+            "equal_weight": round(float((out["ew_covered"] / out["members"]).mean()), 4),
+            "cap_weight": round(float((out["cw_covered"] / out["members"]).mean()), 4),
+        },
+    }
+    if "tai50i_tr_level" in out:
+        results["台灣50報酬指數"] = _summary(out["tai50i_tr_level"])
+        active = (out["cw_ret"] - out["tai50i_tr_level"].pct_change()).dropna()
+        results["市值加權_追蹤誤差_pct"] = round(float(active.std() * math.sqrt(252)) * 100, 4)
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
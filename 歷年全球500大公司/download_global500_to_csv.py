@@ -1,17 +1,29 @@
 #!/usr/bin/env python3
 """
 Fetch Fortune Global 500 annual rankings and export each year to a CSV file.
+
+Raw pages are cached under HTML_DIR, so only missing pages hit the network.
+Years are fetched and parsed concurrently. Pages are parsed with lxml when it
+is installed, falling back to BeautifulSoup's html.parser. Each year's rows
+are streamed page by page into its CSV, which is swapped in atomically.
 """
 from __future__ import annotations
 
+import argparse
 import csv
+import os
 import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Iterable, List, Sequence, Tuple
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
 from urllib.parse import urljoin, urlparse, urldefrag
 from urllib.request import urlopen
 
-from bs4 import BeautifulSoup  # type: ignore[import-not-found]
+try:
+    from lxml import html as lxml_html  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional speed-up
+    lxml_html = None
 
 
 BASE_URL = "https://www.fortunechina.com/fortune500/c/"
@@ -20,6 +32,8 @@ OUTPUT_DIR = Path(__file__).parent / "csv"
 HTML_DIR = Path(__file__).parent / "html"
 SSL_CONTEXT = ssl._create_unverified_context()
 SUMMARY_KEYWORDS = ("总计", "总数", "合计")
+MAX_WORKERS = 4
+DEFAULT_BACKEND = "lxml" if lxml_html is not None else "html.parser"
 
 
 def normalize(text: str) -> str:
@@ -28,15 +42,51 @@ def normalize(text: str) -> str:
     return " ".join(cleaned.split())
 
 
-def iter_year_links() -> List[Tuple[int, str]]:
+def parse_html(html: str, backend: str = DEFAULT_BACKEND) -> Any:
+    """Parse a page with lxml (an HtmlElement) or html.parser (a BeautifulSoup)."""
+    if backend == "lxml":
+        if lxml_html is None:
+            raise RuntimeError("lxml is not installed; use --backend html.parser")
+        # Parse bytes so pages carrying an encoding declaration are accepted.
+        return lxml_html.document_fromstring(html.encode("utf-8"), parser=_lxml_parser())
+    from bs4 import BeautifulSoup  # type: ignore[import-not-found]
+
+    return BeautifulSoup(html, "html.parser")
+
+
+_PARSERS = threading.local()
+
+
+def _lxml_parser() -> Any:
+    """One HTMLParser per thread (parsers are not thread-safe)."""
+    parser = getattr(_PARSERS, "lxml", None)
+    if parser is None:
+        parser = _PARSERS.lxml = lxml_html.HTMLParser(encoding="utf-8")
+    return parser
+
+
+def _is_lxml(node: Any) -> bool:
+    return lxml_html is not None and isinstance(node, lxml_html.HtmlElement)
+
+
+def iter_anchors(doc: Any) -> Iterator[Tuple[Optional[str], Optional[str], str]]:
+    """Yield (href, data-year, text) for every <a> in the document."""
+    if _is_lxml(doc):
+        for anchor in doc.iter("a"):
+            yield anchor.get("href"), anchor.get("data-year"), anchor.text_content()
+    else:
+        for anchor in doc.find_all("a"):
+            yield anchor.get("href"), anchor.get("data-year"), anchor.get_text()
+
+
+def iter_year_links(backend: str = DEFAULT_BACKEND) -> List[Tuple[int, str]]:
     """Yield (year, url) pairs found in list.html sorted descending by year."""
     html = LIST_FILE.read_text(encoding="utf-8")
-    soup = BeautifulSoup(html, "html.parser")
+    doc = parse_html(html, backend)
     links: List[Tuple[int, str]] = []
 
-    for anchor in soup.find_all("a"):
-        href = anchor.get("href")
-        raw_year = anchor.get("data-year") or normalize(anchor.get_text())
+    for href, data_year, text in iter_anchors(doc):
+        raw_year = data_year or normalize(text)
         if not href or not raw_year or not raw_year.isdigit():
             continue
         year = int(raw_year)
@@ -49,19 +99,25 @@ def iter_year_links() -> List[Tuple[int, str]]:
 
 def fetch_html(url: str) -> str:
     """Download a page, skipping certificate verification when needed."""
-    with urlopen(url, context=SSL_CONTEXT) as response:
+    with urlopen(url, context=SSL_CONTEXT, timeout=30) as response:
         return response.read().decode("utf-8", errors="replace")
 
 
-def select_data_table(soup: BeautifulSoup) -> BeautifulSoup:
+def select_data_table(doc: Any) -> Any:
     """
     Pick the first table that contains at least 100 rows of <td> data.
 
     This guards against layout tables and focuses on the ranking itself.
     """
-    best_match: tuple[int, BeautifulSoup] | None = None
-    for table in soup.find_all("table"):
-        row_count = sum(1 for row in table.find_all("tr") if row.find_all("td"))
+    best_match: tuple[int, Any] | None = None
+    if _is_lxml(doc):
+        tables = [(table, int(table.xpath("count(.//tr[.//td])"))) for table in doc.iter("table")]
+    else:
+        tables = [
+            (table, sum(1 for row in table.find_all("tr") if row.find_all("td")))
+            for table in doc.find_all("table")
+        ]
+    for table, row_count in tables:
         if row_count >= 50:
             return table
         if not best_match or row_count > best_match[0]:
@@ -83,7 +139,9 @@ def resolve_url(href: str) -> str:
     return urljoin(BASE_URL, normalized)
 
 
-def load_paginated_pages(year: int, base_url: str) -> List[Tuple[str, Path, BeautifulSoup]]:
+def load_paginated_pages(
+    year: int, base_url: str, backend: str = DEFAULT_BACKEND
+) -> List[Tuple[str, Path, Any]]:
     """
     Fetch the base article and any paginated sub-pages that share the same stem.
 
@@ -98,7 +156,7 @@ def load_paginated_pages(year: int, base_url: str) -> List[Tuple[str, Path, Beau
 
     pending: List[str] = [base_url]
     visited: set[str] = set()
-    pages: dict[str, Tuple[Path, BeautifulSoup]] = {}
+    pages: dict[str, Tuple[Path, Any]] = {}
 
     while pending:
         current = pending.pop()
@@ -106,13 +164,13 @@ def load_paginated_pages(year: int, base_url: str) -> List[Tuple[str, Path, Beau
             continue
 
         html, file_path = fetch_or_cache_html(year_dir, current)
-        soup = BeautifulSoup(html, "html.parser")
-        pages[current] = (file_path, soup)
+        doc = parse_html(html, backend)
+        pages[current] = (file_path, doc)
         visited.add(current)
 
-        for anchor in soup.find_all("a"):
-            href = anchor.get("href")
-            if not href:
+        for href, _, _ in iter_anchors(doc):
+            # Cheap pre-filter: only *.htm links can be pagination pages.
+            if not href or ".htm" not in href:
                 continue
             candidate = urljoin(current, href)
             candidate, _ = urldefrag(candidate)
@@ -145,7 +203,9 @@ def fetch_or_cache_html(year_dir: Path, url: str) -> Tuple[str, Path]:
         html = file_path.read_text(encoding="utf-8")
     else:
         html = fetch_html(url)
-        file_path.write_text(html, encoding="utf-8")
+        tmp = file_path.with_name(f"{file_path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        tmp.write_text(html, encoding="utf-8")
+        os.replace(tmp, file_path)
     return html, file_path
 
 
@@ -156,17 +216,27 @@ def page_filename(url: str) -> str:
     return name or "index.html"
 
 
-def extract_table(table: BeautifulSoup) -> Tuple[List[str], List[List[str]]]:
+def iter_row_texts(table: Any) -> Iterator[List[str]]:
+    """Yield the normalized cell texts of every row that has <th>/<td> cells."""
+    if _is_lxml(table):
+        for row in table.iter("tr"):
+            cells = row.xpath(".//th|.//td")
+            if cells:
+                yield [normalize(cell.text_content()) for cell in cells]
+    else:
+        for row in table.find_all("tr"):
+            cells = row.find_all(["th", "td"])
+            if cells:
+                yield [normalize(cell.get_text()) for cell in cells]
+
+
+def extract_table(table: Any) -> Tuple[List[str], List[List[str]]]:
     """Return the header row and cleaned row data from the given table."""
     header: List[str] | None = None
     data_rows: List[List[str]] = []
     last_rank: int | None = None
 
-    for row in table.find_all("tr"):
-        cells = row.find_all(["th", "td"])
-        if not cells:
-            continue
-        texts = [normalize(cell.get_text()) for cell in cells]
+    for texts in iter_row_texts(table):
         if header is None:
             header = texts
             continue
@@ -205,41 +275,76 @@ def normalize_row(values: Sequence[str], width: int) -> List[str]:
     return row
 
 
-def write_csv(path: Path, header: Sequence[str], rows: Iterable[Sequence[str]]) -> None:
-    """Write the ranking table to disk."""
-    with path.open("w", encoding="utf-8", newline="") as fh:
-        writer = csv.writer(fh)
-        writer.writerow(header)
-        for row in rows:
-            writer.writerow(row)
-
-
-def main() -> None:
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    HTML_DIR.mkdir(exist_ok=True)
+def export_year(year: int, url: str, backend: str = DEFAULT_BACKEND) -> Tuple[int, int, Path]:
+    """Fetch (or read cached) pages for one year and stream their rows into its CSV.
 
-    for year, url in iter_year_links():
-        pages = load_paginated_pages(year, url)
-        header: List[str] | None = None
-        all_rows: List[List[str]] = []
+    Returns (row count, page count, csv path). The CSV is written to a
+    temporary file first, so a failed year never leaves a truncated CSV.
+    """
+    pages = load_paginated_pages(year, url, backend)
+    csv_path = OUTPUT_DIR / f"fortune_global500_{year}.csv"
+    tmp_path = csv_path.with_name(f"{csv_path.name}.tmp")
+    header: List[str] | None = None
+    row_count = 0
 
-        for page_url, _, soup in pages:
-            table = select_data_table(soup)
-            page_header, page_rows = extract_table(table)
+    try:
+        with tmp_path.open("w", encoding="utf-8", newline="") as fh:
+            writer = csv.writer(fh)
+            for page_url, _, doc in pages:
+                page_header, page_rows = extract_table(select_data_table(doc))
 
-            if header is None:
-                header = page_header
-            elif len(page_header) != len(header):
-                raise ValueError(f"Header mismatch for year {year} at {page_url}")
+                if header is None:
+                    header = page_header
+                    writer.writerow(header)
+                elif len(page_header) != len(header):
+                    raise ValueError(f"Header mismatch for year {year} at {page_url}")
 
-            all_rows.extend(page_rows)
+                writer.writerows(page_rows)
+                row_count += len(page_rows)
 
         if header is None:
             raise ValueError(f"Missing header for year {year}")
+        os.replace(tmp_path, csv_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return row_count, len(pages), csv_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export Fortune Global 500 rankings to CSV.")
+    parser.add_argument("--years", nargs="+", type=int, help="Only these years (default: every year in list.html).")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Years fetched and parsed concurrently.")
+    parser.add_argument(
+        "--backend",
+        choices=["lxml", "html.parser"],
+        default=DEFAULT_BACKEND,
+        help="HTML parser (lxml is several times faster).",
+    )
+    args = parser.parse_args()
+
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    HTML_DIR.mkdir(exist_ok=True)
+
+    links = iter_year_links(args.backend)
+    if args.years:
+        wanted = set(args.years)
+        links = [(year, url) for year, url in links if year in wanted]
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(export_year, year, url, args.backend): year for year, url in links}
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                row_count, page_count, csv_path = future.result()
+            except Exception as exc:
+                failures += 1
+                print(f"{year}: failed ({exc})")
+                continue
+            print(f"{year}: wrote {row_count} rows across {page_count} page(s) to {csv_path}")
 
-        csv_path = OUTPUT_DIR / f"fortune_global500_{year}.csv"
-        write_csv(csv_path, header, all_rows)
-        print(f"{year}: wrote {len(all_rows)} rows across {len(pages)} page(s) to {csv_path}")
+    if failures:
+        raise SystemExit(f"{failures} year(s) failed.")
 
 
 if __name__ == "__main__":
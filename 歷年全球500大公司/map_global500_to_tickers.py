@@ -4,6 +4,22 @@ Append Yahoo Finance tickers to the Fortune Global 500 CSV files.
 
 For each company we attempt to infer an equity ticker by querying Yahoo's
 symbol search API. Results are cached locally to avoid repeated lookups.
+
+Unresolved names are looked up concurrently (a small worker pool sharing one
+token-bucket rate limit) and the cache is flushed to disk as results arrive,
+so an interrupted run keeps its progress. Lookups that found nothing are
+recorded in a separate negative cache with a retry-after timestamp instead of
+as empty strings, which stay reserved for manual "no ticker" overrides.
+
+Before any network call, names are matched against an offline character-
+trigram index of symbols we already know (manual overrides, the ticker cache,
+vt_ticker_info_*.json, the VT holdings snapshot and vt_company_name_map.json).
+Only confident, unambiguous matches are taken, which covers roughly a quarter
+of the names missing from the cache; the rest go to Yahoo. Fuzzy
+matches are not verified by Yahoo, so they are kept apart from
+ticker_cache.json in ticker_fuzzy_matches.json (with score and matched name),
+recomputed on every run, never used to seed the index, and replaced as soon
+as Yahoo or a manual override resolves the name.
 """
 from __future__ import annotations
 
@@ -12,19 +28,34 @@ import csv
 import json
 import re
 import ssl
+import os
+import sys
 import time
 import unicodedata
 import urllib.error
 import urllib.parse
 import urllib.request
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# The shared token bucket lives in the repository root, one level up.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rate_limit import TokenBucket  # noqa: E402
 
 
 CSV_DIR = Path(__file__).with_name("csv")
 OUTPUT_DIR = Path(__file__).with_name("csv_with_ticker")
 CACHE_FILE = Path(__file__).with_name("ticker_cache.json")
+NEGATIVE_CACHE_FILE = Path(__file__).with_name("ticker_negative_cache.json")
+FUZZY_CACHE_FILE = Path(__file__).with_name("ticker_fuzzy_matches.json")
+VT_DIR = Path(__file__).resolve().parent.parent
+VT_HOLDINGS_FILE = VT_DIR / "vt_holdings_snapshot_latest.json"
+VT_NAME_MAP_FILE = VT_DIR / "vt_company_name_map.json"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 YAHOO_SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"
 STOP_WORDS = {
@@ -155,6 +186,22 @@ RAW_MANUAL_OVERRIDES = {
     "ZF FRIEDRICHSHAFEN": "",
 }
 SSL_CONTEXT = ssl._create_unverified_context()
+MAX_WORKERS = 6
+RATE_PER_SEC = 8.0
+BURST = 4
+FLUSH_EVERY = 25
+NEGATIVE_TTL_DAYS = 30
+NEGATIVE_TTL_MAX_DAYS = 365
+# Local fuzzy matches: minimum trigram Dice score, and the lead required over
+# the best candidate pointing at a different ticker.
+FUZZY_ACCEPT_SCORE = 0.85
+FUZZY_MARGIN = 0.1
+# Yahoo suffix for VT holdings whose ticker is a numeric local exchange code
+# and whose ISIN is from that same market. The snapshot has no listing
+# exchange field, and the ISIN country is where a company is registered, not
+# where it trades (Chubb is CH but trades as CB on NYSE), so alphabetic
+# tickers of non-US issuers are ambiguous and are left out of the index.
+NUMERIC_CODE_SUFFIXES = {"TW": ".TW", "JP": ".T", "KR": ".KS", "SA": ".SR"}
 
 
 def main() -> None:
@@ -165,10 +212,23 @@ def main() -> None:
         type=int,
         help="Specific years to process (e.g. 2008 2009). Defaults to all available years.",
     )
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Concurrent Yahoo lookups.")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SEC, help="Average Yahoo requests per second.")
+    parser.add_argument(
+        "--no-local-index",
+        action="store_true",
+        help="Skip the offline fuzzy name index and query Yahoo for every unresolved name.",
+    )
+    parser.add_argument(
+        "--retry-negatives",
+        action="store_true",
+        help="Retry cached misses even if their retry-after time has not passed.",
+    )
     args = parser.parse_args()
 
     OUTPUT_DIR.mkdir(exist_ok=True)
     cache = load_cache()
+    negatives = load_negative_cache()
     name_to_key: Dict[str, str] = {}
 
     csv_paths = sorted(CSV_DIR.glob("fortune_global500_*.csv"))
@@ -194,8 +254,22 @@ def main() -> None:
                     if key not in name_to_key or score_name(name) > score_name(name_to_key[key]):
                         name_to_key[key] = name
 
-    ensure_tickers(name_to_key, cache)
-    write_enriched_files(cache, csv_paths)
+    index = None if args.no_local_index else build_name_index(cache, name_to_key)
+    fuzzy: Dict[str, Dict[str, object]] = {}
+    ensure_tickers(
+        name_to_key,
+        cache,
+        negatives,
+        index=index,
+        max_workers=args.workers,
+        rate=args.rate,
+        retry_negatives=args.retry_negatives,
+        fuzzy=fuzzy,
+    )
+    # Verified entries win; unverified fuzzy matches only fill the gaps.
+    resolved = {key: str(entry["ticker"]) for key, entry in fuzzy.items()}
+    resolved.update(cache)
+    write_enriched_files(resolved, csv_paths)
 
 
 def load_cache() -> Dict[str, str]:
@@ -206,8 +280,56 @@ def load_cache() -> Dict[str, str]:
 
 
 def save_cache(cache: Dict[str, str]) -> None:
-    with CACHE_FILE.open("w", encoding="utf-8") as fh:
-        json.dump(cache, fh, ensure_ascii=False, indent=2, sort_keys=True)
+    _atomic_write_json(CACHE_FILE, cache)
+
+
+def save_fuzzy_cache(fuzzy: Dict[str, Dict[str, object]]) -> None:
+    """Unverified name-index matches: key -> {"ticker", "score", "matched_name", "source", "matched_at"}."""
+    _atomic_write_json(FUZZY_CACHE_FILE, fuzzy)
+
+
+def load_negative_cache() -> Dict[str, Dict[str, object]]:
+    """Cached misses: key -> {"name", "attempts", "checked_at", "retry_after"} (UTC ISO times)."""
+    if NEGATIVE_CACHE_FILE.exists():
+        with NEGATIVE_CACHE_FILE.open(encoding="utf-8") as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_negative_cache(negatives: Dict[str, Dict[str, object]]) -> None:
+    _atomic_write_json(NEGATIVE_CACHE_FILE, negatives)
+
+
+def _atomic_write_json(path: Path, data: object) -> None:
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def negative_entry(name: str, previous: Optional[Dict[str, object]], now: datetime) -> Dict[str, object]:
+    """Record a miss; the retry delay doubles with each consecutive miss up to a cap."""
+    attempts = int((previous or {}).get("attempts", 0)) + 1
+    days = min(NEGATIVE_TTL_DAYS * 2 ** (attempts - 1), NEGATIVE_TTL_MAX_DAYS)
+    return {
+        "name": name,
+        "attempts": attempts,
+        "checked_at": now.isoformat(),
+        "retry_after": (now + timedelta(days=days)).isoformat(),
+    }
+
+
+def negative_is_active(entry: Optional[Dict[str, object]], now: datetime) -> bool:
+    if not entry:
+        return False
+    try:
+        return datetime.fromisoformat(str(entry["retry_after"])) > now
+    except (KeyError, ValueError):
+        return False
 
 
 def find_company_column(headers: Sequence[str]) -> str:
@@ -257,44 +379,265 @@ def score_name(name: str) -> int:
 
 
 MANUAL_OVERRIDES = {canonical_key(name): ticker for name, ticker in RAW_MANUAL_OVERRIDES.items()}
-
-
-def ensure_tickers(name_map: Dict[str, str], cache: Dict[str, str]) -> None:
-    unresolved: List[str] = []
+STOP_KEYS = {canonical_key(word) for word in STOP_WORDS}
+
+
+def core_key(name: str) -> str:
+    """canonical_key without legal-form words and share-class tags ("Class A", "-A")."""
+    text = re.sub(r"\bCLASS [A-Z]\b|-[A-Z]$", " ", name.upper())
+    tokens = [tok for tok in re.split(r"[\s,./&()-]+", text) if tok and canonical_key(tok) not in STOP_KEYS]
+    return canonical_key(" ".join(tokens)) or canonical_key(name)
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"$${key}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Character-trigram inverted index from company names to known tickers.
+
+    Scores are Dice coefficients between trigram sets of `core_key`s, so an
+    identical core name scores 1.0. The first ticker added for a core name wins.
+    Postings are frozen into int32 arrays on the first query; one `bincount`
+    over the query's postings then yields every entry's overlap at once.
+    """
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.tickers: List[str] = []
+        self.names: List[str] = []
+        self._sizes: List[int] = []
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._frozen: Optional[Tuple[Dict[str, np.ndarray], np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, name: str, ticker: str) -> None:
+        key = core_key(name)
+        if not key or not ticker or key in self._exact:
+            return
+        entry = len(self.keys)
+        grams = trigrams(key)
+        self.keys.append(key)
+        self.tickers.append(ticker)
+        self.names.append(name)
+        self._sizes.append(len(grams))
+        self._exact[key] = entry
+        for gram in grams:
+            self._postings[gram].append(entry)
+        self._frozen = None
+
+    def _freeze(self) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        if self._frozen is None:
+            postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in self._postings.items()}
+            self._frozen = (postings, np.asarray(self._sizes, dtype=np.float64))
+        return self._frozen
+
+    def candidates(self, name: str, limit: int = 5, min_score: float = 0.5) -> List[Tuple[str, float, str]]:
+        """Up to `limit` (ticker, score, indexed name) tuples, best first."""
+        key = core_key(name)
+        if not key:
+            return []
+        postings, sizes = self._freeze()
+        grams = trigrams(key)
+        lists = [postings[gram] for gram in grams if gram in postings]
+        if not lists:
+            return []
+        common = np.bincount(np.concatenate(lists), minlength=len(sizes))
+        scores = 2.0 * common / (len(grams) + sizes)
+        hits = np.flatnonzero(scores >= min_score)
+        top = hits[np.argsort(-scores[hits], kind="stable")[:limit]]
+        return [(self.tickers[e], round(float(scores[e]), 4), self.names[e]) for e in top]
+
+    def best_match(self, name: str) -> Optional[Tuple[str, float, str]]:
+        """(ticker, score, indexed name) of a confident match, or None if the top hit is weak or ambiguous."""
+        ranked = self.candidates(name, limit=5, min_score=FUZZY_ACCEPT_SCORE - FUZZY_MARGIN)
+        if not ranked or ranked[0][1] < FUZZY_ACCEPT_SCORE:
+            return None
+        ticker, score, _ = ranked[0]
+        rivals = [s for t, s, _ in ranked[1:] if t != ticker]
+        if rivals and score - rivals[0] < FUZZY_MARGIN:
+            return None
+        return ranked[0]
+
+    def best(self, name: str) -> Optional[str]:
+        """Ticker of a confident match, or None if the top hit is weak or ambiguous."""
+        match = self.best_match(name)
+        return match[0] if match else None
+
+
+def _holding_symbol(item: Dict[str, str]) -> Optional[str]:
+    """Yahoo symbol for a VT holding, or None when its listing cannot be told from the snapshot.
+
+    Only US issuers and numeric local codes of the issuer's home market are
+    mapped; see NUMERIC_CODE_SUFFIXES.
+    """
+    ticker = (item.get("ticker") or "").strip().rstrip(".")
+    country = (item.get("isin") or "")[:2]
+    if not ticker:
+        return None
+    if country == "US":
+        return ticker.replace(".", "-").replace(" ", "-")
+    if not ticker.isdigit():
+        return None
+    if country == "HK" and len(ticker) <= 5:
+        return f"{int(ticker):04d}.HK"
+    if country == "CN" and len(ticker) == 6:
+        return f"{ticker}.SS" if ticker.startswith("6") else f"{ticker}.SZ"
+    suffix = NUMERIC_CODE_SUFFIXES.get(country)
+    return f"{ticker}{suffix}" if suffix else None
+
+
+def build_name_index(cache: Dict[str, str], name_map: Dict[str, str], vt_dir: Path = VT_DIR) -> NameIndex:
+    """Index every name we already hold a ticker for; earlier sources take precedence."""
+    index = NameIndex()
+    for raw, ticker in RAW_MANUAL_OVERRIDES.items():
+        index.add(raw, ticker)
+    for key, ticker in cache.items():
+        index.add(name_map.get(key, key), ticker)
+
+    for path in sorted(vt_dir.glob("vt_ticker_info_*.json"), reverse=True):
+        with path.open(encoding="utf-8") as fh:
+            for symbol, info in json.load(fh).items():
+                if (info.get("quoteType") or "").upper() in {"EQUITY", "ADR"}:
+                    index.add(normalize_company_name(info.get("shortName") or ""), info.get("ticker") or symbol)
+
+    # Bare holding tickers collide across markets (RIO, STX), so keep every
+    # (ISIN, symbol) per ticker and only use the unambiguous ones below.
+    local_symbols: Dict[str, Dict[str, str]] = defaultdict(dict)
+    holdings_file = vt_dir / VT_HOLDINGS_FILE.name
+    if holdings_file.exists():
+        with holdings_file.open(encoding="utf-8") as fh:
+            holdings = json.load(fh).get("fund", {}).get("entity", [])
+        for item in holdings:
+            symbol = _holding_symbol(item)
+            if symbol is None:
+                continue
+            local_symbols[item.get("ticker", "")][item.get("isin") or ""] = symbol
+            index.add(normalize_company_name(item.get("longName") or ""), symbol)
+
+    name_map_file = vt_dir / VT_NAME_MAP_FILE.name
+    if name_map_file.exists():
+        with name_map_file.open(encoding="utf-8") as fh:
+            for ticker, label in json.load(fh).items():
+                symbols = set(local_symbols.get(ticker, {}).values())
+                if len(symbols) == 1:
+                    index.add(normalize_company_name(label), symbols.pop())
+    return index
+
+
+def ensure_tickers(
+    name_map: Dict[str, str],
+    cache: Dict[str, str],
+    negatives: Optional[Dict[str, Dict[str, object]]] = None,
+    index: Optional[NameIndex] = None,
+    max_workers: int = MAX_WORKERS,
+    rate: float = RATE_PER_SEC,
+    retry_negatives: bool = False,
+    flush_every: int = FLUSH_EVERY,
+    fuzzy: Optional[Dict[str, Dict[str, object]]] = None,
+) -> None:
+    """Resolve every name in `name_map` into `cache` (manual overrides and Yahoo hits).
+
+    Confident name-index matches go into `fuzzy` instead, tagged with their score,
+    and are written to FUZZY_CACHE_FILE; they are not sent to Yahoo this run.
+    """
+    if negatives is None:
+        negatives = load_negative_cache()
+    if fuzzy is None:
+        fuzzy = {}
+    now = _utcnow()
+    pending: List[Tuple[str, str]] = []
+    skipped = 0
+    local = 0
     for key, name in sorted(name_map.items(), key=lambda item: item[1]):
         manual = MANUAL_OVERRIDES.get(key)
         if manual is not None:
+            # Manual override (an empty string means "known to have no ticker").
             cache[key] = manual
-            if not manual:
-                continue
-            # Manual override satisfied; move on.
+            negatives.pop(key, None)
             continue
         cached = cache.get(key)
         if cached:
             continue
-        ticker = resolve_ticker(name)
-        cache[key] = ticker
-        if not ticker:
-            unresolved.append(name)
+        if index is not None:
+            match = index.best_match(name)
+            if match:
+                ticker, score, matched_name = match
+                fuzzy[key] = {
+                    "ticker": ticker,
+                    "score": round(float(score), 4),
+                    "matched_name": matched_name,
+                    "source": "name_index",
+                    "matched_at": now.isoformat(),
+                }
+                negatives.pop(key, None)
+                local += 1
+                continue
+        if not retry_negatives and negative_is_active(negatives.get(key), now):
+            skipped += 1
+            continue
+        pending.append((key, name))
+    if local:
+        print(f"Matched {local} names from the local name index (unverified, see {FUZZY_CACHE_FILE.name}).")
+    save_fuzzy_cache(fuzzy)
+
+    unresolved: List[str] = []
+    failed: List[str] = []
+    if pending:
+        print(f"Resolving {len(pending)} names ({max_workers} workers, {rate:g} req/s); {skipped} cached misses skipped.")
+        limiter = TokenBucket(rate, BURST)
+        done = 0
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {pool.submit(resolve_ticker, name, limiter): (key, name) for key, name in pending}
+            for future in as_completed(futures):
+                key, name = futures[future]
+                ticker = future.result()
+                if ticker:
+                    cache[key] = ticker
+                    negatives.pop(key, None)
+                elif ticker is None:
+                    # Every query errored out; leave the name for the next run.
+                    failed.append(name)
+                else:
+                    cache.pop(key, None)
+                    negatives[key] = negative_entry(name, negatives.get(key), _utcnow())
+                    unresolved.append(name)
+                done += 1
+                if done % flush_every == 0:
+                    save_cache(cache)
+                    save_negative_cache(negatives)
+                    print(f"  {done}/{len(pending)} resolved", flush=True)
     save_cache(cache)
+    save_negative_cache(negatives)
     if unresolved:
-        print(f"Tickers missing for {len(unresolved)} company names (see ticker_cache.json).")
+        print(f"Tickers missing for {len(unresolved)} company names (see {NEGATIVE_CACHE_FILE.name}).")
+    if failed:
+        print(f"Lookups failed for {len(failed)} company names (network errors); rerun to retry them.")
 
 
-def resolve_ticker(name: str) -> str:
+def resolve_ticker(name: str, limiter: Optional[TokenBucket] = None) -> Optional[str]:
+    """Best Yahoo symbol for `name`; "" when nothing matched, None when every query errored."""
     manual_key = canonical_key(name)
     if manual_key in MANUAL_OVERRIDES:
         return MANUAL_OVERRIDES[manual_key]
 
     queries = generate_queries(name)
+    answered = False
     for query in queries:
         if not query:
             continue
-        quotes = search_yahoo(query)
+        quotes = search_yahoo(query, limiter)
+        if quotes is None:
+            continue
+        answered = True
         symbol = select_best_symbol(quotes)
         if symbol is not None:
             return symbol
-    return ""
+    return "" if answered else None
 
 
 def generate_queries(name: str) -> List[str]:
@@ -327,7 +670,8 @@ def generate_queries(name: str) -> List[str]:
     return queries[:4]
 
 
-def search_yahoo(query: str) -> List[Dict[str, str]]:
+def search_yahoo(query: str, limiter: Optional[TokenBucket] = None) -> Optional[List[Dict[str, str]]]:
+    """Yahoo search quotes for `query`, or None if every attempt failed."""
     params = {
         "q": query,
         "lang": "en-US",
@@ -336,18 +680,20 @@ def search_yahoo(query: str) -> List[Dict[str, str]]:
     url = f"{YAHOO_SEARCH_URL}?{urllib.parse.urlencode(params)}"
     req = urllib.request.Request(url, headers=HEADERS)
     for attempt in range(3):
+        if limiter is not None:
+            limiter.acquire()
         try:
             with urllib.request.urlopen(req, context=SSL_CONTEXT, timeout=10) as resp:
                 data = json.load(resp)
-            time.sleep(0.05)
             return data.get("quotes", [])
         except urllib.error.HTTPError as err:
-            if err.code == 429:
-                time.sleep(1.5 * (attempt + 1))
-                continue
+            if 400 <= err.code < 500 and err.code != 429:
+                return []
+            # Throttled or server-side error: back off exponentially before retrying.
+            time.sleep(1.5 * 2 ** attempt)
         except Exception:
             time.sleep(0.5 * (attempt + 1))
-    return []
+    return None
 
 
 def select_best_symbol(quotes: Sequence[Dict[str, str]]) -> Optional[str]: